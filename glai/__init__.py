@@ -1,7 +1,11 @@
-from .ai import AutoAI, EasyAI
-from .messages import AIMessages, AIMessage
+import importlib
+from typing import TYPE_CHECKING, Any
+from .messages import AIMessages, AIMessage, ConversationStore
 
-__all__ = ['AutoAI', 'EasyAI', 'AIMessages', 'AIMessage']
+if TYPE_CHECKING:
+    from .ai import AutoAI, EasyAI, AsyncAutoAI, AsyncEasyAI, ModelPool, RequestQueue, QueueFullError, ModelRegistry, MODEL_REGISTRY, ResponseCache, SemanticCache, Embedder
+
+__all__ = ['AutoAI', 'EasyAI', 'AsyncAutoAI', 'AsyncEasyAI', 'ModelPool', 'RequestQueue', 'QueueFullError', 'ModelRegistry', 'MODEL_REGISTRY', 'ResponseCache', 'SemanticCache', 'Embedder', 'AIMessages', 'AIMessage', 'ConversationStore']
 # print(f"""
 # glai
 # GGUF LLAMA AI - Package for simplified text generation with Llama models quantized to GGUF format is loaded.
@@ -9,3 +13,16 @@ __all__ = ['AutoAI', 'EasyAI', 'AIMessages', 'AIMessage']
 # For more information please check README.md file or visit https://github.com/laelhalawani/glai 
 # Detailed API documentation can be found here: https://laelhalawani.github.io/glai/
 # """)
+
+def __getattr__(name: str) -> Any:
+    # AI classes are imported on first use, so tools using only AIMessages don't load the inference backend
+    if name == "ai":
+        return importlib.import_module(".ai", __name__)
+    if name not in __all__:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(".ai", __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(__all__))
@@ -1,7 +1,46 @@
-from .auto_ai import AutoAI
-from .easy_ai import EasyAI
+import importlib
+from typing import TYPE_CHECKING, Any
 
+if TYPE_CHECKING:
+    from .auto_ai import AutoAI
+    from .easy_ai import EasyAI
+    from .async_ai import AsyncAutoAI, AsyncEasyAI
+    from .model_pool import ModelPool
+    from .request_queue import RequestQueue, QueueFullError
+    from .model_registry import ModelRegistry, MODEL_REGISTRY
+    from .response_cache import ResponseCache
+    from .semantic_cache import SemanticCache
+    from .embeddings import Embedder
+    from .grammar import build_grammar, regex_to_gbnf
+
+# Symbols are imported on first use, so importing the package doesn't load the inference backend
+_LAZY_IMPORTS = {
+    'AutoAI': '.auto_ai',
+    'EasyAI': '.easy_ai',
+    'AsyncAutoAI': '.async_ai',
+    'AsyncEasyAI': '.async_ai',
+    'ModelPool': '.model_pool',
+    'RequestQueue': '.request_queue',
+    'QueueFullError': '.request_queue',
+    'ModelRegistry': '.model_registry',
+    'MODEL_REGISTRY': '.model_registry',
+    'ResponseCache': '.response_cache',
+    'SemanticCache': '.semantic_cache',
+    'Embedder': '.embeddings',
+    'build_grammar': '.grammar',
+    'regex_to_gbnf': '.grammar',
+}
 
 # Making certain symbols available when the package is imported
-__all__ = ['AutoAI', 'EasyAI']
+__all__ = ['AutoAI', 'EasyAI', 'AsyncAutoAI', 'AsyncEasyAI', 'ModelPool', 'RequestQueue', 'QueueFullError', 'ModelRegistry', 'MODEL_REGISTRY', 'ResponseCache', 'SemanticCache', 'Embedder', 'build_grammar', 'regex_to_gbnf']
 #print(f"Initializing ai package, available classes: {__all__}")
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_LAZY_IMPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(__all__))
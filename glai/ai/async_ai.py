@@ -0,0 +1,202 @@
+import asyncio
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+from ..messages import AIMessage
+from .auto_ai import AutoAI
+from .easy_ai import EasyAI
+
+__all__ = ['AsyncEasyAI', 'AsyncAutoAI']
+
+_END = object()
+
+class _AsyncAI:
+    """
+    Runs the blocking calls of a wrapped AI object on a dedicated executor.
+
+    The default executor has a single thread, so calls to the model are run one at a time in the order they were made,
+    while the event loop stays free to serve other tasks. Token counting only tokenizes, so it runs on the default executor
+    of the event loop instead, and is answered while a generation is running.
+    """
+    def __init__(self, ai: Any, executor: Optional[Executor] = None) -> None:
+        self._ai = ai
+        self._own_executor = executor is None
+        self.executor = executor if executor is not None else ThreadPoolExecutor(max_workers=1, thread_name_prefix="glai")
+
+    async def _run(self, function: Callable, *args, **kwds) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: function(*args, **kwds))
+
+    async def _stream(self, make_iterator: Callable[[], Iterator[str]]) -> AsyncIterator[str]:
+        """
+        Runs the iterator returned by make_iterator on the executor and yields its items.
+
+        Closing the async iterator, or cancelling the task consuming it, stops the generation after the current token.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def put(item: Any) -> None:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # event loop already closed
+                cancelled.set()
+
+        def run() -> None:
+            if cancelled.is_set():
+                return
+            try:
+                iterator = make_iterator()
+                try:
+                    for delta in iterator:
+                        if cancelled.is_set():
+                            break
+                        put(delta)
+                finally:
+                    close = getattr(iterator, "close", None)
+                    if close is not None:
+                        close()
+            except BaseException as e:
+                put(e)
+            else:
+                put(_END)
+
+        loop.run_in_executor(self.executor, run)
+        try:
+            while True:
+                item = await queue.get()
+                if item is _END:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            cancelled.set()
+
+    async def count_tokens(self, *args, **kwds) -> int:
+        """
+        Count the number of tokens in a generated message, arguments are passed to `count_tokens()` of the wrapped object.
+
+        Runs on the default executor of the event loop, so it doesn't wait for a running generation.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: self._ai.count_tokens(*args, **kwds))
+
+    async def generate(self, *args, **kwds) -> AIMessage:
+        """
+        Generate AI response to user message, arguments are passed to `generate()` of the wrapped object,
+        so the response and semantic caches and output constraints (grammar, json_schema, regex) apply.
+
+        Cancelling the awaiting task stops the generation after the current token, through the cancel event of `generate()`.
+        """
+        cancel = kwds.setdefault("cancel", threading.Event())
+        try:
+            return await self._run(self._ai.generate, *args, **kwds)
+        except asyncio.CancelledError:
+            cancel.set()
+            raise
+
+    def generate_stream(self, *args, **kwds) -> AsyncIterator[str]:
+        """
+        Generate AI response to user message as an async iterator over text deltas, arguments are passed to `generate_stream()` of the wrapped object.
+
+        Closing the async iterator, or cancelling the task consuming it, stops the generation after the current token.
+        on_complete is called from the executor thread.
+        """
+        return self._stream(lambda: self._ai.generate_stream(*args, **kwds))
+
+    def close(self) -> None:
+        """
+        Shut down the executor if it was created by this object. Already submitted calls still finish.
+        """
+        if self._own_executor:
+            self.executor.shutdown(wait=False)
+
+
+class AsyncEasyAI(_AsyncAI):
+    """
+    Asyncio wrapper of EasyAI for use in async applications (i.e. aiohttp or FastAPI services).
+
+    Model loading and generation are awaitable and run on a dedicated executor, token counting on the default executor of the loop,
+    so they don't block the event loop. Arguments are passed to the methods of the wrapped object as they are.
+    Cancelling an awaited generation stops it after the current token. Streamed generations are async iterators,
+    closing them or cancelling the consuming task stops the generation after the current token too.
+
+    Initialization:
+        Use `await AsyncEasyAI.create(**kwds)` to configure with the same arguments as `EasyAI.configure()`,
+        or wrap an existing EasyAI with `AsyncEasyAI(easy_ai)`.
+
+    Args:
+        easy_ai: EasyAI object to wrap. A new unconfigured one is created if not provided.
+        executor: Executor to run the blocking calls on. Defaults to a new single thread executor.
+
+    Attributes:
+        easy_ai: The wrapped EasyAI object.
+        executor: Executor running the blocking calls.
+    """
+    def __init__(self, easy_ai: Optional[EasyAI] = None, executor: Optional[Executor] = None) -> None:
+        self.easy_ai = easy_ai if easy_ai is not None else EasyAI()
+        super().__init__(self.easy_ai, executor)
+
+    @classmethod
+    async def create(cls, executor: Optional[Executor] = None, **kwds) -> "AsyncEasyAI":
+        """
+        Create and configure AsyncEasyAI, keyword arguments are passed to `EasyAI.configure()`.
+        """
+        async_ai = cls(executor=executor)
+        await async_ai.configure(**kwds)
+        return async_ai
+
+    async def configure(self, **kwds) -> None:
+        """
+        Configure the wrapped EasyAI, see `EasyAI.configure()`.
+        """
+        await self._run(self.easy_ai.configure, **kwds)
+
+    async def load_ai(self, *args, **kwds) -> None:
+        """
+        Load the LlamaAI model of the wrapped EasyAI, arguments are passed to `EasyAI.load_ai()`.
+        """
+        await self._run(self.easy_ai.load_ai, *args, **kwds)
+
+
+class AsyncAutoAI(_AsyncAI):
+    """
+    Asyncio wrapper of AutoAI for use in async applications (i.e. aiohttp or FastAPI services).
+
+    Model loading and generation are awaitable and run on a dedicated executor, token counting on the default executor of the loop,
+    so they don't block the event loop. Arguments are passed to the methods of the wrapped object as they are.
+    Cancelling an awaited generation stops it after the current token. Streamed generations are async iterators,
+    closing them or cancelling the consuming task stops the generation after the current token too.
+
+    Initialization:
+        Use `await AsyncAutoAI.create(...)` with the same arguments as `AutoAI`,
+        or wrap an existing AutoAI with `AsyncAutoAI(auto_ai)`.
+
+    Args:
+        auto_ai: AutoAI object to wrap.
+        executor: Executor to run the blocking calls on. Defaults to a new single thread executor.
+
+    Attributes:
+        auto_ai: The wrapped AutoAI object.
+        executor: Executor running the blocking calls.
+    """
+    def __init__(self, auto_ai: AutoAI, executor: Optional[Executor] = None) -> None:
+        self.auto_ai = auto_ai
+        super().__init__(self.auto_ai, executor)
+
+    @classmethod
+    async def create(cls, *args, executor: Optional[Executor] = None, **kwds) -> "AsyncAutoAI":
+        """
+        Find, download and load the model without blocking the event loop, other arguments are passed to `AutoAI`.
+        """
+        own_executor = executor is None
+        if own_executor:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="glai")
+        loop = asyncio.get_running_loop()
+        auto_ai = await loop.run_in_executor(executor, lambda: AutoAI(*args, **kwds))
+        async_ai = cls(auto_ai, executor)
+        async_ai._own_executor = own_executor
+        return async_ai
@@ -1,9 +1,23 @@
 from __future__ import annotations
 
-from typing import Optional
-from ..messages import AIMessages, AIMessage
-from gguf_modeldb import ModelDB, ModelData
+import threading
+import weakref
+import numpy as np
+from typing import Callable, Iterator, List, Optional, Union
+from ..messages import AIMessages, AIMessage, TokenCounter
+from gguf_modeldb import ModelData
 from gguf_llama import LlamaAI
+from llama_cpp import LlamaGrammar
+from .streaming import stream_completion
+from .batch import generate_batch
+from .chat_session import ChatSession
+from .request_queue import RequestQueue
+from .model_registry import ModelRegistry, MODEL_REGISTRY
+from .download import download_model
+from .model_index import MODEL_INDEX, get_model_db
+from .response_cache import ResponseCache
+from .embeddings import Embedder
+from .grammar import build_grammar
 
 __all__ = ['AutoAI']
 
@@ -22,12 +36,18 @@ class AutoAI:
         new_tokens: New token length for LlamaAI model. Default 1500.
         max_input_tokens: Max input tokens for LlamaAI model. Default 900.
         model_db_dir: Directory to store model data in. Defaults to global packages model directory.
+        llama_kwargs: Optional extra keyword arguments for the llama model, i.e. {"n_threads": 4}.
+        model_registry: ModelRegistry to get the loaded model from. Defaults to the process wide registry, sharing the model with other objects using it.
+        response_cache: Optional ResponseCache answering repeated prompts without running the model, see `ResponseCache`. Can be shared between objects.
 
     Attributes:
         model_db: ModelDB object. - represents the database of models, has useful functions for searching and importing models.
         model_data: ModelData object. - represents the data of the model, has useful functions for creating, downloading and loading the model data and gguf.
         ai: LlamaAI object. - represents the LlamaAI model, a wrapper for llama llm and tokenizer models quantized to gguf format. Has methods for adjusting generation and for generating.
         msgs: AIMessages object. - represents the AIMessages a collection of AIMessage objects, has useful functions for adding and editing messages and can be printed to string.
+        token_counter: TokenCounter object. - counts tokens with the model tokenizer, caching recent counts.
+        request_queue: RequestQueue object. - gives concurrent generations access to the model in order of arrival, set its max_pending to limit waiting requests. Shared by all objects using the same model.
+        response_cache: ResponseCache object or None. - answers repeated prompts of generate_from_literal_string(), generate() and generate_from_messages() without running the model.
         
     """
     def __init__(self, 
@@ -37,74 +57,116 @@ class AutoAI:
                  search_only_downloaded_models:bool = False,
                  max_total_tokens: int = 1500,
                  model_db_dir:Optional[str] = None,
+                 model_registry: Optional[ModelRegistry] = None,
+                 response_cache: Optional[ResponseCache] = None,
+                 llama_kwargs: Optional[dict] = None,
                  ) -> None:
 
-        self.model_db = ModelDB(model_db_dir=model_db_dir, copy_verified_models=True)
-        self.model_data: ModelData = self.model_db.find_model(
-            name_search, quantization_search, keyword_search, search_only_downloaded_models
-        )
-        self.model_data.download_gguf()
-        self.ai = LlamaAI(
-            self.model_data.gguf_file_path, max_tokens=max_total_tokens
+        self.model_db = get_model_db(model_db_dir, copy_verified_models=True)
+        self.model_data: ModelData = MODEL_INDEX.find_model(
+            self.model_db, name_search, quantization_search, keyword_search, search_only_downloaded_models
         )
+        download_model(self.model_data)
+        handle = (model_registry or MODEL_REGISTRY).acquire(self.model_data.gguf_file_path, max_total_tokens, llama_kwargs)
+        self._release_model = weakref.finalize(self, handle.release)
+        self._model_key = handle.key
+        self.response_cache: Optional[ResponseCache] = response_cache
+        self.ai: LlamaAI = handle.ai
+        self.token_counter = TokenCounter(self.ai.count_tokens, key=self.model_data.gguf_file_path)
+        self.request_queue: RequestQueue = handle.request_queue
         print(f"Using model: {self.model_data}")
         self.msgs: AIMessages = AIMessages(
             self.model_data.user_tags, self.model_data.ai_tags, self.model_data.system_tags
         )
     
-    def generate_from_messages(self, stop_at:str = None, include_stop_str:bool = True) -> AIMessage:
+    def generate_from_messages(self, stop_at: Optional[Union[str, List[str]]] = None, include_stop_str:bool = True) -> AIMessage:
         prompt = self.msgs.text()
         ai_message = self.generate_from_literal_string(prompt, stop_at=stop_at, include_stop_str=include_stop_str)
         self.msgs.add_ai_message(ai_message)
         return ai_message
     
+    def start_chat(self, reserve_tokens: Optional[int] = None, summarize: Optional[Callable[[list], str]] = None) -> ChatSession:
+        """
+        Start a multi-turn chat continuing the conversation in `self.msgs`.
+
+        Unlike generate_from_messages(), the ChatSession only evaluates the messages added since the previous turn.
+        The session shares `self.msgs`, so generated messages are added to it, and the oldest ones are dropped
+        once the conversation doesn't fit in max_total_tokens.
+
+        Args:
+            reserve_tokens: Tokens to keep free for generation when trimming old messages. Defaults to a quarter of max_total_tokens.
+            summarize: Optional function summarizing dropped old messages into a single message text.
+
+        Returns:
+            ChatSession object.
+        """
+        return ChatSession(self.ai, self.msgs, reserve_tokens, summarize, self.token_counter, self.request_queue)
+
     def generate_from_literal_string(
         self, 
         prompt: str,
-        stop_at:str = None,
-        include_stop_str:bool = True
+        stop_at: Optional[Union[str, List[str]]] = None,
+        include_stop_str:bool = True,
+        grammar: Optional[str] = None,
+        json_schema: Optional[Union[dict, str]] = None,
+        regex: Optional[str] = None,
+        cancel: Optional[threading.Event] = None
     ) -> AIMessage:
         """
-        Generate text from a prompt using the LlamaAI model.
+        Generate text from a prompt using the LlamaAI model, waiting for the model in `self.request_queue`.
+        If `self.response_cache` is set, repeated prompts are answered from it.
+        Setting the cancel event from another thread stops the generation after the current token,
+        the partial text is returned and isn't cached.
 
         Args:
             prompt: Prompt text to generate from.
+            grammar: Optional GBNF grammar the generated text has to match, tokens that can't continue a match are masked while sampling.
+            json_schema: Optional JSON schema (dict or JSON text) the generated text has to match, instead of grammar.
+            regex: Optional regular expression the generated text has to match, instead of grammar, see `regex_to_gbnf()`.
+            cancel: Optional event stopping the generation once set.
 
         Returns:
             Generated text string.
         """
-        return self.ai.infer(
-            prompt, only_string=True, stop_at_str=stop_at, include_stop_str=include_stop_str
-        )
+        llama_grammar = build_grammar(grammar, json_schema, regex)
+        cache_key = None
+        if self.response_cache is not None:
+            constraint = {name: value for name, value in (("grammar", grammar), ("json_schema", json_schema), ("regex", regex)) if value is not None}
+            cache_key = self.response_cache.key(self._model_key, prompt, stop_at, include_stop_str, constraint)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        with self.request_queue.hold():
+            generated = "".join(stream_completion(self.ai, prompt, stop_at, include_stop_str, llama_grammar, cancel))
+        if cache_key is not None and not (cancel is not None and cancel.is_set()):
+            self.response_cache.put(cache_key, generated)
+        return generated
 
-    def generate(
+    def _generation_messages(
         self,
         user_message: str,
         ai_message_tbc: Optional[str] = None,
-        stop_at:Optional[str] = None,
-        include_stop_str:bool = True,
-        system_message: Optional[str] = None
-    ) -> AIMessage:
+        system_message: Optional[str] = None,
+        verbose: bool = True
+    ) -> AIMessages:
         """
-        Generate an AI response to a user message.
+        Create fresh AIMessages with the system, user and to be continued AI messages for a single generation.
 
         Args:
             user_message: User message text.
             ai_message_tbc: Optional text to prepend.
-            stop_at: Optional string to stop generation at.
-            include_stop_str: Whether to include the stop string in the generated message.
-            system_message: Optional system message to include at the start, not all models support this.
-            If you provide system message to a model that doesn't support it, it will be ignored.
-            You can check if a model supports system messages by checking the model_data.has_system_tags() method.
+            system_message: Optional system message to include at the start.
+            verbose: Whether to print warnings and the prompt.
+
         Returns:
-            Generated AIMessage object.
+            AIMessages object to generate from.
         """
         generation_messages = AIMessages(user_tags=self.model_data.user_tags, ai_tags=self.model_data.ai_tags, system_tags=self.model_data.system_tags)
         generation_messages.reset_messages()
         if self.model_data.has_system_tags():
             if system_message is not None:
                 generation_messages.set_system_message(system_message)
-            else:
+            elif verbose:
                 print("WARNING: Model seeps to support system messages, but no system message provided.")
         generation_messages.add_user_message(user_message)
 
@@ -115,10 +177,29 @@ class AutoAI:
                 self.msgs.ai_tag_open, 
                 ""
             )
-        print(f"Promt: {generation_messages.text()}")
-        
-        generated = self.generate_from_literal_string(generation_messages.text(), stop_at=stop_at, include_stop_str=include_stop_str)
+        if verbose:
+            print(f"Promt: {generation_messages.text()}")
+        return generation_messages
+
+    def _finalize_generation(
+        self,
+        generation_messages: AIMessages,
+        generated: str,
+        ai_message_tbc: Optional[str] = None,
+        verbose: bool = True
+    ) -> AIMessage:
+        """
+        Store the generated text as the last AI message of the generation messages.
+
+        Args:
+            generation_messages: AIMessages object the generation was run from.
+            generated: Generated text, without the to be continued AI message text.
+            ai_message_tbc: Text that was prepended to the AI response, if any.
+            verbose: Whether to print the generated message.
 
+        Returns:
+            Generated AIMessage object.
+        """
         if ai_message_tbc is not None:
             generation_messages.edit_last_message(
                 ai_message_tbc + generated,
@@ -128,27 +209,177 @@ class AutoAI:
         else:
             generation_messages.add_ai_message(generated)
 
-        print(f"Generated: {generation_messages.get_last_message().text()}")
-        output = generation_messages.get_last_message()
-        return output
+        if verbose:
+            print(f"Generated: {generation_messages.get_last_message().text()}")
+        return generation_messages.get_last_message()
+
+    def generate(
+        self,
+        user_message: str,
+        ai_message_tbc: Optional[str] = None,
+        stop_at: Optional[Union[str, List[str]]] = None,
+        include_stop_str:bool = True,
+        system_message: Optional[str] = None,
+        grammar: Optional[str] = None,
+        json_schema: Optional[Union[dict, str]] = None,
+        regex: Optional[str] = None,
+        cancel: Optional[threading.Event] = None
+    ) -> AIMessage:
+        """
+        Generate an AI response to a user message.
+
+        Args:
+            user_message: User message text.
+            ai_message_tbc: Optional text to prepend.
+            stop_at: Optional string or list of strings to stop generation at.
+            include_stop_str: Whether to include the stop string in the generated message.
+            system_message: Optional system message to include at the start, not all models support this.
+            If you provide system message to a model that doesn't support it, it will be ignored.
+            You can check if a model supports system messages by checking the model_data.has_system_tags() method.
+            grammar: Optional GBNF grammar the generated text has to match, tokens that can't continue a match are masked while sampling.
+            json_schema: Optional JSON schema (dict or JSON text) the generated text has to match, instead of grammar.
+            regex: Optional regular expression the generated text has to match, instead of grammar, see `regex_to_gbnf()`.
+            cancel: Optional event stopping the generation after the current token once set, see generate_from_literal_string().
+        Returns:
+            Generated AIMessage object.
+        """
+        generation_messages = self._generation_messages(user_message, ai_message_tbc, system_message)
+        generated = self.generate_from_literal_string(generation_messages.text(), stop_at=stop_at, include_stop_str=include_stop_str, grammar=grammar, json_schema=json_schema, regex=regex, cancel=cancel)
+        return self._finalize_generation(generation_messages, generated, ai_message_tbc)
+
+    def generate_batch(
+        self,
+        user_messages: list[str],
+        ai_message_tbc: Optional[str] = None,
+        stop_at: Optional[Union[str, List[str]]] = None,
+        include_stop_str:bool = True,
+        system_message: Optional[str] = None
+    ) -> list[AIMessage]:
+        """
+        Generate AI responses to many independent user messages.
+
+        The prompts are generated in an order that lets the model reuse the evaluation of their shared prefix
+        (i.e. the system message), so it's faster than calling generate() in a loop. Prompts aren't printed.
+
+        Args:
+            user_messages: User message texts.
+            ai_message_tbc: Optional text to prepend to every response.
+            stop_at: Optional string or list of strings to stop generation at.
+            include_stop_str: Whether to include the stop string in the generated messages.
+            system_message: Optional system message to include at the start of every prompt, not all models support this.
+        Returns:
+            Generated AIMessage objects, in the order of the user messages.
+        """
+        batch_messages = [self._generation_messages(user_message, ai_message_tbc, system_message, verbose=False) for user_message in user_messages]
+        print(f"Generating {len(batch_messages)} responses...")
+        generated = generate_batch(self.ai, [generation_messages.text() for generation_messages in batch_messages], stop_at, include_stop_str, self.request_queue)
+        return [self._finalize_generation(generation_messages, text, ai_message_tbc, verbose=False) for generation_messages, text in zip(batch_messages, generated)]
+
+    def generate_stream(
+        self,
+        user_message: str,
+        ai_message_tbc: Optional[str] = None,
+        stop_at: Optional[Union[str, List[str]]] = None,
+        include_stop_str:bool = True,
+        system_message: Optional[str] = None,
+        on_complete: Optional[Callable[[AIMessage], None]] = None,
+        grammar: Optional[str] = None,
+        json_schema: Optional[Union[dict, str]] = None,
+        regex: Optional[str] = None
+    ) -> Iterator[str]:
+        """
+        Generate an AI response to a user message, yielding the text as it is generated.
+
+        Works like generate(), but returns right away with an iterator over text deltas.
+        If ai_message_tbc is provided it is yielded first.
+        The model is held in `self.request_queue` while the iterator runs, so exhaust or close it.
+
+        Args:
+            user_message: User message text.
+            ai_message_tbc: Optional text to prepend.
+            stop_at: Optional string or list of strings to stop generation at.
+            include_stop_str: Whether to include the stop string in the generated message.
+            system_message: Optional system message to include at the start, not all models support this.
+            on_complete: Optional callback receiving the finalized AIMessage once the stream ends or is closed.
+            grammar: Optional GBNF grammar the generated text has to match, tokens that can't continue a match are masked while sampling.
+            json_schema: Optional JSON schema (dict or JSON text) the generated text has to match, instead of grammar.
+            regex: Optional regular expression the generated text has to match, instead of grammar, see `regex_to_gbnf()`.
+        Returns:
+            Iterator over generated text deltas.
+        """
+        llama_grammar = build_grammar(grammar, json_schema, regex)
+        generation_messages = self._generation_messages(user_message, ai_message_tbc, system_message)
+        return self._stream_generation(generation_messages, stop_at, include_stop_str, ai_message_tbc, on_complete, llama_grammar)
+
+    def _stream_generation(
+        self,
+        generation_messages: AIMessages,
+        stop_at: Optional[Union[str, List[str]]],
+        include_stop_str: bool,
+        ai_message_tbc: Optional[str] = None,
+        on_complete: Optional[Callable[[AIMessage], None]] = None,
+        grammar: Optional[LlamaGrammar] = None
+    ) -> Iterator[str]:
+        generated = ""
+        try:
+            if ai_message_tbc is not None:
+                yield ai_message_tbc
+            with self.request_queue.hold():
+                for delta in stream_completion(self.ai, generation_messages.text(), stop_at, include_stop_str, grammar):
+                    generated += delta
+                    yield delta
+        finally:
+            ai_message = self._finalize_generation(generation_messages, generated, ai_message_tbc)
+            if on_complete is not None:
+                on_complete(ai_message)
+
+    def embed(
+        self,
+        texts: Union[str, list[str]],
+        batch_size: int = 32,
+        pooling: str = "mean",
+        normalize: bool = True
+    ) -> np.ndarray:
+        """
+        Compute embeddings of the texts with the model, see `Embedder.embed()`.
+
+        LlamaAI loads models with embeddings enabled by default. Each batch waits for the model in `self.request_queue`
+        and resets its evaluated tokens, so the next generation evaluates its whole prompt again instead of reusing the prefix.
+
+        Args:
+            texts: Text or list of texts to embed.
+            batch_size: Number of texts embedded in one model call. Defaults to 32.
+            pooling: How token embeddings are pooled, for models without their own pooling: "mean", "max", "first" or "last". Defaults to "mean".
+            normalize: Whether to scale the embeddings to unit length. Defaults to True.
+
+        Returns:
+            NumPy float32 array of embeddings, one row per text.
+        """
+        return Embedder(self.ai, self.request_queue).embed(texts, batch_size, pooling, normalize)
 
     def count_tokens(
         self,
         user_message: str,
-        ai_message_tbc: Optional[str] = None
+        ai_message_tbc: Optional[str] = None,
+        system_message: Optional[str] = None
     ) -> int:
         """
         Count the number of tokens in a generated message.
 
+        The rendered prompt is counted at once, as the model tokenizes it, and counts of recently counted prompts are reused.
+
         Args:
             user_message: User message text.
             ai_message_tbc: Optional text to prepend.
+            system_message: Optional system message, counted only if the model supports it.
 
         Returns:
             Number of tokens in generated message.
         """
-        generation_messages = AIMessages()
+        generation_messages = AIMessages(user_tags=self.model_data.user_tags, ai_tags=self.model_data.ai_tags, system_tags=self.model_data.system_tags)
         generation_messages.reset_messages()
+        if system_message is not None and generation_messages.has_system_tags():
+            generation_messages.set_system_message(system_message)
         generation_messages.add_user_message(user_message)
 
         if ai_message_tbc is not None:
@@ -157,7 +388,7 @@ class AutoAI:
                 self.msgs.ai_tag_open, 
                 ""
             )
-        return self.ai.count_tokens(generation_messages.text())
+        return self.token_counter(generation_messages.text())
     
     def is_within_input_limit(
         self,
@@ -0,0 +1,41 @@
+from typing import List, Optional, Union
+from gguf_llama import LlamaAI
+from .streaming import stream_tokens
+from .request_queue import RequestQueue
+
+__all__ = ['generate_batch']
+
+def generate_batch(
+    ai: LlamaAI,
+    prompts: List[str],
+    stop_at: Optional[Union[str, List[str]]] = None,
+    include_stop_str: bool = True,
+    request_queue: Optional[RequestQueue] = None
+) -> List[str]:
+    """
+    Generate completions for many independent prompts with one loaded LlamaAI model.
+
+    All prompts are tokenized up front and generated in sorted token order, so prompts sharing a prefix
+    (i.e. the same system message or template) follow each other and the model only evaluates the part
+    after the prefix it shares with the previous prompt. The shared prefix is evaluated once for the whole group.
+
+    Args:
+        ai: Loaded LlamaAI instance.
+        prompts: Prompt texts to generate from.
+        stop_at: Optional string or list of strings to stop generation at.
+        include_stop_str: Whether to include the stop string in the generated text.
+        request_queue: Optional RequestQueue to wait in for the model before each prompt.
+
+    Returns:
+        Generated texts, in the order of the prompts.
+    """
+    llm = ai.llm
+    prompt_tokens = [llm.tokenize(prompt.encode("utf-8"), special=True) for prompt in prompts]
+    generated = [""] * len(prompts)
+    for index in sorted(range(len(prompts)), key=lambda index: prompt_tokens[index]):
+        if request_queue is None:
+            generated[index] = "".join(stream_tokens(llm, prompt_tokens[index], stop_at, include_stop_str))
+            continue
+        with request_queue.hold():
+            generated[index] = "".join(stream_tokens(llm, prompt_tokens[index], stop_at, include_stop_str))
+    return generated
@@ -0,0 +1,210 @@
+from typing import Callable, Iterator, List, Optional, Union
+from gguf_llama import LlamaAI
+from ..messages import AIMessages, AIMessage, TokenCounter
+from .streaming import stream_tokens
+from .request_queue import RequestQueue
+
+__all__ = ['ChatSession']
+
+class ChatSession:
+    """
+    Multi-turn chat with a LlamaAI model that only evaluates the newly added messages on each turn.
+
+    Keeps the tokens the model has already evaluated, and appends only the tokens of messages added
+    since the previous turn. The model reuses its state for the shared token prefix, so the cost of a turn
+    doesn't grow with the length of the conversation. Messages are kept in an AIMessages object, the same as
+    everywhere else in the package.
+
+    Before each turn the oldest messages are dropped (or summarized) if the conversation and the reserved
+    generation budget don't fit in the max total tokens of the model. The system message is always kept.
+
+    Messages already submitted to the model shouldn't be edited or removed directly, call `resync()` if they were.
+
+    Args:
+        ai: Loaded LlamaAI instance.
+        messages: AIMessages with the model tags, may already contain messages (i.e. a system message).
+        reserve_tokens: Tokens to keep free for generation. Defaults to a quarter of the model max total tokens.
+        summarize: Optional function summarizing dropped messages, see `AIMessages.fit_to_token_budget()`.
+        token_counter: Optional TokenCounter of the model, one counting with `ai.count_tokens` is created if not provided.
+        request_queue: Optional RequestQueue to wait in for the model, when the model is shared between threads.
+
+    Attributes:
+        ai: LlamaAI instance used for generation.
+        messages: AIMessages with the conversation.
+        reserve_tokens: Tokens kept free for generation.
+        summarize: Optional function summarizing dropped messages.
+        token_counter: TokenCounter used to keep the conversation within the model context.
+        request_queue: RequestQueue the session waits in for the model, if any.
+    """
+    def __init__(self,
+                 ai: LlamaAI,
+                 messages: AIMessages,
+                 reserve_tokens: Optional[int] = None,
+                 summarize: Optional[Callable[[List[AIMessage]], str]] = None,
+                 token_counter: Optional[TokenCounter] = None,
+                 request_queue: Optional[RequestQueue] = None
+                 ) -> None:
+        self.ai = ai
+        self.messages = messages
+        self.reserve_tokens = reserve_tokens if reserve_tokens is not None else ai.llm.n_ctx() // 4
+        self.summarize = summarize
+        self.token_counter = token_counter if token_counter is not None else TokenCounter(ai.count_tokens)
+        self.request_queue = request_queue if request_queue is not None else RequestQueue()
+        self._tokens: List[int] = []
+        self._submitted_messages = 0
+        self._pending_text = ""
+
+    def _tokenize(self, text: str) -> List[int]:
+        return self.ai.llm.tokenize(text.encode("utf-8"), add_bos=len(self._tokens) == 0, special=True)
+
+    def resync(self) -> None:
+        """
+        Forget what was submitted to the model, the whole conversation is submitted again on the next turn.
+
+        The model still reuses whatever prefix of it is already evaluated.
+        """
+        self._tokens = []
+        self._submitted_messages = 0
+        self._pending_text = ""
+
+    def token_count(self) -> int:
+        """
+        Returns the number of tokens submitted to the model so far.
+        """
+        return len(self._tokens)
+
+    def fit_to_context(self) -> List[AIMessage]:
+        """
+        Drop (or summarize) the oldest messages until the conversation and the reserved generation budget fit in the model context.
+
+        Once trimming is needed, an extra reserve_tokens worth of old messages is dropped when possible,
+        so the remaining conversation isn't evaluated again from scratch on every following turn.
+
+        Returns:
+            The dropped messages, oldest first.
+        """
+        max_total_tokens = self.ai.llm.n_ctx()
+        if self.messages.count_tokens(self.token_counter) + self.reserve_tokens <= max_total_tokens:
+            return []
+        try:
+            dropped = self.messages.fit_to_token_budget(max_total_tokens, self.token_counter, 2 * self.reserve_tokens, self.summarize)
+        except ValueError:
+            dropped = self.messages.fit_to_token_budget(max_total_tokens, self.token_counter, self.reserve_tokens, self.summarize)
+        self.resync()
+        return dropped
+
+    def _default_stop(self) -> Optional[str]:
+        ai_tag_close = self.messages.ai_tag_close
+        return ai_tag_close if ai_tag_close and ai_tag_close != " " else None
+
+    def _submit_new_messages(self, ai_tag_open: str) -> None:
+        """
+        Tokenize the text of messages added since the previous turn and append it to the submitted tokens.
+
+        Args:
+            ai_tag_open: Text opening the AI response that comes after the new messages.
+        """
+        all_messages = self.messages.message_list()
+        new_text = self._pending_text + "".join(str(message) for message in all_messages[self._submitted_messages:]) + ai_tag_open
+        self._tokens += self._tokenize(new_text)
+        self._submitted_messages = len(all_messages)
+        self._pending_text = ""
+
+    def _keep_generated_tokens(self, generated_tokens: List[int], generated: str) -> None:
+        """
+        Keep the generated tokens that exactly spell the start of the generated text, the rest of it is submitted on the next turn.
+
+        Args:
+            generated_tokens: Tokens sampled by the model.
+            generated: Generated text stored in the AI message, after applying the stop string.
+        """
+        generated_bytes = generated.encode("utf-8")
+        kept_bytes = b""
+        for token in generated_tokens:
+            token_bytes = self.ai.llm.detokenize([token])
+            if not generated_bytes.startswith(kept_bytes + token_bytes):
+                break
+            kept_bytes += token_bytes
+            self._tokens.append(token)
+        self._pending_text = generated_bytes[len(kept_bytes):].decode("utf-8", errors="ignore") + self.messages.ai_tag_close
+        self._submitted_messages = len(self.messages)
+
+    def stream(self,
+               user_message: str,
+               ai_message_tbc: Optional[str] = None,
+               stop_at: Optional[Union[str, List[str]]] = None,
+               include_stop_str: bool = True,
+               on_complete: Optional[Callable[[AIMessage], None]] = None
+               ) -> Iterator[str]:
+        """
+        Add the user message and generate the AI response, yielding the text as it is generated.
+
+        Once the iterator is exhausted (or closed early) the AI response is the last message of `self.messages`.
+
+        Args:
+            user_message: User message text.
+            ai_message_tbc: Optional text to prepend to AI response, it's yielded first.
+            stop_at: Optional string or list of strings to stop generation at. Defaults to the AI closing tag, which is then not included.
+            include_stop_str: Whether to include stop string in generated message.
+            on_complete: Optional callback receiving the finalized AIMessage.
+
+        Returns:
+            Iterator over generated text deltas.
+        """
+        if stop_at is None:
+            stop_at = self._default_stop()
+            include_stop_str = False
+        self.messages.add_user_message(user_message)
+        self.fit_to_context()
+        if ai_message_tbc is not None:
+            self.messages.add_message(ai_message_tbc, self.messages.ai_tag_open, "")
+            self._submit_new_messages("")
+        else:
+            self._submit_new_messages(self.messages.ai_tag_open)
+        return self._stream(stop_at, include_stop_str, ai_message_tbc, on_complete)
+
+    def _stream(self,
+                stop_at: Optional[Union[str, List[str]]],
+                include_stop_str: bool,
+                ai_message_tbc: Optional[str] = None,
+                on_complete: Optional[Callable[[AIMessage], None]] = None
+                ) -> Iterator[str]:
+        generated = ""
+        generated_tokens: List[int] = []
+        try:
+            if ai_message_tbc is not None:
+                yield ai_message_tbc
+            with self.request_queue.hold():
+                for delta in stream_tokens(self.ai.llm, self._tokens, stop_at, include_stop_str, generated_tokens):
+                    generated += delta
+                    yield delta
+        finally:
+            if ai_message_tbc is not None:
+                self.messages.edit_last_message(ai_message_tbc + generated, self.messages.ai_tag_open, self.messages.ai_tag_close)
+            else:
+                self.messages.add_ai_message(generated)
+            self._keep_generated_tokens(generated_tokens, generated)
+            if on_complete is not None:
+                on_complete(self.messages.get_last_message())
+
+    def send(self,
+             user_message: str,
+             ai_message_tbc: Optional[str] = None,
+             stop_at: Optional[Union[str, List[str]]] = None,
+             include_stop_str: bool = True
+             ) -> AIMessage:
+        """
+        Add the user message and generate the AI response.
+
+        Args:
+            user_message: User message text.
+            ai_message_tbc: Optional text to prepend to AI response.
+            stop_at: Optional string or list of strings to stop generation at. Defaults to the AI closing tag, which is then not included.
+            include_stop_str: Whether to include stop string in generated message.
+
+        Returns:
+            Generated AIMessage object.
+        """
+        for _ in self.stream(user_message, ai_message_tbc, stop_at, include_stop_str):
+            pass
+        return self.messages.get_last_message()
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import requests
+from gguf_modeldb import ModelData
+
+__all__ = ['download_file', 'download_model']
+
+_SHA256_RE = re.compile(r'^"?([0-9a-f]{64})"?$')
+
+def _expected_sha256(response: requests.Response) -> Optional[str]:
+    """
+    Returns the sha256 of the file announced by the server, if any.
+
+    HuggingFace sends the sha256 of LFS files as X-Linked-Etag, or as ETag, before redirecting to the CDN.
+    """
+    for r in [*response.history, response]:
+        for header in ("X-Linked-Etag", "ETag"):
+            match = _SHA256_RE.match(r.headers.get(header, "").removeprefix("W/"))
+            if match:
+                return match.group(1)
+    return None
+
+def _file_sha256(file_path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        buffer = bytearray(16 << 20)
+        view = memoryview(buffer)
+        while True:
+            size = file.readinto(buffer)
+            if not size:
+                break
+            sha256.update(view[:size])
+    return sha256.hexdigest()
+
+def _print_progress(done: int, total: int) -> None:
+    print(f"\rDownloaded {done / (1 << 20):.1f}/{total / (1 << 20):.1f} MB ({100 * done / max(total, 1):.0f}%)", end="", flush=True)
+
+def _download_stream(session: requests.Session, url: str, part_path: str, timeout: float) -> None:
+    """
+    Download the whole file in one request, for servers without range request support.
+    """
+    with session.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        total = int(response.headers.get("Content-Length", 0))
+        done = 0
+        with open(part_path, "wb") as file:
+            for data in response.iter_content(1 << 20):
+                file.write(data)
+                done += len(data)
+                _print_progress(done, total)
+
+def _download_ranges(session: requests.Session, url: str, part_path: str, total: int, connections: int, chunk_size: int, timeout: float) -> None:
+    """
+    Download the file in chunks with parallel range requests, skipping chunks already recorded as done in the state file.
+    """
+    state_path = part_path + ".json"
+    done_chunks = set()
+    if os.path.isfile(part_path) and os.path.getsize(part_path) == total and os.path.isfile(state_path):
+        with open(state_path, "r") as state_file:
+            state = json.load(state_file)
+        if state.get("url") == url and state.get("size") == total and state.get("chunk_size") == chunk_size:
+            done_chunks = set(state["done"])
+            print(f"Resuming download, {len(done_chunks)} chunks already downloaded.")
+    else:
+        with open(part_path, "wb") as file:
+            file.truncate(total)
+    lock = threading.Lock()
+    chunks = [index for index in range((total + chunk_size - 1) // chunk_size) if index not in done_chunks]
+    progress = [min(len(done_chunks) * chunk_size, total)]
+
+    def save_state() -> None:
+        with open(state_path, "w") as state_file:
+            json.dump({"url": url, "size": total, "chunk_size": chunk_size, "done": sorted(done_chunks)}, state_file)
+
+    def download_chunk(index: int) -> None:
+        start = index * chunk_size
+        end = min(start + chunk_size, total) - 1
+        with session.get(url, headers={"Range": f"bytes={start}-{end}"}, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise Exception(f"Server ignored the range request for {url}.")
+            with open(part_path, "r+b") as file:
+                file.seek(start)
+                for data in response.iter_content(1 << 20):
+                    file.write(data)
+                if file.tell() != end + 1:
+                    raise Exception(f"Incomplete chunk {index} of {url}.")
+        with lock:
+            done_chunks.add(index)
+            save_state()
+            progress[0] += end + 1 - start
+            _print_progress(progress[0], total)
+
+    with ThreadPoolExecutor(max_workers=connections, thread_name_prefix="glai-download") as executor:
+        for future in [executor.submit(download_chunk, index) for index in chunks]:
+            future.result()
+    if os.path.isfile(state_path):
+        os.remove(state_path)
+
+def download_file(url: str,
+                  file_path: str,
+                  connections: int = 4,
+                  chunk_size: int = 32 << 20,
+                  sha256: Optional[str] = None,
+                  timeout: float = 60
+                  ) -> str:
+    """
+    Download a file with parallel HTTP range requests, resuming an interrupted download and verifying its sha256.
+
+    The file is downloaded to `file_path + ".part"` and moved to file_path once complete and verified.
+    Downloaded chunks are recorded next to it, so running the download again after an interruption
+    only fetches the missing chunks. Servers without range request support are downloaded from in one request.
+    If sha256 isn't provided, the one sent by the server (i.e. HuggingFace X-Linked-Etag header) is used, if any.
+
+    Args:
+        url: URL of the file.
+        file_path: Path to save the file to.
+        connections: Number of parallel range requests. Defaults to 4.
+        chunk_size: Size of each range request in bytes. Defaults to 32 MB.
+        sha256: Optional expected sha256 hex digest of the file.
+        timeout: Seconds to wait for the server before failing a request.
+
+    Returns:
+        Path to the downloaded file.
+
+    Raises:
+        Exception: If the download fails or the file doesn't match the sha256.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+    part_path = file_path + ".part"
+    with requests.Session() as session:
+        head = session.head(url, allow_redirects=True, timeout=timeout)
+        head.raise_for_status()
+        sha256 = sha256 or _expected_sha256(head)
+        total = int(head.headers.get("Content-Length", 0))
+        print(f"Downloading {url} to {file_path}")
+        try:
+            if total > 0 and head.headers.get("Accept-Ranges", "").lower() == "bytes":
+                _download_ranges(session, url, part_path, total, max(1, connections), chunk_size, timeout)
+            else:
+                _download_stream(session, url, part_path, timeout)
+        finally:
+            print()
+    if sha256 is not None:
+        print("Verifying sha256...")
+        if _file_sha256(part_path) != sha256.lower():
+            os.remove(part_path)
+            raise Exception(f"Downloaded file {url} doesn't match sha256 {sha256}, removed it.")
+    os.replace(part_path, file_path)
+    print(f"Downloaded {file_path}")
+    return file_path
+
+def download_model(model_data: ModelData, connections: int = 4) -> str:
+    """
+    Download the GGUF file of the model data if it's not downloaded yet, see download_file().
+
+    HuggingFace page URLs (`/blob/main/...`) are converted to the file download URL (`/resolve/main/...?download=true`) first.
+
+    Args:
+        model_data: ModelData of the model.
+        connections: Number of parallel range requests.
+
+    Returns:
+        Path to the GGUF file.
+
+    Raises:
+        Exception: If the file isn't downloaded and the model data has no URL, or the download fails.
+    """
+    file_path = model_data.gguf_file_path
+    if os.path.isfile(file_path):
+        return file_path
+    if not model_data.gguf_url:
+        raise Exception(f"Model file {file_path} not found and model data has no URL to download it from.")
+    url = model_data.gguf_url
+    if "huggingface.co" in url:
+        url = ModelData._hf_url_to_download_url(url)
+    return download_file(url, file_path, connections)
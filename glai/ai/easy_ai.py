@@ -1,7 +1,26 @@
-from typing import Optional, Tuple, Union
-from ..messages import AIMessages, AIMessage
+import json
+import threading
+import weakref
+import numpy as np
+from typing import Callable, Iterator, List, Optional, Tuple, Union
+from ..messages import AIMessages, AIMessage, TokenCounter
 from gguf_modeldb import ModelDB, ModelData, VERIFIED_MODELS_DB_DIR
 from gguf_llama import LlamaAI
+from llama_cpp import LlamaGrammar
+from .streaming import stream_completion
+from .batch import generate_batch
+from .prompt_cache import PromptCache
+from .chat_session import ChatSession
+from .request_queue import RequestQueue
+from .model_registry import ModelRegistry, MODEL_REGISTRY
+from .download import download_model
+from .model_index import MODEL_INDEX, get_model_db
+from .repo_import import RepoImporter
+from .speculative import LlamaAIDraftModel
+from .response_cache import ResponseCache
+from .embeddings import Embedder
+from .semantic_cache import SemanticCache
+from .grammar import build_grammar
 
 __all__ = ['EasyAI']
 
@@ -42,29 +61,63 @@ class EasyAI:
         model_db: ModelDB for searching/loading models
         messages: AIMessages for tracking conversation 
         model_data: ModelData of selected model
+        draft_model_data: Optional ModelData of a smaller model of the same family, drafting tokens for speculative decoding
         lai: LlamaAI instance for generating text
+        prompt_cache: Optional PromptCache keeping evaluated prompt prefixes (i.e. system prompts)
+        response_cache: Optional ResponseCache answering repeated prompts of generate() without running the model, can be shared between objects
+        semantic_cache: Optional SemanticCache answering prompts of generate() similar to already answered ones without running the model
+        token_counter: TokenCounter of the loaded model, caching recent token counts
+        request_queue: RequestQueue giving concurrent generations access to the model in order of arrival, set its max_pending to limit waiting requests.
+            Shared by all objects using the same model from the model registry.
+        model_registry: ModelRegistry the model is loaded from, objects loading the same model with the same parameters share it
 
     Methods:
         DB:
             load_model_db: Load ModelDB from directory
         ModelData:
             find_model_data: Search model DB for ModelData
+            find_draft_model_data: Search model DB for ModelData of a draft model for speculative decoding
             model_data_from_url: Get ModelData from URL
             model_data_from_file: Load ModelData from file
         Load to memory:
-            load_ai: Create LlamaAI instance from ModelData
+            load_ai: Get shared LlamaAI instance for ModelData from the model registry
+            unload_ai: Release the LlamaAI instance to the model registry
+            enable_prompt_cache: Keep evaluated system prompts and pinned prefixes between generations
+            pin_prompt_prefix: Evaluate and keep a prompt prefix until unpinned
+            enable_response_cache: Answer repeated prompts of generate() from a ResponseCache
+            enable_semantic_cache: Answer prompts of generate() similar to already answered ones from a SemanticCache
+            warmup: Pre-read the weights, evaluate a dummy prompt and pin system messages, then mark the model ready
+            is_ready / wait_until_ready: Check or wait for the warmup to finish
         Inference:
             infer: Generate AI response to user message
+            generate_stream: Generate AI response to user message, yielding text as it's generated
+            generate_batch: Generate AI responses to many independent user messages
+            start_chat: Start a multi-turn ChatSession with the loaded model
+            embed: Compute embeddings of texts with the loaded model
 
     EasyAI handles loading models, setting up messages/LLamaAI,
     and generating responses. It provides a simple interface to using
     LLama
+    
+    Generation methods can be called from multiple threads, they take turns using the model through `request_queue`.
     """
     def __init__(self, **kwds) -> None:
         self.model_db: ModelDB = None
         self.messages: Optional[AIMessages] = None
         self.model_data: Optional[ModelData] = None
+        self.draft_model_data: Optional[ModelData] = None
         self.ai: Optional[LlamaAI] = None
+        self.prompt_cache: Optional[PromptCache] = None
+        self.response_cache: Optional[ResponseCache] = None
+        self.semantic_cache: Optional[SemanticCache] = None
+        self.cache_system_messages: bool = True
+        self.token_counter: Optional[TokenCounter] = None
+        self.request_queue: RequestQueue = RequestQueue()
+        self.model_registry: ModelRegistry = MODEL_REGISTRY
+        self._release_model: Optional[weakref.finalize] = None
+        self._model_key: Optional[Tuple] = None
+        self._release_embedding_model: Optional[weakref.finalize] = None
+        self._ready = threading.Event()
         if kwds:
             self.configure(**kwds)
 
@@ -77,6 +130,12 @@ class EasyAI:
                   keyword_search: Optional[str] = None,
                   search_only_downloaded: bool = False,
                   max_total_tokens: int = 200,
+                  llama_kwargs: Optional[dict] = None,
+                  warmup: bool = False,
+                  draft_name_search: Optional[str] = None,
+                  draft_quantization_search: Optional[str] = None,
+                  draft_keyword_search: Optional[str] = None,
+                  num_draft_tokens: int = 8,
                                             ) -> None:
         """
         Configure EasyAI with model data.
@@ -87,6 +146,11 @@ class EasyAI:
         Args:
             model_db_dir: Directory to store model data in. If none is provided global db is used.This is preferred for most use cases.
             max_total_tokens: Max tokens to be processed (input+generation) by LlamaAI model. (Defaults to 200, set to around 500-1k for regular use)
+            llama_kwargs: Optional extra keyword arguments for the llama model, i.e. {"n_threads": 4}.
+            warmup: Whether to warm up the model in the background after loading, see warmup().
+            draft_name_search, draft_quantization_search, draft_keyword_search: Optional search for a smaller model of the same family in the model db,
+                to draft tokens for speculative decoding, see find_draft_model_data().
+            num_draft_tokens: Number of tokens drafted per evaluation of the model, when using a draft model.
             
             Provide at least one of these args to fetch ModelData: 
             ---
@@ -113,8 +177,10 @@ class EasyAI:
             self.find_model_data(name_search, quantization_search, keyword_search, search_only_downloaded)
         else:
             raise Exception("Can't find model data. Please provide a model URL, GGUF file path, or model name/quantization/keyword.")
+        if draft_name_search is not None or draft_quantization_search is not None or draft_keyword_search is not None:
+            self.find_draft_model_data(draft_name_search, draft_quantization_search, draft_keyword_search, search_only_downloaded)
         
-        self.load_ai(max_total_tokens)
+        self.load_ai(max_total_tokens, llama_kwargs, warmup, num_draft_tokens)
     
 
 
@@ -126,11 +192,14 @@ class EasyAI:
         """
         Load ModelDB from given directory.
 
+        The ModelDB of the directory is reused if it was already loaded in this process and no files were added or removed since.
+        It's created on first use, so models found in the persisted MODEL_INDEX are loaded without scanning the DB.
+
         Args:
             db_dir: Directory to load ModelDB from.
             copy_examples: Whether to copy example GGUF files to db_dir if db_dir is empty.
         """
-        self.model_db = ModelDB(model_db_dir=db_dir, copy_verified_models=copy_verified_models)
+        self.model_db = get_model_db(db_dir, copy_verified_models)
 
     def import_verified_models_to_db(self, model_name_quantization_list:Optional[list[Union[list,set,tuple]]] = None) -> None:
         """
@@ -161,7 +230,8 @@ class EasyAI:
 
         Searches model database for model data matching the given model name, 
         quantization, and/or keyword. Any parameters left as None are not used  
-        in the search.
+        in the search. Results are kept in the persisted MODEL_INDEX, so repeated searches
+        don't scan the database until files in its directory are added or removed.
 
         Args:
             model_name: Name of model to search for.
@@ -173,10 +243,43 @@ class EasyAI:
         """
         if self.model_db is None:
             raise Exception("No model DB loaded. Use load_model_db() first.")
-        model_data = self.model_db.find_model(model_name, quantization, keyword, only_downloaded)
+        model_data = MODEL_INDEX.find_model(self.model_db, model_name, quantization, keyword, only_downloaded)
         self.model_data = model_data
         return model_data
 
+    def find_draft_model_data(self,
+                              model_name: Optional[str] = None,
+                              quantization: Optional[str] = None,
+                              keyword: Optional[str] = None,
+                              only_downloaded: bool = False) -> ModelData:
+        """
+        Find model data of a draft model for speculative decoding in database, see find_model_data().
+
+        The draft model should be a smaller model of the same family as the main model, so they share the vocabulary,
+        i.e. a 1-3B model drafting for a 7-13B one. It drafts a few tokens at a time, which the main model verifies in one evaluation,
+        speeding up generation when most drafted tokens are accepted. Used by the next load_ai() call.
+
+        Args:
+            model_name: Name of model to search for.
+            quantization: Quantization of model to search for.
+            keyword: Keyword of model to search for.
+            only_downloaded: Whether to search only models with downloaded GGUF files.
+
+        Returns:
+            ModelData object of the draft model.
+
+        Raises:
+            Exception: If no model DB loaded.
+            Exception: If no model data found.
+        """
+        if self.model_db is None:
+            raise Exception("No model DB loaded. Use load_model_db() first.")
+        model_data = MODEL_INDEX.find_model(self.model_db, model_name, quantization, keyword, only_downloaded)
+        if model_data is None:
+            raise Exception(f"Can't find draft model data for name: {model_name}, quantization: {quantization}, keyword: {keyword}.")
+        self.draft_model_data = model_data
+        return model_data
+
     def model_data_from_url(self,
                             url: str,
                             user_tags: Tuple[str, str] = ("", ""),
@@ -255,14 +358,22 @@ class EasyAI:
         self.messages = AIMessages(user_tags=self.model_data.user_tags, ai_tags=self.model_data.ai_tags, system_tags=self.model_data.system_tags)
 
     def load_ai(self,
-                max_total_tokens: int = 200,) -> None:
+                max_total_tokens: int = 200,
+                llama_kwargs: Optional[dict] = None,
+                warmup: bool = False,
+                num_draft_tokens: int = 8) -> None:
         """
         Load LlamaAI model from model data.
 
-        Downloads model file from model data URL if needed. Initializes LlamaAI with model and sets lai attribute.
+        Downloads model file from model data URL if needed, with parallel resumable download, see `download_file()`. Gets LlamaAI for the model from the model registry and sets ai attribute,
+        the model is shared with other objects that loaded the same model with the same parameters. Releases the previously loaded model.
+        If draft model data is set, see find_draft_model_data(), the model uses it for speculative decoding.
 
         Args:
             max_total_tokens: Max tokens for LlamaAI model.
+            llama_kwargs: Optional extra keyword arguments for the llama model, i.e. {"n_threads": 4}.
+            warmup: Whether to warm up the model in the background after loading, see warmup().
+            num_draft_tokens: Number of tokens drafted per evaluation of the model, when using a draft model.
         Raises:
             Exception: If no model data or messages loaded yet.
         """
@@ -271,88 +382,569 @@ class EasyAI:
             raise Exception("No messages loaded. Use load_messages() first.")
         if self.model_data is None:
             raise Exception("No model data loaded. Use find_model_data(), get_model_data_from_url(), or get_model_data_from_file() first.")
-        self.model_data.download_gguf()
-        self.ai = LlamaAI(self.model_data.model_path(), max_tokens=max_total_tokens)
+        download_model(self.model_data)
+        if self.draft_model_data is not None:
+            download_model(self.draft_model_data)
+            draft_model = LlamaAIDraftModel(self.draft_model_data.model_path(), max_total_tokens, num_draft_tokens)
+            llama_kwargs = {**(llama_kwargs or {}), "draft_model": draft_model}
+        handle = self.model_registry.acquire(self.model_data.model_path(), max_total_tokens, llama_kwargs)
+        self.unload_ai()
+        self._release_model = weakref.finalize(self, handle.release)
+        self.ai = handle.ai
+        self._model_key = handle.key
+        self.request_queue = handle.request_queue
+        self.token_counter = TokenCounter(self.ai.count_tokens, key=self.model_data.model_path())
+        if self.prompt_cache is not None:
+            self.prompt_cache = PromptCache(self.ai, self.prompt_cache.capacity_bytes)
+        if self.semantic_cache is not None and self._release_embedding_model is None:
+            self.semantic_cache.embedder = Embedder(self.ai, self.request_queue)
         print(f"Loaded: {self.model_data}")
+        if self.draft_model_data is not None:
+            print(f"Speculative decoding with draft model: {self.draft_model_data}")
+        if warmup:
+            self.warmup(background=True)
+
+    def unload_ai(self) -> None:
+        """
+        Release the loaded LlamaAI model to the model registry, which unloads it once it's not used by other objects and over the registry budget.
+        """
+        self._ready.clear()
+        if self._release_model is not None:
+            self._release_model()
+            self._release_model = None
+        self.ai = None
+        if self.prompt_cache is not None:
+            self.prompt_cache.clear()
+        if self.semantic_cache is not None and self._release_embedding_model is None:
+            # Cached embeddings belong to the unloaded model
+            self.semantic_cache.embedder = None
+            self.semantic_cache.clear()
+
+    def enable_prompt_cache(self, capacity_bytes: int = 2 << 30, cache_system_messages: bool = True) -> None:
+        """
+        Keep evaluated model states of prompt prefixes between generations.
+
+        The model already reuses the prefix shared with the previous prompt, the prompt cache
+        additionally keeps the states of system messages and pinned prefixes, so switching between
+        a few different system messages doesn't require evaluating them again.
+
+        Args:
+            capacity_bytes: Max size of the saved model states. Defaults to 2 GiB, a 7B model state takes roughly 0.5 MB per token.
+            cache_system_messages: Whether to automatically cache the system message of each generation.
+
+        Raises:
+            Exception: If no AI loaded yet.
+        """
+        if self.ai is None:
+            raise Exception("No AI loaded. Use load_ai() first.")
+        self.prompt_cache = PromptCache(self.ai, capacity_bytes)
+        self.cache_system_messages = cache_system_messages
+
+    def enable_response_cache(self, capacity: int = 1024, ttl: Optional[float] = None, cache_dir: Optional[str] = None, normalize: bool = False) -> ResponseCache:
+        """
+        Answer repeated prompts of generate() from a ResponseCache instead of running the model.
+
+        Responses are keyed by the loaded model and its parameters, the full prompt and the stop settings, see `ResponseCache`.
+        Every repeat of a prompt gets the first generated response, so use it where that's expected, i.e. for templated queries.
+        To share a cache between objects, assign the same ResponseCache to their `response_cache`.
+
+        Args:
+            capacity: Max number of responses kept in memory. Defaults to 1024.
+            ttl: Optional seconds after which cached responses expire.
+            cache_dir: Optional directory to also keep responses in on disk.
+            normalize: Whether prompts differing only in whitespace share cached responses.
+
+        Returns:
+            The ResponseCache.
+        """
+        self.response_cache = ResponseCache(capacity, ttl, cache_dir, normalize)
+        return self.response_cache
+
+    def enable_semantic_cache(self,
+                              threshold: float = 0.95,
+                              capacity: int = 1024,
+                              name_search: Optional[str] = None,
+                              quantization_search: Optional[str] = None,
+                              keyword_search: Optional[str] = None,
+                              max_total_tokens: int = 512) -> SemanticCache:
+        """
+        Answer prompts of generate() similar to already answered ones from a SemanticCache instead of running the model.
+
+        User messages are embedded and compared to the ones already answered with the same model, system message,
+        AI message to be continued and stop settings. The response of the most similar one is returned if its cosine similarity reaches the threshold.
+        Embeddings are computed with a small embedding model searched in the model DB, or with the loaded model if no search is given.
+        Prefer an embedding model: embedding with the loaded model resets its evaluated tokens, so every cache lookup
+        discards the prompt prefix the following generation would otherwise reuse.
+
+        Args:
+            threshold: Min cosine similarity of an answered user message to return its response. Defaults to 0.95.
+            capacity: Max number of cached responses per system message and settings. Defaults to 1024.
+            name_search: Optional name of the embedding model to search for in the model DB.
+            quantization_search: Optional quantization of the embedding model to search for.
+            keyword_search: Optional keyword of the embedding model to search for.
+            max_total_tokens: Max tokens for the embedding model, the max length of embedded user messages.
+
+        Returns:
+            The SemanticCache.
+
+        Raises:
+            Exception: If no AI loaded yet and no embedding model search given.
+            Exception: If no embedding model found.
+        """
+        if self._release_embedding_model is not None:
+            self._release_embedding_model()
+            self._release_embedding_model = None
+        if name_search is None and quantization_search is None and keyword_search is None:
+            if self.ai is None:
+                raise Exception("No AI loaded. Use load_ai() first or provide an embedding model search.")
+            embedder = Embedder(self.ai, self.request_queue)
+        else:
+            if self.model_db is None:
+                raise Exception("No model DB loaded. Use load_model_db() first.")
+            model_data = MODEL_INDEX.find_model(self.model_db, name_search, quantization_search, keyword_search)
+            if model_data is None:
+                raise Exception(f"Can't find embedding model data for name: {name_search}, quantization: {quantization_search}, keyword: {keyword_search}.")
+            download_model(model_data)
+            handle = self.model_registry.acquire(model_data.model_path(), max_total_tokens, {"embedding": True})
+            self._release_embedding_model = weakref.finalize(self, handle.release)
+            embedder = Embedder(handle.ai, handle.request_queue)
+            print(f"Loaded embedding model: {model_data}")
+        self.semantic_cache = SemanticCache(embedder, threshold, capacity)
+        return self.semantic_cache
+
+    def pin_prompt_prefix(self, prefix: Optional[str] = None, system_message: Optional[str] = None) -> int:
+        """
+        Evaluate a prompt prefix and keep its model state until the prompt cache is cleared.
+
+        Enables the prompt cache with default settings if it's not enabled yet.
+
+        Args:
+            prefix: Literal prompt prefix text, including any tags.
+            system_message: System message to pin, it's wrapped with the model system tags. Used if prefix is None.
+
+        Returns:
+            Number of tokens in the pinned prefix.
+
+        Raises:
+            Exception: If no AI loaded yet or neither prefix nor system message provided.
+        """
+        if self.prompt_cache is None:
+            self.enable_prompt_cache()
+        if prefix is None:
+            if system_message is None:
+                raise Exception("Provide a prefix or a system message to pin.")
+            prefix = self._system_prefix(system_message)
+        with self.request_queue.hold():
+            return self.prompt_cache.pin(prefix)
+
+    def warmup(self,
+               system_messages: Optional[list[str]] = None,
+               background: bool = False,
+               on_ready: Optional[Callable[["EasyAI"], None]] = None
+               ) -> Optional[threading.Thread]:
+        """
+        Prepare the loaded model for fast first generations and mark it ready.
+
+        Reads the whole model file, so the memory mapped weights are in the page cache and the first
+        generation doesn't wait for the disk, then evaluates a short dummy prompt to set up the model buffers.
+        System messages are pinned in the prompt cache, so generations using them don't evaluate them again.
+
+        Args:
+            system_messages: Optional system messages to pin in the prompt cache, ignored if the model doesn't support them.
+            background: Whether to warm up in a background thread and return right away.
+            on_ready: Optional callback receiving this EasyAI once it's ready.
+
+        Returns:
+            The warmup thread if running in the background, otherwise None.
+
+        Raises:
+            Exception: If no AI loaded yet.
+        """
+        if self.ai is None:
+            raise Exception("No AI loaded. Use load_ai() first.")
+        if background:
+            thread = threading.Thread(target=self.warmup, args=(system_messages, False, on_ready), name="glai-warmup", daemon=True)
+            thread.start()
+            return thread
+        print("Warming up the model...")
+        with open(self.model_data.model_path(), "rb") as model_file:
+            buffer = bytearray(16 << 20)
+            while model_file.readinto(buffer):
+                pass
+        with self.request_queue.hold():
+            llm = self.ai.llm
+            llm.reset()
+            llm.eval(llm.tokenize(AIMessages.create_single_message("Hello", *self.messages.user_tags()).text().encode("utf-8"), special=True))
+            llm.reset()
+        if system_messages and self.messages.has_system_tags():
+            for system_message in system_messages:
+                self.pin_prompt_prefix(system_message=system_message)
+        self._ready.set()
+        print("Model is ready.")
+        if on_ready is not None:
+            on_ready(self)
+        return None
+
+    def is_ready(self) -> bool:
+        """
+        Returns whether the loaded model has been warmed up, see warmup().
+        """
+        return self._ready.is_set()
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the warmup of the loaded model to finish.
+
+        Args:
+            timeout: Optional max seconds to wait.
+
+        Returns:
+            Whether the model is ready.
+        """
+        return self._ready.wait(timeout)
+
+    def _system_prefix(self, system_message: str) -> str:
+        """
+        Returns the system message wrapped with the model system tags, as it starts the prompt.
+        """
+        return AIMessages.create_single_message(system_message, self.messages.system_tag_open, self.messages.system_tag_close).text()
+
+    def _prepare_prompt_cache(self, prompt: str, system_message: Optional[str] = None) -> None:
+        """
+        Restore the best cached prefix state for the prompt, caching the system message first if configured to.
+        """
+        if self.prompt_cache is None:
+            return
+        if self.cache_system_messages and system_message is not None and self.messages.has_system_tags():
+            self.prompt_cache.add(self._system_prefix(system_message))
+        self.prompt_cache.prepare(prompt)
+
+    def _generation_messages(self,
+                             user_message: str,
+                             ai_message_tbc: Optional[str] = None,
+                             system_message: Optional[str] = None,
+                             verbose: bool = True
+                             ) -> AIMessages:
+        """
+        Create fresh AIMessages with the system, user and to be continued AI messages for a single generation.
+
+        Every generation gets its own messages, so concurrent generations don't interfere with each other.
+
+        Args:
+            user_message: User message text.
+            ai_message_tbc: Optional text to prepend to AI response.
+            system_message: Optional system message to include at the start.
+            verbose: Whether to print warnings and the input to model.
+
+        Returns:
+            AIMessages object to generate from.
+
+        Raises:
+            Exception: If no AI or messages loaded yet.
+        """
+        if self.ai is None:
+            raise Exception("No AI loaded. Use load_ai() first.")
+        if self.messages is None:
+            raise Exception("No messages loaded. Use load_ai() first.")
+        generation_messages = AIMessages(user_tags=self.messages.user_tags(), ai_tags=self.messages.ai_tags(), system_tags=self.messages.system_tags())
+        if generation_messages.has_system_tags():
+            if system_message is not None:
+                generation_messages.set_system_message(system_message)
+            elif verbose:
+                print("WARNING: Model supports system messages, but no system message provided.")
+        generation_messages.add_user_message(user_message)
+        if verbose:
+            print(f"Input to model: \n{generation_messages.text()}")
+        if ai_message_tbc is not None:
+            generation_messages.add_message(ai_message_tbc, self.messages.ai_tag_open, "")
+        return generation_messages
+
+    def _default_stop(self, stop_at: Optional[Union[str, List[str]]], include_stop_str: bool) -> Tuple[Optional[Union[str, List[str]]], bool]:
+        """
+        Returns the stop strings and include stop string flag to generate with, stopping at the AI closing tag by default.
+        """
+        if stop_at is None:
+            stop_at = self.messages.ai_tag_close if any([self.messages.ai_tag_close is None, self.messages.ai_tag_close == "", self.messages.ai_tag_close != " "]) else None
+            include_stop_str = False
+        return stop_at, include_stop_str
+
+    def _finalize_generation(self, generation_messages: AIMessages, generated: str, ai_message_tbc: Optional[str] = None) -> AIMessage:
+        """
+        Store the generated text as the last AI message and make the generation messages the current `self.messages`.
+
+        Args:
+            generation_messages: AIMessages object the generation was run from.
+            generated: Generated text, including the to be continued AI message text if any.
+            ai_message_tbc: Text that was prepended to the AI response, if any.
+
+        Returns:
+            Generated AIMessage object.
+        """
+        if ai_message_tbc is not None:
+            generation_messages.edit_last_message(generated,
+                                                  self.messages.ai_tag_open,
+                                                  self.messages.ai_tag_close)
+        else:
+            generation_messages.add_ai_message(generated)
+        self.messages = generation_messages
+        print(f"AI message: \n{generation_messages.get_last_message()}")
+        return generation_messages.get_last_message()
 
     def generate(self,
               user_message: str,
               ai_message_tbc: Optional[str] = None,
-              stop_at:Optional[str]=None,
+              stop_at: Optional[Union[str, List[str]]]=None,
               include_stop_str:bool=True,
-              system_message: Optional[str] = None
+              system_message: Optional[str] = None,
+              grammar: Optional[str] = None,
+              json_schema: Optional[Union[dict, str]] = None,
+              regex: Optional[str] = None,
+              cancel: Optional[threading.Event] = None
               ) -> AIMessage:
         """
         Generate AI response to user message.
 
         Runs user message through loaded LlamaAI to generate response. Allows prepending optional 
         content to AI response. Adds messages and returns generated AIMessage.
+        Generation stops as soon as any of the stop strings is generated, by default the AI closing tag of the model.
+        If the response cache is enabled, see enable_response_cache(), repeated prompts are answered from it,
+        and if the semantic cache is enabled, see enable_semantic_cache(), so are prompts similar to already answered ones.
+        Safe to call from multiple threads, generations wait for the model in `self.request_queue`.
+        Setting the cancel event from another thread stops the generation after the current token,
+        the partial response is returned and isn't cached.
 
         Args:
             user_message: User message text.
             ai_message_tbc: Optional text to prepend to AI response.
-            stop_at: Optional string to stop generation at.
+            stop_at: Optional string or list of strings to stop generation at.
             include_stop_str: Whether to include stop string in generated message.
             system_message: Optional system message to include at the start, not all models support this.
             If you provide system message to a model that doesn't support it, it will be ignored.
             You can check if a model supports system messages by checking the model_data.has_system_messages()
+            grammar: Optional GBNF grammar the generated text has to match, tokens that can't continue a match are masked while sampling.
+            json_schema: Optional JSON schema (dict or JSON text) the generated text has to match, instead of grammar.
+            regex: Optional regular expression the generated text has to match, instead of grammar, see `regex_to_gbnf()`.
+            cancel: Optional event stopping the generation once set.
 
         Returns:
             Generated AIMessage object.
 
         Raises:
             Exception: If no AI or messages loaded yet.
+            Exception: If more than one of grammar, json_schema or regex is given.
+            QueueFullError: If the request queue is full.
         """
-        if self.ai is None:
-            raise Exception("No AI loaded. Use load_ai() first.")
-        if self.messages is None:
-            raise Exception("No messages loaded. Use load_ai() first.")
-        self.messages.reset_messages()
-        if self.model_data.has_system_tags():
-            if system_message is not None:
-                self.messages.set_system_message(system_message)
+        llama_grammar = build_grammar(grammar, json_schema, regex)
+        constraint = {name: value for name, value in (("grammar", grammar), ("json_schema", json_schema), ("regex", regex)) if value is not None}
+        generation_messages = self._generation_messages(user_message, ai_message_tbc, system_message)
+        stop_at, include_stop_str = self._default_stop(stop_at, include_stop_str)
+        generated: str = ai_message_tbc if ai_message_tbc is not None else ""
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = self.response_cache.key(self._model_key, generation_messages.text(), stop_at, include_stop_str, constraint)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                print("Response cache hit.")
+                return self._finalize_generation(generation_messages, generated + cached, ai_message_tbc)
+        embedding = None
+        if self.semantic_cache is not None:
+            scope = json.dumps([self._model_key, system_message, ai_message_tbc, stop_at, include_stop_str, constraint], default=repr, sort_keys=True)
+            embedding = self.semantic_cache.embed(user_message)
+            cached = self.semantic_cache.search(scope, embedding)
+            if cached is not None:
+                print("Semantic cache hit.")
+                return self._finalize_generation(generation_messages, generated + cached, ai_message_tbc)
+        with self.request_queue.hold():
+            self._prepare_prompt_cache(generation_messages.text(), system_message)
+            response = "".join(stream_completion(self.ai, generation_messages.text(), stop_at, include_stop_str, llama_grammar, cancel))
+        cancelled = cancel is not None and cancel.is_set()
+        if cache_key is not None and not cancelled:
+            self.response_cache.put(cache_key, response)
+        if embedding is not None and not cancelled:
+            self.semantic_cache.add(scope, embedding, response)
+        generated += response
+        return self._finalize_generation(generation_messages, generated, ai_message_tbc)
+
+    def generate_batch(self,
+                       user_messages: list[str],
+                       ai_message_tbc: Optional[str] = None,
+                       stop_at: Optional[Union[str, List[str]]] = None,
+                       include_stop_str: bool = True,
+                       system_message: Optional[str] = None
+                       ) -> list[AIMessage]:
+        """
+        Generate AI responses to many independent user messages.
+
+        The prompts are generated in an order that lets the model reuse the evaluation of their shared prefix
+        (i.e. the system message), so it's faster than calling generate() in a loop.
+        Each response is generated from its own messages, `self.messages` isn't changed.
+        Every prompt waits for the model in `self.request_queue` separately, so other requests aren't blocked for the whole batch.
+
+        Args:
+            user_messages: User message texts.
+            ai_message_tbc: Optional text to prepend to every AI response.
+            stop_at: Optional string or list of strings to stop generation at.
+            include_stop_str: Whether to include stop string in generated messages.
+            system_message: Optional system message to include at the start of every prompt, not all models support this.
+
+        Returns:
+            Generated AIMessage objects, in the order of the user messages.
+
+        Raises:
+            Exception: If no AI or messages loaded yet.
+        """
+        stop_at, include_stop_str = self._default_stop(stop_at, include_stop_str)
+        batch_messages = [self._generation_messages(user_message, ai_message_tbc, system_message, verbose=False) for user_message in user_messages]
+        print(f"Generating {len(batch_messages)} responses...")
+        generated = generate_batch(self.ai, [generation_messages.text() for generation_messages in batch_messages], stop_at, include_stop_str, self.request_queue)
+        for generation_messages, text in zip(batch_messages, generated):
+            if ai_message_tbc is not None:
+                generation_messages.edit_last_message(ai_message_tbc + text, self.messages.ai_tag_open, self.messages.ai_tag_close)
             else:
-                print("WARNING: Model supports system messages, but no system message provided.")
-        self.messages.add_user_message(user_message)
-        print(f"Input to model: \n{self.messages.text()}")
+                generation_messages.add_ai_message(text)
+        return [generation_messages.get_last_message() for generation_messages in batch_messages]
+
+    def generate_stream(self,
+                        user_message: str,
+                        ai_message_tbc: Optional[str] = None,
+                        stop_at: Optional[Union[str, List[str]]] = None,
+                        include_stop_str: bool = True,
+                        system_message: Optional[str] = None,
+                        on_complete: Optional[Callable[[AIMessage], None]] = None,
+                        grammar: Optional[str] = None,
+                        json_schema: Optional[Union[dict, str]] = None,
+                        regex: Optional[str] = None
+                        ) -> Iterator[str]:
+        """
+        Generate AI response to user message, yielding the text as it is generated.
+
+        Works like generate(), but returns right away with an iterator over text deltas.
+        If ai_message_tbc is provided it is yielded first. Once the iterator is exhausted
+        (or closed early) the generated AIMessage is passed to on_complete and becomes `self.messages.get_last_message()`.
+        The model is held in `self.request_queue` while the iterator runs, so exhaust or close it.
+
+        Args:
+            user_message: User message text.
+            ai_message_tbc: Optional text to prepend to AI response.
+            stop_at: Optional string or list of strings to stop generation at.
+            include_stop_str: Whether to include stop string in generated message.
+            system_message: Optional system message to include at the start, not all models support this.
+            on_complete: Optional callback receiving the finalized AIMessage once the stream ends or is closed.
+            grammar: Optional GBNF grammar the generated text has to match, tokens that can't continue a match are masked while sampling.
+            json_schema: Optional JSON schema (dict or JSON text) the generated text has to match, instead of grammar.
+            regex: Optional regular expression the generated text has to match, instead of grammar, see `regex_to_gbnf()`.
+
+        Returns:
+            Iterator over generated text deltas.
+
+        Raises:
+            Exception: If no AI or messages loaded yet.
+            Exception: If more than one of grammar, json_schema or regex is given.
+        """
+        llama_grammar = build_grammar(grammar, json_schema, regex)
+        generation_messages = self._generation_messages(user_message, ai_message_tbc, system_message)
+        stop_at, include_stop_str = self._default_stop(stop_at, include_stop_str)
+        return self._stream_generation(generation_messages, stop_at, include_stop_str, ai_message_tbc, system_message, on_complete, llama_grammar)
+
+    def _stream_generation(self,
+                           generation_messages: AIMessages,
+                           stop_at: Optional[Union[str, List[str]]],
+                           include_stop_str: bool,
+                           ai_message_tbc: Optional[str] = None,
+                           system_message: Optional[str] = None,
+                           on_complete: Optional[Callable[[AIMessage], None]] = None,
+                           grammar: Optional[LlamaGrammar] = None
+                           ) -> Iterator[str]:
         generated: str = ""
-        if ai_message_tbc is not None:
-            generated += ai_message_tbc
-            self.messages.add_message(ai_message_tbc, self.model_data.get_ai_tag_open(), "")
-        if stop_at is None:
-            stop_at = self.messages.ai_tag_close if any([self.messages.ai_tag_close is None, self.messages.ai_tag_close == "", self.messages.ai_tag_close != " "]) else None
-            include_stop_str = False
-        generated += self.ai.infer(self.messages.text(), only_string=True, stop_at_str=stop_at, include_stop_str=include_stop_str)
-        if ai_message_tbc is not None:
-            self.messages.edit_last_message(generated,
-                                            self.model_data.get_ai_tag_open(),
-                                            self.model_data.get_ai_tag_close())
-        else:
-            self.messages.add_ai_message(generated)
-        print(f"AI message: \n{self.messages.get_last_message()}")
-        return self.messages.get_last_message()
+        try:
+            if ai_message_tbc is not None:
+                generated += ai_message_tbc
+                yield ai_message_tbc
+            with self.request_queue.hold():
+                self._prepare_prompt_cache(generation_messages.text(), system_message)
+                for delta in stream_completion(self.ai, generation_messages.text(), stop_at, include_stop_str, grammar):
+                    generated += delta
+                    yield delta
+        finally:
+            ai_message = self._finalize_generation(generation_messages, generated, ai_message_tbc)
+            if on_complete is not None:
+                on_complete(ai_message)
+
+    def start_chat(self,
+                   system_message: Optional[str] = None,
+                   reserve_tokens: Optional[int] = None,
+                   summarize: Optional[Callable[[list], str]] = None
+                   ) -> ChatSession:
+        """
+        Start a multi-turn chat with the loaded model.
 
-    
+        Unlike generate(), which starts from scratch every time, the ChatSession keeps the conversation
+        and only evaluates the messages added since the previous turn.
+
+        Args:
+            system_message: Optional system message to start the conversation with, ignored if the model doesn't support it.
+            reserve_tokens: Tokens to keep free for generation when trimming old messages. Defaults to a quarter of max_total_tokens.
+            summarize: Optional function summarizing dropped old messages into a single message text.
+
+        Returns:
+            ChatSession object.
+
+        Raises:
+            Exception: If no AI or model data loaded yet.
+        """
+        if self.ai is None:
+            raise Exception("No AI loaded. Use load_ai() first.")
+        messages = AIMessages(user_tags=self.model_data.user_tags, ai_tags=self.model_data.ai_tags, system_tags=self.model_data.system_tags)
+        if system_message is not None:
+            messages.set_system_message(system_message)
+        return ChatSession(self.ai, messages, reserve_tokens, summarize, self.token_counter, self.request_queue)
+
+    def embed(self, texts: Union[str, list[str]], batch_size: int = 32, pooling: str = "mean", normalize: bool = True) -> np.ndarray:
+        """
+        Compute embeddings of the texts with the loaded model, see `Embedder.embed()`.
 
+        LlamaAI loads models with embeddings enabled by default. Each batch waits for the model in `self.request_queue`
+        and resets its evaluated tokens, so the next generation evaluates its whole prompt again instead of reusing the prefix.
 
+        Args:
+            texts: Text or list of texts to embed.
+            batch_size: Number of texts embedded in one model call. Defaults to 32.
+            pooling: How token embeddings are pooled, for models without their own pooling: "mean", "max", "first" or "last". Defaults to "mean".
+            normalize: Whether to scale the embeddings to unit length. Defaults to True.
+
+        Returns:
+            NumPy float32 array of embeddings, one row per text.
+
+        Raises:
+            Exception: If no AI loaded yet or it wasn't loaded with embeddings enabled.
+        """
+        if self.ai is None:
+            raise Exception("No AI loaded. Use load_ai() first.")
+        return Embedder(self.ai, self.request_queue).embed(texts, batch_size, pooling, normalize)
 
     def count_tokens(
         self,
         user_message_text: str,
-        ai_message_tbc: Optional[str] = None
+        ai_message_tbc: Optional[str] = None,
+        system_message: Optional[str] = None
     ) -> int:
         """
         Count the number of tokens in a generated message.
 
+        The rendered prompt is counted at once, as the model tokenizes it, and counts of recently counted prompts are reused.
+
         Args:
             user_message_text: User message text.
             ai_message_tbc: Optional text to prepend.
+            system_message: Optional system message, counted only if the model supports it.
 
         Returns:
             Number of tokens in generated message.
         """
-        generation_messages = AIMessages()
+        generation_messages = AIMessages(user_tags=self.messages.user_tags(), ai_tags=self.messages.ai_tags(), system_tags=self.messages.system_tags())
         generation_messages.reset_messages()
+        if system_message is not None and generation_messages.has_system_tags():
+            generation_messages.set_system_message(system_message)
         generation_messages.add_user_message(user_message_text)
 
         if ai_message_tbc is not None:
@@ -362,7 +954,7 @@ class EasyAI:
                 ""
             )
 
-        return self.ai.count_tokens(generation_messages.text())
+        return self.token_counter(generation_messages.text())
     
     def is_within_context(self,
         prompt: str,
@@ -379,10 +971,12 @@ class EasyAI:
         """
         return self.ai.is_prompt_within_limit(prompt)
     
-    def import_from_repo(self, hf_repo_url: str, user_tags: Tuple[str, str] = ("", ""), ai_tags: Tuple[str, str] = ("", ""), system_tags: Optional[Tuple[str, str]] = (None, None), keywords: Optional[str] = None, description: Optional[str] = None, replace_existing: bool = False) -> None:
+    def import_from_repo(self, hf_repo_url: str, user_tags: Tuple[str, str] = ("", ""), ai_tags: Tuple[str, str] = ("", ""), system_tags: Optional[Tuple[str, str]] = (None, None), keywords: Optional[str] = None, description: Optional[str] = None, replace_existing: bool = False, max_workers: int = 8) -> list[ModelData]:
         """
         Imports model data from HuggingFace model repo to current model DB. 
 
+        The repo page and its file tree page are fetched concurrently and kept in a revalidated page cache, see `RepoImporter`.
+
         Args:
             hf_repo_url: URL of model to import.
             user_tags: User tags to assign to model data.
@@ -391,19 +985,21 @@ class EasyAI:
             description: Optional description for model data.
             keyword: Optional keyword for model data.
             replace_existing: Whether to replace existing model data if found.
+            max_workers: Max number of concurrent requests.
+
+        Returns:
+            Imported ModelData objects.
 
         Raises:
             Exception: If no model DB loaded yet.
         """
-
-
-
-        self.model_db.import_models_from_repo(
-            hf_repo_url=hf_repo_url,
-            user_tags=user_tags,
-            ai_tags=ai_tags,
-            system_tags=system_tags,
-            keywords=keywords,
-            description=description,
-            replace_existing=replace_existing,
-        )
+        if self.model_db is None:
+            raise Exception("No model DB loaded. Use load_model_db() first.")
+        is_imported = None if replace_existing else lambda url: self.model_db.get_model_by_url(url) is not None
+        importer = RepoImporter(max_workers=max_workers)
+        try:
+            imported = importer.import_repo(hf_repo_url, self.model_db.gguf_db_dir, user_tags, ai_tags, system_tags, keywords, description, is_imported)
+        finally:
+            importer.close()
+        self.load_model_db(self.model_db.gguf_db_dir, copy_verified_models=False)
+        return imported
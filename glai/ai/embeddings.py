@@ -0,0 +1,76 @@
+from typing import List, Optional, Union
+import numpy as np
+from gguf_llama import LlamaAI
+from .request_queue import RequestQueue
+
+__all__ = ['Embedder']
+
+_POOLING = {
+    "mean": lambda tokens: tokens.mean(axis=0),
+    "max": lambda tokens: tokens.max(axis=0),
+    "first": lambda tokens: tokens[0],
+    "last": lambda tokens: tokens[-1],
+}
+
+class Embedder:
+    """
+    Computes text embeddings with a GGUF model loaded with embeddings enabled, in batches.
+
+    LlamaAI loads models with embeddings enabled unless `llama_kwargs={"embedding": False}` is given, so this can be
+    a dedicated embedding model or the generation model itself. Models without their own pooling are pooled over the tokens as requested.
+    Embedding resets the evaluated tokens of the model, so it waits for the model in the request queue like generations do.
+    With the generation model, this also discards the evaluated prompt prefix the next generation would have reused,
+    so prefer a separate small embedding model where embeddings and generations are mixed.
+
+    Args:
+        ai: Loaded LlamaAI instance with embeddings enabled.
+        request_queue: Optional RequestQueue of the model, shared with generations using it.
+
+    Attributes:
+        ai: LlamaAI instance computing the embeddings.
+        request_queue: RequestQueue giving embeddings and generations access to the model in order of arrival.
+    """
+    def __init__(self, ai: LlamaAI, request_queue: Optional[RequestQueue] = None) -> None:
+        self.ai = ai
+        self.request_queue = request_queue or RequestQueue()
+
+    def embed(self, texts: Union[str, List[str]], batch_size: int = 32, pooling: str = "mean", normalize: bool = True) -> np.ndarray:
+        """
+        Embed the texts.
+
+        Texts are embedded in batches, each waiting for the model in the request queue separately,
+        so generations aren't blocked for the whole input.
+
+        Args:
+            texts: Text or list of texts to embed.
+            batch_size: Number of texts embedded in one model call. Defaults to 32.
+            pooling: How token embeddings are pooled into the text embedding, for models without their own pooling:
+                "mean", "max", "first" or "last" token. Defaults to "mean".
+            normalize: Whether to scale the embeddings to unit length. Defaults to True.
+
+        Returns:
+            Float32 array of embeddings, one row per text.
+
+        Raises:
+            Exception: If the model wasn't loaded with embeddings enabled.
+            ValueError: If the pooling mode is unknown.
+        """
+        if pooling not in _POOLING:
+            raise ValueError(f"Unknown pooling {pooling!r}, use one of: {', '.join(_POOLING)}.")
+        if isinstance(texts, str):
+            texts = [texts]
+        llm = self.ai.llm
+        if not llm.context_params.embeddings:
+            raise Exception('Model was loaded with embeddings disabled, load it without llama_kwargs={"embedding": False} to compute embeddings.')
+        vectors = np.empty((len(texts), llm.n_embd()), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            with self.request_queue.hold():
+                try:
+                    embeddings = llm.embed(texts[start:start + batch_size])
+                finally:
+                    llm.reset()
+            for row, embedding in enumerate(embeddings, start):
+                vectors[row] = _POOLING[pooling](np.asarray(embedding, dtype=np.float32).reshape(-1, llm.n_embd()))
+        if normalize:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
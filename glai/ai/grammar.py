@@ -0,0 +1,238 @@
+import json
+import re
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    from llama_cpp import LlamaGrammar
+
+__all__ = ['regex_to_gbnf', 'build_grammar']
+
+_CLASS_ESCAPES = {
+    "d": "0-9",
+    "w": "a-zA-Z0-9_",
+    "s": " \\t\\n\\r",
+}
+
+# {m}, {m,}, {,n}, {m,n} and {,}, other braces are literal like in Python regexes
+_BRACES = re.compile(r"\{(?:(\d+)|(\d*),(\d*))\}")
+
+class _RegexToGBNF:
+    """
+    Recursive descent converter of a regular expression to a GBNF expression.
+
+    Supports literals, escapes, character classes, `.`, groups, alternation and the `*`, `+`, `?` and `{m,n}` quantifiers.
+    Anchors at the ends of the pattern are ignored, as the whole generated text has to match anyway.
+    """
+    def __init__(self, pattern: str) -> None:
+        self.pattern = pattern
+        self.position = 0
+
+    def _peek(self) -> Optional[str]:
+        return self.pattern[self.position] if self.position < len(self.pattern) else None
+
+    def _next(self) -> str:
+        char = self._peek()
+        if char is None:
+            raise ValueError(f"Unexpected end of regex {self.pattern!r}.")
+        self.position += 1
+        return char
+
+    def convert(self) -> str:
+        if self._peek() == "^":
+            self.position += 1
+        expression = self._alternation()
+        if self._peek() is not None:
+            raise ValueError(f"Unbalanced ')' at {self.position} in regex {self.pattern!r}.")
+        return expression
+
+    def _alternation(self) -> str:
+        sequences = [self._sequence()]
+        while self._peek() == "|":
+            self.position += 1
+            sequences.append(self._sequence())
+        return sequences[0] if len(sequences) == 1 else "(" + " | ".join(sequences) + ")"
+
+    def _sequence(self) -> str:
+        items = []
+        while self._peek() not in (None, "|", ")"):
+            if self._peek() == "$" and self.position == len(self.pattern) - 1:
+                self.position += 1
+                continue
+            items.append(self._quantified(self._atom()))
+        return " ".join(items) if items else '""'
+
+    def _atom(self) -> str:
+        char = self._next()
+        if char == "(":
+            if self.pattern.startswith("?:", self.position):
+                self.position += 2
+            elif self._peek() == "?":
+                raise ValueError(f"Unsupported group construct at {self.position} in regex {self.pattern!r}.")
+            expression = self._alternation()
+            if self._next() != ")":
+                raise ValueError(f"Missing ')' in regex {self.pattern!r}.")
+            return "(" + expression + ")"
+        if char == "[":
+            return self._char_class()
+        if char == ".":
+            return "[^\\n]"
+        if char == "\\":
+            escaped = self._next()
+            if escaped.lower() in _CLASS_ESCAPES:
+                return ("[^" if escaped.isupper() else "[") + _CLASS_ESCAPES[escaped.lower()] + "]"
+            _check_escape(escaped, self.pattern)
+            return _literal({"n": "\n", "t": "\t", "r": "\r"}.get(escaped, escaped))
+        if char in "*+?" or (char == "{" and self._braces(self.position - 1) is not None):
+            raise ValueError(f"Nothing to repeat at {self.position - 1} in regex {self.pattern!r}.")
+        return _literal(char)
+
+    def _char_class(self) -> str:
+        negated = self._peek() == "^"
+        if negated:
+            self.position += 1
+        content = ""
+        first = True
+        while True:
+            char = self._next()
+            if char == "]" and not first:
+                break
+            first = False
+            if char == "\\":
+                escaped = self._next()
+                if escaped in _CLASS_ESCAPES:
+                    content += _CLASS_ESCAPES[escaped]
+                    continue
+                _check_escape(escaped, self.pattern)
+                char = {"n": "\n", "t": "\t", "r": "\r"}.get(escaped, escaped)
+            if self._peek() == "-" and self.pattern[self.position + 1:self.position + 2] not in ("", "]"):
+                self.position += 1
+                end = self._next()
+                if end == "\\":
+                    end = self._next()
+                content += _class_char(char) + "-" + _class_char(end)
+            else:
+                content += _class_char(char)
+        return ("[^" if negated else "[") + content + "]"
+
+    def _braces(self, position: int) -> Optional[Tuple[int, Optional[int], int]]:
+        """
+        Returns the minimum, the maximum (None if unbounded) and the end position of the {m,n} quantifier at the position,
+        None if the brace there doesn't start a quantifier.
+
+        Raises:
+            ValueError: If the minimum is greater than the maximum.
+        """
+        match = _BRACES.match(self.pattern, position)
+        if match is None:
+            return None
+        exact, minimum, maximum = match.groups()
+        if exact is not None:
+            return int(exact), int(exact), match.end()
+        minimum = int(minimum) if minimum else 0
+        maximum = int(maximum) if maximum else None
+        if maximum is not None and minimum > maximum:
+            raise ValueError(f"Min repeat greater than max repeat at {position} in regex {self.pattern!r}.")
+        return minimum, maximum, match.end()
+
+    def _quantified(self, atom: str) -> str:
+        char = self._peek()
+        if char in ("*", "+", "?"):
+            self.position += 1
+            quantified = atom + char
+        elif char == "{" and self._braces(self.position) is not None:
+            minimum, maximum, self.position = self._braces(self.position)
+            quantified = _repeat(atom, minimum, maximum)
+        else:
+            return atom
+        if self._peek() == "?":
+            # Lazy quantifiers match the same strings
+            self.position += 1
+        return quantified
+
+
+def _literal(char: str) -> str:
+    escaped = {"\\": "\\\\", '"': '\\"', "\n": "\\n", "\t": "\\t", "\r": "\\r"}.get(char)
+    if escaped is None:
+        escaped = char if char.isprintable() else f"\\x{ord(char):02X}" if ord(char) < 0x100 else f"\\u{ord(char):04X}"
+    return '"' + escaped + '"'
+
+def _check_escape(escaped: str, pattern: str) -> None:
+    if escaped.isalnum() and escaped not in "nrt":
+        raise ValueError(f"Unsupported escape \\{escaped} in regex {pattern!r}.")
+
+def _class_char(char: str) -> str:
+    if char in "\\]-[^\"" or not char.isprintable():
+        return f"\\x{ord(char):02X}" if ord(char) < 0x100 else f"\\u{ord(char):04X}"
+    return char
+
+def _repeat(atom: str, minimum: int, maximum: Optional[int]) -> str:
+    """
+    Expands {m,n} repetition into required copies followed by nested optional ones, so it works with every GBNF parser version.
+    """
+    items = [atom] * minimum
+    if maximum is None:
+        items.append(atom + "*")
+    elif maximum > minimum:
+        optional = ""
+        for _ in range(maximum - minimum):
+            optional = f"({atom} {optional})?" if optional else f"{atom}?"
+        items.append(optional)
+    return "(" + " ".join(items) + ")" if items else '""'
+
+def regex_to_gbnf(pattern: str) -> str:
+    """
+    Convert a regular expression to a GBNF grammar, matching text that fully matches the regex.
+
+    Supports literals, escapes (\\d, \\w, \\s and their negations), character classes, `.`, groups, alternation
+    and the `*`, `+`, `?` and `{m,n}` quantifiers. Braces not forming a quantifier are literal, like in Python regexes.
+    Lookarounds and backreferences aren't supported.
+
+    Args:
+        pattern: Regular expression.
+
+    Returns:
+        GBNF grammar text.
+
+    Raises:
+        ValueError: If the regex is invalid or uses unsupported constructs.
+    """
+    return f"root ::= {_RegexToGBNF(pattern).convert()}\n"
+
+@lru_cache(maxsize=64)
+def _compile(kind: str, source: str) -> "LlamaGrammar":
+    from llama_cpp import LlamaGrammar
+    if kind == "json_schema":
+        return LlamaGrammar.from_json_schema(source, verbose=False)
+    return LlamaGrammar.from_string(regex_to_gbnf(source) if kind == "regex" else source, verbose=False)
+
+def build_grammar(grammar: Optional[str] = None,
+                  json_schema: Optional[Union[dict, str]] = None,
+                  regex: Optional[str] = None
+                  ) -> Optional["LlamaGrammar"]:
+    """
+    Build the LlamaGrammar constraining generation to a GBNF grammar, a JSON schema or a regex, whichever is given.
+
+    Tokens that can't continue a match are masked out while sampling, so the generated text always matches.
+    Built grammars are cached, so repeated generations with the same constraint don't parse it again.
+
+    Args:
+        grammar: Optional GBNF grammar text.
+        json_schema: Optional JSON schema, as a dict or JSON text.
+        regex: Optional regular expression, see regex_to_gbnf().
+
+    Returns:
+        LlamaGrammar, None if no constraint is given.
+
+    Raises:
+        Exception: If more than one constraint is given.
+    """
+    constraints = [(kind, source) for kind, source in (("grammar", grammar), ("json_schema", json_schema), ("regex", regex)) if source is not None]
+    if not constraints:
+        return None
+    if len(constraints) > 1:
+        raise Exception("Provide only one of grammar, json_schema or regex.")
+    kind, source = constraints[0]
+    if isinstance(source, dict):
+        source = json.dumps(source, sort_keys=True)
+    return _compile(kind, source)
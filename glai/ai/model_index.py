@@ -0,0 +1,198 @@
+import json
+import os
+import threading
+from typing import Optional, Union
+from gguf_modeldb import ModelDB, ModelData, VERIFIED_MODELS_DB_DIR
+
+__all__ = ['ModelIndex', 'MODEL_INDEX', 'LazyModelDB', 'get_model_db']
+
+_model_dbs: dict = {}
+_model_dbs_lock = threading.Lock()
+
+def _db_mtime(db_dir: str) -> Optional[int]:
+    """
+    Returns the latest modification time of the model DB directory and its model JSON files, None if it doesn't exist.
+
+    Adding or removing files changes the directory time, rewriting a model JSON in place only changes the time of the file.
+    """
+    if not os.path.isdir(db_dir):
+        return None
+    mtime_ns = os.stat(db_dir).st_mtime_ns
+    with os.scandir(db_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith(".json"):
+                try:
+                    mtime_ns = max(mtime_ns, entry.stat().st_mtime_ns)
+                except OSError:
+                    pass
+    return mtime_ns
+
+
+class LazyModelDB:
+    """
+    ModelDB created on first use, so finding model data in the persisted MODEL_INDEX doesn't scan and copy the model files.
+
+    Attributes of the ModelDB are available on this object, accessing any of them other than `gguf_db_dir` creates the ModelDB.
+
+    Args:
+        model_db_dir: Directory of the model DB. Defaults to the verified models DB.
+        copy_verified_models: Whether to copy verified models to the directory, when creating the ModelDB.
+
+    Attributes:
+        gguf_db_dir: Absolute directory of the model DB.
+        mtime_ns: Latest modification time of the directory and its model JSON files when the ModelDB was created, or when this object was if it wasn't yet.
+    """
+    def __init__(self, model_db_dir: Optional[str] = None, copy_verified_models: bool = True) -> None:
+        self._db_dir = VERIFIED_MODELS_DB_DIR if model_db_dir is None else os.path.abspath(model_db_dir)
+        self._model_db_dir = model_db_dir
+        self._copy_verified_models = copy_verified_models
+        self._model_db: Optional[ModelDB] = None
+        self._lock = threading.Lock()
+        self.mtime_ns = _db_mtime(self._db_dir)
+
+    @property
+    def gguf_db_dir(self) -> str:
+        return self._db_dir if self._model_db is None else self._model_db.gguf_db_dir
+
+    def load(self) -> ModelDB:
+        """
+        Returns the ModelDB, creating it on the first call.
+        """
+        with self._lock:
+            if self._model_db is None:
+                self._model_db = ModelDB(model_db_dir=self._model_db_dir, copy_verified_models=self._copy_verified_models)
+                self.mtime_ns = _db_mtime(self._db_dir)
+            return self._model_db
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+
+def get_model_db(model_db_dir: Optional[str] = None, copy_verified_models: bool = True) -> LazyModelDB:
+    """
+    Get the ModelDB of the directory, reusing the one already created in this process unless files were added, removed or rewritten since.
+
+    The ModelDB is created on first use, see `LazyModelDB`, so searches answered by the persisted MODEL_INDEX don't create it at all.
+
+    Args:
+        model_db_dir: Directory of the model DB. Defaults to the verified models DB.
+        copy_verified_models: Whether to copy verified models to the directory, when creating a new ModelDB.
+
+    Returns:
+        LazyModelDB object, used like a ModelDB.
+    """
+    key = (os.path.realpath(model_db_dir or VERIFIED_MODELS_DB_DIR), copy_verified_models)
+    with _model_dbs_lock:
+        cached = _model_dbs.get(key)
+        if cached is not None and cached.mtime_ns == _db_mtime(key[0]):
+            return cached
+        model_db = LazyModelDB(model_db_dir, copy_verified_models)
+        _model_dbs[key] = model_db
+        return model_db
+
+
+class ModelIndex:
+    """
+    Persisted index of model search results, so repeated searches don't scan the model DB.
+
+    Results are stored per model DB directory together with the latest modification time of the directory and its model JSON files.
+    Adding, removing or downloading model files, or rewriting model data, changes it, which invalidates the results of that directory.
+
+    Args:
+        index_path: Path of the index JSON file. Defaults to ~/.cache/glai/model_index.json.
+
+    Attributes:
+        index_path: Path of the index JSON file.
+    """
+    def __init__(self, index_path: Optional[str] = None) -> None:
+        self.index_path = index_path or os.path.join(os.path.expanduser("~"), ".cache", "glai", "model_index.json")
+        self._lock = threading.Lock()
+        self._index: Optional[dict] = None
+
+    def _load(self) -> dict:
+        if self._index is None:
+            try:
+                with open(self.index_path, "r") as index_file:
+                    self._index = json.load(index_file)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            temp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as index_file:
+                json.dump(self._index, index_file)
+            os.replace(temp_path, self.index_path)
+        except OSError as e:
+            print(f"WARNING: Couldn't save model index to {self.index_path}: {e}")
+
+    @staticmethod
+    def _to_dict(model_data: ModelData) -> dict:
+        return {
+            "gguf_url": model_data.gguf_url,
+            "user_tags": model_data.user_tags,
+            "ai_tags": model_data.ai_tags,
+            "system_tags": model_data.system_tags,
+            "description": getattr(model_data, "description", None),
+            "keywords": getattr(model_data, "keywords", None),
+        }
+
+    @staticmethod
+    def _from_dict(data: dict, db_dir: str) -> ModelData:
+        return ModelData(data["gguf_url"], db_dir, data["user_tags"], data["ai_tags"],
+                         system_tags=data.get("system_tags"), description=data.get("description"), keywords=data.get("keywords"))
+
+    def find_model(self,
+                   model_db: Union[ModelDB, LazyModelDB],
+                   model_name: Optional[str] = None,
+                   quantization: Optional[str] = None,
+                   keyword: Optional[str] = None,
+                   only_downloaded: bool = False
+                   ) -> ModelData:
+        """
+        Find model data in the model DB, see `ModelDB.find_model()`, returning the indexed result if the DB didn't change.
+
+        Indexed results are returned without creating a LazyModelDB, so a new process finds models without scanning the DB.
+
+        Args:
+            model_db: ModelDB or LazyModelDB to search.
+            model_name: Name of model to search for.
+            quantization: Quantization of model to search for.
+            keyword: Keyword of model to search for.
+            only_downloaded: Whether to search only models with downloaded GGUF files.
+
+        Returns:
+            ModelData object if a match is found, else None.
+        """
+        db_dir = os.path.realpath(model_db.gguf_db_dir)
+        query = json.dumps([model_name, quantization, keyword, only_downloaded])
+        with self._lock:
+            entry = self._load().get(db_dir)
+            if entry is not None and entry["mtime_ns"] == _db_mtime(db_dir) and query in entry["results"]:
+                return self._from_dict(entry["results"][query], model_db.gguf_db_dir)
+        model_data = model_db.find_model(model_name, quantization, keyword, only_downloaded)
+        if model_data is None:
+            return None
+        with self._lock:
+            index = self._load()
+            mtime_ns = _db_mtime(db_dir)
+            if db_dir not in index or index[db_dir]["mtime_ns"] != mtime_ns:
+                index[db_dir] = {"mtime_ns": mtime_ns, "results": {}}
+            index[db_dir]["results"][query] = self._to_dict(model_data)
+            self._save()
+        return model_data
+
+    def clear(self) -> None:
+        """
+        Remove all indexed results.
+        """
+        with self._lock:
+            self._index = {}
+            self._save()
+
+
+MODEL_INDEX = ModelIndex()
@@ -0,0 +1,310 @@
+import itertools
+import multiprocessing
+import os
+import multiprocessing.connection
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, List, Optional, Union
+from ..messages import AIMessage
+
+__all__ = ['ModelPool']
+
+def _claim(future: Future) -> bool:
+    """
+    Mark a queued future as running, returns False if it was cancelled and can't be resolved anymore.
+    """
+    return future.set_running_or_notify_cancel()
+
+def _worker_main(worker_id: int, config: dict, tasks: Any, results: Any) -> None:
+    """
+    Worker process loop, loads EasyAI from the config and runs generation tasks until it receives None.
+    Results are sent through the worker's own pipe, so a crashing worker can't leave a lock shared with other workers held.
+    """
+    from .easy_ai import EasyAI
+    try:
+        easy_ai = EasyAI(**config)
+    except Exception as e:
+        results.send((worker_id, None, None, f"Worker failed to load the model: {e}"))
+        return
+    results.send((worker_id, None, None, None))
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        request_id, kwds, deadline = task
+        try:
+            generated = []
+            stream = easy_ai.generate_stream(**kwds, on_complete=generated.append)
+            timed_out = False
+            for _ in stream:
+                if deadline is not None and time.time() > deadline:
+                    timed_out = True
+                    break
+            stream.close()
+            if timed_out:
+                results.send((worker_id, request_id, None, "timeout"))
+            else:
+                results.send((worker_id, request_id, generated[0].to_dict(), None))
+        except Exception as e:
+            results.send((worker_id, request_id, None, f"{type(e).__name__}: {e}"))
+
+
+class ModelPool:
+    """
+    Pool of worker processes, each with its own EasyAI model, with a scheduler dispatching generation requests to idle workers.
+
+    All workers load the same GGUF file. The llama model memory maps the weights, so the processes share
+    the same physical memory pages of the file, and the model is loaded to RAM only once.
+    Requests are queued and dispatched in order to the first idle worker. Queued requests can be cancelled through their future.
+    Each request can have a timeout, covering the time spent waiting in the queue and the generation itself, after which its future
+    fails with TimeoutError. The worker stops generating after the current token, so one still evaluating a long prompt
+    stays busy until the evaluation is done, but the future fails at the deadline either way.
+
+    Args:
+        config: EasyAI configuration dict, the same keyword arguments as for `EasyAI.configure()`. Must be picklable.
+        workers: Number of worker processes. Defaults to 2.
+        threads_per_worker: Number of CPU threads each worker generates with. Defaults to the CPU count divided by the number of workers.
+
+    Attributes:
+        config: EasyAI configuration of the workers.
+        workers: Number of worker processes.
+    """
+    def __init__(self, config: dict, workers: int = 2, threads_per_worker: Optional[int] = None) -> None:
+        if threads_per_worker is None:
+            threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+        self.config = dict(config)
+        self.config["llama_kwargs"] = {"n_threads": threads_per_worker, **(self.config.get("llama_kwargs") or {})}
+        self.workers = workers
+        self._context = multiprocessing.get_context("spawn")
+        self._results: dict = {}
+        self._lock = threading.Lock()
+        self._pending: deque = deque()
+        self._idle: deque = deque()
+        self._in_flight: dict = {}
+        self._processes: dict = {}
+        self._tasks: dict = {}
+        self._failed_workers: set = set()
+        self._request_ids = itertools.count()
+        self._closed = False
+        for worker_id in range(workers):
+            self._start_worker(worker_id)
+        self._collector = threading.Thread(target=self._collect, name="glai-model-pool", daemon=True)
+        self._collector.start()
+
+    def _start_worker(self, worker_id: int) -> None:
+        tasks = self._context.Queue()
+        results, worker_results = self._context.Pipe(duplex=False)
+        process = self._context.Process(target=_worker_main, args=(worker_id, self.config, tasks, worker_results), daemon=True)
+        process.start()
+        # Only the worker keeps the sending end open, so the pipe reports its exit
+        worker_results.close()
+        self._tasks[worker_id] = tasks
+        self._results[worker_id] = results
+        self._processes[worker_id] = process
+
+    def _dispatch(self) -> None:
+        """
+        Send pending requests to idle workers, failing the ones past their deadline. Call with the lock held.
+        """
+        now = time.time()
+        while self._pending and self._idle:
+            request_id, kwds, deadline, future = self._pending.popleft()
+            if not _claim(future):
+                continue
+            if deadline is not None and now > deadline:
+                future.set_exception(TimeoutError("Request timed out after waiting in the queue."))
+                continue
+            worker_id = self._idle.popleft()
+            self._in_flight[worker_id] = (request_id, future, deadline)
+            self._tasks[worker_id].put((request_id, kwds, deadline))
+
+    def _expire(self) -> None:
+        """
+        Fail queued and running requests past their deadline. Call with the lock held.
+
+        Running requests are failed without waiting for their worker, which may still be evaluating the prompt.
+        The worker stays busy until it reports back, and its late result is dropped.
+        """
+        now = time.time()
+        for request in [request for request in self._pending if request[2] is not None and now > request[2]]:
+            self._pending.remove(request)
+            if _claim(request[3]):
+                request[3].set_exception(TimeoutError("Request timed out after waiting in the queue."))
+        for worker_id, (request_id, future, deadline) in list(self._in_flight.items()):
+            if future is not None and deadline is not None and now > deadline:
+                future.set_exception(TimeoutError("Request timed out during generation."))
+                self._in_flight[worker_id] = (request_id, None, deadline)
+
+    def _restart_dead_workers(self) -> None:
+        """
+        Fail the requests of crashed workers and start new workers in their place. Call with the lock held.
+        """
+        for worker_id, process in list(self._processes.items()):
+            if process.is_alive() or self._closed or worker_id in self._failed_workers:
+                continue
+            future = self._in_flight.pop(worker_id, (None, None, None))[1]
+            if future is not None:
+                future.set_exception(Exception(f"Model pool worker {worker_id} exited with code {process.exitcode}."))
+            results = self._results.pop(worker_id, None)
+            if results is not None:
+                results.close()
+            if worker_id in self._idle:
+                self._idle.remove(worker_id)
+            self._start_worker(worker_id)
+
+    def _collect(self) -> None:
+        while not self._closed:
+            try:
+                self._collect_next()
+            except Exception as e:
+                # The collector resolves every future of the pool, so it must outlive a bad result
+                print(f"WARNING: Model pool failed to handle a worker result: {type(e).__name__}: {e}")
+
+    def _collect_next(self) -> None:
+        """
+        Handle the next worker result and expire requests, restarting crashed workers if there is no result yet.
+        """
+        with self._lock:
+            connections = {results: worker_id for worker_id, results in self._results.items()}
+        ready = multiprocessing.connection.wait(list(connections), timeout=0.1)
+        if not ready:
+            with self._lock:
+                self._expire()
+                self._restart_dead_workers()
+            return
+        try:
+            worker_id, request_id, message_dict, error = ready[0].recv()
+        except (EOFError, OSError):
+            # The worker exited, wait for its exit code and restart it
+            worker_id = connections[ready[0]]
+            self._processes[worker_id].join(timeout=5)
+            with self._lock:
+                if self._results.get(worker_id) is ready[0]:
+                    del self._results[worker_id]
+                ready[0].close()
+                self._restart_dead_workers()
+            return
+        future = None
+        with self._lock:
+            if request_id is None and error is not None:
+                print(f"WARNING: {error}")
+                self._failed_workers.add(worker_id)
+                if len(self._failed_workers) == self.workers:
+                    while self._pending:
+                        pending_future = self._pending.popleft()[3]
+                        if _claim(pending_future):
+                            pending_future.set_exception(Exception(f"No model pool worker could load the model: {error}"))
+                return
+            if request_id is not None:
+                future = self._in_flight.pop(worker_id, (None, None, None))[1]
+            self._idle.append(worker_id)
+            self._expire()
+            self._dispatch()
+        # Resolved outside the lock, so callbacks of the future can submit new requests
+        if future is None:
+            return
+        if error == "timeout":
+            future.set_exception(TimeoutError("Request timed out during generation."))
+        elif error is not None:
+            future.set_exception(Exception(error))
+        else:
+            try:
+                future.set_result(AIMessage.from_dict(message_dict))
+            except Exception as e:
+                future.set_exception(e)
+
+    def submit(self,
+               user_message: str,
+               ai_message_tbc: Optional[str] = None,
+               stop_at: Optional[Union[str, List[str]]] = None,
+               include_stop_str: bool = True,
+               system_message: Optional[str] = None,
+               timeout: Optional[float] = None
+               ) -> "Future[AIMessage]":
+        """
+        Queue a generation request, see `EasyAI.generate()` for the generation arguments.
+
+        Args:
+            timeout: Optional seconds after which the request fails with TimeoutError, including the time spent in the queue.
+
+        Returns:
+            Future resolving to the generated AIMessage. Cancelling it removes the request from the queue if it hasn't started yet.
+
+        Raises:
+            Exception: If the pool is closed.
+        """
+        if self._closed:
+            raise Exception("Model pool is closed.")
+        if len(self._failed_workers) == self.workers:
+            raise Exception("No model pool worker could load the model.")
+        kwds = {
+            "user_message": user_message,
+            "ai_message_tbc": ai_message_tbc,
+            "stop_at": stop_at,
+            "include_stop_str": include_stop_str,
+            "system_message": system_message,
+        }
+        deadline = time.time() + timeout if timeout is not None else None
+        future: Future = Future()
+        with self._lock:
+            self._pending.append((next(self._request_ids), kwds, deadline, future))
+            self._dispatch()
+        return future
+
+    def generate(self,
+                 user_message: str,
+                 ai_message_tbc: Optional[str] = None,
+                 stop_at: Optional[Union[str, List[str]]] = None,
+                 include_stop_str: bool = True,
+                 system_message: Optional[str] = None,
+                 timeout: Optional[float] = None
+                 ) -> AIMessage:
+        """
+        Generate AI response to user message on the first idle worker, blocking until it's done. See `submit()`.
+        """
+        return self.submit(user_message, ai_message_tbc, stop_at, include_stop_str, system_message, timeout).result()
+
+    def queue_depth(self) -> int:
+        """
+        Returns the number of requests waiting for an idle worker.
+        """
+        with self._lock:
+            return len(self._pending)
+
+    def busy_workers(self) -> int:
+        """
+        Returns the number of workers currently generating.
+        """
+        with self._lock:
+            return len(self._in_flight)
+
+    def close(self) -> None:
+        """
+        Stop the workers, queued requests are cancelled and requests in progress fail.
+        """
+        with self._lock:
+            self._closed = True
+            while self._pending:
+                self._pending.popleft()[3].cancel()
+            for _, future, _ in self._in_flight.values():
+                if future is not None:
+                    future.set_exception(Exception("Model pool closed."))
+            self._in_flight.clear()
+        for worker_id, process in self._processes.items():
+            self._tasks[worker_id].put(None)
+        for process in self._processes.values():
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        if threading.current_thread() is not self._collector:
+            self._collector.join()
+        for results in self._results.values():
+            results.close()
+
+    def __enter__(self) -> "ModelPool":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -0,0 +1,171 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, Optional, Tuple
+from gguf_llama import LlamaAI
+from .request_queue import RequestQueue
+
+__all__ = ['ModelHandle', 'ModelRegistry', 'MODEL_REGISTRY']
+
+class ModelHandle:
+    """
+    Shared loaded model returned by `ModelRegistry.acquire()`, call release() once done with it.
+
+    Attributes:
+        ai: Loaded LlamaAI object.
+        request_queue: RequestQueue shared by everyone using the model, to take turns generating.
+        key: Registry key of the model, the model path and load parameters.
+        size_bytes: Size of the model file, used for the registry memory budget.
+        refs: Number of acquisitions not released yet.
+    """
+    def __init__(self, registry: "ModelRegistry", key: Tuple, ai: LlamaAI, size_bytes: int) -> None:
+        self.ai = ai
+        self.request_queue = RequestQueue()
+        self.key = key
+        self.size_bytes = size_bytes
+        self.refs = 0
+        self._registry = registry
+
+    def release(self) -> None:
+        """
+        Release one acquisition of the model, see `ModelRegistry.release()`.
+        """
+        self._registry.release(self)
+
+
+class _Loading:
+    """
+    Model being loaded by one acquire() call, other calls for the same key wait for its future.
+    """
+    def __init__(self, size_bytes: int) -> None:
+        self.future: Future = Future()
+        self.size_bytes = size_bytes
+        self.waiters = 0
+
+
+class ModelRegistry:
+    """
+    Process level registry of loaded LlamaAI models, so objects using the same model file and load parameters share one model in memory.
+
+    Models are reference counted. Once a model isn't used anymore it stays loaded for reuse
+    until the total size of loaded models exceeds max_bytes, then idle models are unloaded least recently used first.
+    Models in use are never unloaded, so the budget can be exceeded while they are.
+    Models are loaded outside the registry lock, so a slow load only blocks acquisitions of the same model.
+
+    Args:
+        max_bytes: Memory budget for loaded models, in bytes of model files. Defaults to 0, unloading models as soon as they aren't used.
+
+    Attributes:
+        max_bytes: Memory budget for loaded models, in bytes of model files.
+    """
+    def __init__(self, max_bytes: int = 0) -> None:
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._models: "OrderedDict[Tuple, ModelHandle]" = OrderedDict()
+        self._loading: Dict[Tuple, _Loading] = {}
+
+    @staticmethod
+    def _key(model_path: str, max_tokens: int, llama_kwargs: Optional[dict]) -> Tuple:
+        kwargs = tuple(sorted((name, repr(value)) for name, value in (llama_kwargs or {}).items()))
+        return (os.path.realpath(model_path), max_tokens, kwargs)
+
+    def acquire(self, model_path: str, max_tokens: int = 200, llama_kwargs: Optional[dict] = None) -> ModelHandle:
+        """
+        Get the shared model for the model file and load parameters, loading it if needed.
+
+        Args:
+            model_path: Path to the GGUF model file.
+            max_tokens: Max tokens for LlamaAI model.
+            llama_kwargs: Optional extra keyword arguments for the llama model.
+
+        Returns:
+            ModelHandle with the loaded model, release it once done with it.
+        """
+        key = self._key(model_path, max_tokens, llama_kwargs)
+        with self._lock:
+            handle = self._models.get(key)
+            if handle is not None:
+                print(f"Reusing loaded model: {model_path}")
+                self._models.move_to_end(key)
+                handle.refs += 1
+                return handle
+            loading = self._loading.get(key)
+            waiting = loading is not None
+            if waiting:
+                loading.waiters += 1
+            else:
+                size_bytes = os.path.getsize(model_path) if os.path.isfile(model_path) else 0
+                self._evict(size_bytes)
+                if self.max_bytes and self._size_bytes() + size_bytes > self.max_bytes:
+                    print(f"WARNING: Loading {model_path} exceeds the model registry budget of {self.max_bytes} bytes, all loaded models are in use.")
+                loading = self._loading[key] = _Loading(size_bytes)
+        if waiting:
+            print(f"Waiting for model being loaded: {model_path}")
+            # the loading call counts the waiters in the refs of the handle
+            return loading.future.result()
+        try:
+            ai = LlamaAI(model_path, max_tokens=max_tokens, **(llama_kwargs or {}))
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            loading.future.set_exception(e)
+            raise
+        handle = ModelHandle(self, key, ai, loading.size_bytes)
+        with self._lock:
+            del self._loading[key]
+            handle.refs = 1 + loading.waiters
+            self._models[key] = handle
+        loading.future.set_result(handle)
+        return handle
+
+    def release(self, handle: ModelHandle) -> None:
+        """
+        Release one acquisition of a model, unloading idle models if the budget is exceeded.
+
+        Args:
+            handle: ModelHandle returned by acquire().
+        """
+        with self._lock:
+            if handle.refs > 0:
+                handle.refs -= 1
+            self._evict()
+
+    def _evict(self, extra_bytes: int = 0) -> None:
+        """
+        Unload idle models, least recently used first, until the loaded models and extra_bytes fit the budget. Call with the lock held.
+        """
+        for key, handle in list(self._models.items()):
+            if self._size_bytes() + extra_bytes <= self.max_bytes:
+                break
+            if handle.refs == 0:
+                del self._models[key]
+
+    def _size_bytes(self) -> int:
+        return sum(handle.size_bytes for handle in self._models.values()) + sum(loading.size_bytes for loading in self._loading.values())
+
+    def size_bytes(self) -> int:
+        """
+        Returns the total size of the loaded model files, including models being loaded.
+        """
+        with self._lock:
+            return self._size_bytes()
+
+    def loaded_models(self) -> list:
+        """
+        Returns the paths of the loaded models, least recently used first.
+        """
+        with self._lock:
+            return [key[0] for key in self._models]
+
+    def clear(self) -> None:
+        """
+        Unload all idle models.
+        """
+        with self._lock:
+            for key, handle in list(self._models.items()):
+                if handle.refs == 0:
+                    del self._models[key]
+
+
+MODEL_REGISTRY = ModelRegistry()
@@ -0,0 +1,131 @@
+from collections import OrderedDict
+from typing import Any, Optional, Sequence
+from gguf_llama import LlamaAI
+
+__all__ = ['PromptCache']
+
+def common_prefix_length(a: Sequence[int], b: Sequence[int]) -> int:
+    """
+    Returns the length of the longest common prefix of two token sequences.
+    """
+    length = 0
+    for token_a, token_b in zip(a, b):
+        if token_a != token_b:
+            break
+        length += 1
+    return length
+
+
+class PromptCache:
+    """
+    Keeps evaluated model states (KV cache) of prompt prefixes, so prompts starting with them only need their suffix evaluated.
+
+    The llama model itself already reuses the longest common token prefix with the previous prompt.
+    PromptCache adds saved states for chosen prefixes (i.e. system prompts) that survive generations
+    with other prompts in between. Before a generation, `prepare()` restores the saved state that shares
+    the longest token prefix with the prompt, if it's longer than what the model already has evaluated.
+
+    Cached states are evicted least recently used first once capacity_bytes is exceeded, pinned ones are never evicted.
+
+    Args:
+        ai: Loaded LlamaAI instance.
+        capacity_bytes: Max size of the saved states. Defaults to 2 GiB.
+
+    Attributes:
+        ai: LlamaAI instance the states belong to.
+        capacity_bytes: Max size of the saved states.
+    """
+    def __init__(self, ai: LlamaAI, capacity_bytes: int = 2 << 30) -> None:
+        self.ai = ai
+        self.capacity_bytes = capacity_bytes
+        self._states: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._pinned: set = set()
+
+    def _tokenize(self, text: str) -> list:
+        return self.ai.llm.tokenize(text.encode("utf-8"), special=True)
+
+    def size_bytes(self) -> int:
+        """
+        Returns the total size of the saved states in bytes.
+        """
+        return sum(state.llama_state_size for state in self._states.values())
+
+    def _evict(self) -> None:
+        size = self.size_bytes()
+        for key in list(self._states.keys()):
+            if size <= self.capacity_bytes:
+                break
+            if key not in self._pinned:
+                size -= self._states.pop(key).llama_state_size
+
+    def add(self, prefix: str, pin: bool = False) -> int:
+        """
+        Evaluate the prefix and save the resulting model state.
+
+        Does nothing but refresh the entry if the prefix is already cached.
+
+        Args:
+            prefix: Prompt prefix text, with tags, exactly as it starts the prompts it's meant for.
+            pin: Whether to keep the state until unpinned instead of evicting it when over capacity.
+
+        Returns:
+            Number of tokens in the prefix.
+        """
+        key = tuple(self._tokenize(prefix))
+        if key in self._states:
+            self._states.move_to_end(key)
+        else:
+            llm = self.ai.llm
+            llm.reset()
+            llm.eval(list(key))
+            self._states[key] = llm.save_state()
+        if pin:
+            self._pinned.add(key)
+        self._evict()
+        return len(key)
+
+    def pin(self, prefix: str) -> int:
+        """
+        Same as add() with pin=True, the state of the prefix is kept until unpinned.
+        """
+        return self.add(prefix, pin=True)
+
+    def unpin(self, prefix: str) -> None:
+        """
+        Allow the saved state of the prefix to be evicted again.
+        """
+        self._pinned.discard(tuple(self._tokenize(prefix)))
+        self._evict()
+
+    def clear(self) -> None:
+        """
+        Remove all saved states, including pinned ones.
+        """
+        self._states.clear()
+        self._pinned.clear()
+
+    def prepare(self, prompt: str) -> int:
+        """
+        Restore the saved state sharing the longest token prefix with the prompt.
+
+        The state is only restored if it reuses more tokens than the model has evaluated already.
+
+        Args:
+            prompt: Prompt text about to be generated from.
+
+        Returns:
+            Number of prompt tokens that won't need to be evaluated again.
+        """
+        llm = self.ai.llm
+        tokens = self._tokenize(prompt)
+        reused = common_prefix_length(llm.input_ids[:llm.n_tokens].tolist(), tokens)
+        best_key: Optional[tuple] = None
+        for key in self._states:
+            length = common_prefix_length(key, tokens)
+            if length > reused:
+                reused = length
+                best_key = key
+        if best_key is not None:
+            llm.load_state(self._states[best_key])
+            self._states.move_to_end(best_key)
+        return reused
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup
+from gguf_modeldb import ModelData
+
+__all__ = ['RepoImporter']
+
+class RepoImporter:
+    """
+    Imports model data for all GGUF files of HuggingFace model repos.
+
+    The links to the GGUF files are all on the repo page and its file tree page, which are fetched concurrently.
+    Model data is derived from the file URLs alone, so no page of the individual files is requested.
+    Pages are fetched with a pooled HTTP session and kept in a local page cache. Cached pages are revalidated
+    with the server (ETag/Last-Modified), so importing a repo again only downloads pages that changed.
+
+    Args:
+        max_workers: Max number of concurrent requests. Defaults to 8.
+        cache_dir: Directory of the page cache. Defaults to ~/.cache/glai/pages, None disables it.
+        timeout: Seconds to wait for the server before failing a request.
+
+    Attributes:
+        max_workers: Max number of concurrent requests.
+        cache_dir: Directory of the page cache, None if disabled.
+        session: Pooled requests.Session used for all requests.
+    """
+    def __init__(self, max_workers: int = 8, cache_dir: Optional[str] = os.path.join(os.path.expanduser("~"), ".cache", "glai", "pages"), timeout: float = 30) -> None:
+        self.max_workers = max_workers
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _cache_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+    def fetch_page(self, url: str) -> str:
+        """
+        Fetch the page, revalidating the cached copy if there is one.
+
+        Args:
+            url: URL of the page.
+
+        Returns:
+            Page text.
+
+        Raises:
+            requests.HTTPError: If the server responds with an error.
+        """
+        cached = None
+        if self.cache_dir is not None and os.path.isfile(self._cache_path(url)):
+            with open(self._cache_path(url), "r", encoding="utf-8") as cache_file:
+                cached = json.load(cache_file)
+        headers = {}
+        if cached is not None:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if cached is not None and response.status_code == 304:
+            return cached["text"]
+        response.raise_for_status()
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{self._cache_path(url)}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as cache_file:
+                json.dump({"url": url, "etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified"), "text": response.text}, cache_file)
+            os.replace(temp_path, self._cache_path(url))
+        return response.text
+
+    @staticmethod
+    def _gguf_links(repo_url: str, page_url: str, page: str) -> List[str]:
+        """
+        Returns the links to GGUF files of the repo on the page, download links are converted to file page links.
+        """
+        repo_path = "/".join(urlparse(repo_url).path.split("/")[:3]) + "/"
+        links = []
+        for anchor in BeautifulSoup(page, "html.parser").find_all("a", href=True):
+            url = urljoin(page_url, anchor["href"]).split("?")[0].split("#")[0]
+            path = urlparse(url).path
+            if not path.endswith(".gguf") or not path.startswith(repo_path):
+                continue
+            url = url.replace(repo_path + "resolve/", repo_path + "blob/", 1)
+            if url not in links:
+                links.append(url)
+        return links
+
+    def find_gguf_urls(self, hf_repo_url: str) -> List[str]:
+        """
+        Find the URLs of all GGUF files in the repo.
+
+        The repo page and its file tree page are fetched concurrently.
+
+        Args:
+            hf_repo_url: URL of the HuggingFace model repo.
+
+        Returns:
+            Unique GGUF file URLs, in the order they were found.
+        """
+        page_urls = [hf_repo_url]
+        if "/tree/" not in hf_repo_url and "/blob/" not in hf_repo_url:
+            page_urls.append(hf_repo_url.rstrip("/") + "/tree/main")
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(page_urls)), thread_name_prefix="glai-import") as executor:
+            pages = list(executor.map(self.fetch_page, page_urls))
+        urls = []
+        for page_url, page in zip(page_urls, pages):
+            urls += [url for url in self._gguf_links(hf_repo_url, page_url, page) if url not in urls]
+        return urls
+
+    def import_repo(self,
+                    hf_repo_url: str,
+                    db_dir: str,
+                    user_tags: Tuple[str, str] = ("", ""),
+                    ai_tags: Tuple[str, str] = ("", ""),
+                    system_tags: Optional[Tuple[str, str]] = (None, None),
+                    keywords: Optional[str] = None,
+                    description: Optional[str] = None,
+                    is_imported: Optional[Callable[[str], bool]] = None
+                    ) -> List[ModelData]:
+        """
+        Create and save model data for all GGUF files of the repo.
+
+        Args:
+            hf_repo_url: URL of the HuggingFace model repo.
+            db_dir: Model DB directory to save model data to.
+            user_tags: User tags to assign to model data.
+            ai_tags: AI tags to assign to model data.
+            system_tags: System tags to assign to model data.
+            keywords: Optional keywords for model data.
+            description: Optional description for model data.
+            is_imported: Optional function returning whether a GGUF URL is already in the DB, to skip it.
+
+        Returns:
+            Imported ModelData objects.
+        """
+        urls = self.find_gguf_urls(hf_repo_url)
+        skipped = [url for url in urls if is_imported is not None and is_imported(url)]
+        urls = [url for url in urls if url not in skipped]
+        print(f"Found {len(urls) + len(skipped)} GGUF files in {hf_repo_url}, importing {len(urls)}, skipping {len(skipped)} already imported.")
+        imported = []
+        for url in urls:
+            model_data = ModelData(url, db_dir, user_tags, ai_tags, system_tags=system_tags, description=description, keywords=keywords)
+            model_data.save_json()
+            print(f"Imported: {model_data}")
+            imported.append(model_data)
+        return imported
+
+    def close(self) -> None:
+        """
+        Close the pooled HTTP session.
+        """
+        self.session.close()
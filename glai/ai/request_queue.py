@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+__all__ = ['RequestQueue', 'QueueFullError']
+
+class QueueFullError(Exception):
+    """
+    Raised when a request can't be queued because max_pending requests are already waiting.
+    """
+
+
+class RequestQueue:
+    """
+    First in, first out lock giving threads access to a shared model one at a time.
+
+    Threads are let through in the order they arrived, so a busy model can't starve any of them.
+    With max_pending set, requests arriving when that many are already waiting are rejected right away
+    with QueueFullError, instead of piling up.
+
+    Args:
+        max_pending: Max number of requests waiting for the model, None for no limit.
+
+    Attributes:
+        max_pending: Max number of requests waiting for the model, None for no limit.
+    """
+    def __init__(self, max_pending: Optional[int] = None) -> None:
+        self.max_pending = max_pending
+        self._condition = threading.Condition()
+        self._waiting: deque = deque()
+        self._busy = False
+
+    def pending(self) -> int:
+        """
+        Returns the number of requests waiting for the model.
+        """
+        with self._condition:
+            return len(self._waiting)
+
+    def is_busy(self) -> bool:
+        """
+        Returns whether a request is currently using the model.
+        """
+        with self._condition:
+            return self._busy
+
+    def acquire(self, timeout: Optional[float] = None) -> None:
+        """
+        Wait for the model, in the order of arrival.
+
+        Args:
+            timeout: Optional max seconds to wait.
+
+        Raises:
+            QueueFullError: If max_pending requests are already waiting.
+            TimeoutError: If the model didn't become available within the timeout.
+        """
+        with self._condition:
+            if not self._busy and not self._waiting:
+                self._busy = True
+                return
+            if self.max_pending is not None and len(self._waiting) >= self.max_pending:
+                raise QueueFullError(f"{len(self._waiting)} requests are already waiting for the model.")
+            ticket = object()
+            self._waiting.append(ticket)
+            deadline = time.monotonic() + timeout if timeout is not None else None
+            while self._busy or self._waiting[0] is not ticket:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    self._waiting.remove(ticket)
+                    self._condition.notify_all()
+                    raise TimeoutError(f"Model didn't become available within {timeout} seconds.")
+                self._condition.wait(remaining)
+            self._waiting.popleft()
+            self._busy = True
+
+    def release(self) -> None:
+        """
+        Let the next waiting request use the model.
+        """
+        with self._condition:
+            self._busy = False
+            self._condition.notify_all()
+
+    @contextmanager
+    def hold(self, timeout: Optional[float] = None) -> Iterator[None]:
+        """
+        Context manager acquiring the model for the duration of the block, see acquire().
+        """
+        self.acquire(timeout)
+        try:
+            yield
+        finally:
+            self.release()
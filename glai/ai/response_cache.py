@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Union
+
+__all__ = ['ResponseCache']
+
+class ResponseCache:
+    """
+    Cache of generated responses, so repeated prompts are answered without running the model.
+
+    Responses are keyed by the model identity (model file, its size and modification time, and load parameters),
+    the rendered prompt, the stop settings and optional sampling parameters. Recent responses are kept in memory
+    and evicted least recently used first, optionally also in a directory on disk, surviving restarts and shared between processes.
+    A cached response is returned for every repeat of the prompt, so use it where the same prompt should get the same answer,
+    i.e. with deterministic sampling or templated queries.
+
+    Args:
+        capacity: Max number of responses kept in memory. Defaults to 1024.
+        ttl: Optional seconds after which cached responses expire.
+        cache_dir: Optional directory to also keep responses in on disk.
+        normalize: Whether prompts differing only in whitespace share cached responses. Defaults to False.
+
+    Attributes:
+        capacity: Max number of responses kept in memory.
+        ttl: Seconds after which cached responses expire, None if they don't.
+        cache_dir: Directory responses are kept in on disk, None if disabled.
+        normalize: Whether prompts differing only in whitespace share cached responses.
+        hits: Number of lookups answered from the cache.
+        misses: Number of lookups not found in the cache.
+    """
+    def __init__(self, capacity: int = 1024, ttl: Optional[float] = None, cache_dir: Optional[str] = None, normalize: bool = False) -> None:
+        self.capacity = capacity
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self.normalize = normalize
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._responses: "OrderedDict[str, Tuple[Optional[float], str]]" = OrderedDict()
+
+    def key(self,
+            model_key: Tuple,
+            prompt: str,
+            stop_at: Optional[Union[str, List[str]]] = None,
+            include_stop_str: bool = True,
+            sampling: Optional[dict] = None
+            ) -> str:
+        """
+        Returns the cache key of a generation.
+
+        Args:
+            model_key: Model identity, the model path first, i.e. `ModelHandle.key` of the model registry.
+            prompt: Rendered prompt text.
+            stop_at: String or list of strings the generation stops at.
+            include_stop_str: Whether the stop string is included in the response.
+            sampling: Optional sampling parameters of the generation.
+
+        Returns:
+            Hex digest identifying the generation.
+        """
+        stat = os.stat(model_key[0]) if os.path.isfile(model_key[0]) else None
+        model_id = [model_key, None if stat is None else [stat.st_size, stat.st_mtime_ns]]
+        if self.normalize:
+            prompt = " ".join(prompt.split())
+        data = json.dumps([model_id, prompt, stop_at, include_stop_str, sorted((sampling or {}).items())], ensure_ascii=False, default=repr)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def _file_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def _expired(self, expires_at: Optional[float]) -> bool:
+        return expires_at is not None and expires_at <= time.time()
+
+    def _read_file(self, key: str) -> Optional[Tuple[Optional[float], str]]:
+        try:
+            with open(self._file_path(key), "r", encoding="utf-8") as cache_file:
+                entry = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+        if self._expired(entry["expires_at"]):
+            try:
+                os.remove(self._file_path(key))
+            except OSError:
+                pass
+            return None
+        return entry["expires_at"], entry["response"]
+
+    def _write_file(self, key: str, expires_at: Optional[float], response: str) -> None:
+        try:
+            os.makedirs(os.path.dirname(self._file_path(key)), exist_ok=True)
+            temp_path = f"{self._file_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as cache_file:
+                json.dump({"expires_at": expires_at, "response": response}, cache_file, ensure_ascii=False)
+            os.replace(temp_path, self._file_path(key))
+        except OSError as e:
+            print(f"WARNING: Couldn't save response to cache dir {self.cache_dir}: {e}")
+
+    def _remember(self, key: str, expires_at: Optional[float], response: str) -> None:
+        """
+        Keep the response in memory, evicting the least recently used ones over capacity. Call with the lock held.
+        """
+        self._responses[key] = (expires_at, response)
+        self._responses.move_to_end(key)
+        while len(self._responses) > self.capacity:
+            self._responses.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the cached response, looking in memory first and then on disk.
+
+        Args:
+            key: Cache key, see key().
+
+        Returns:
+            Cached response, None if not cached or expired.
+        """
+        with self._lock:
+            entry = self._responses.get(key)
+            if entry is not None and self._expired(entry[0]):
+                del self._responses[key]
+                entry = None
+            if entry is not None:
+                self._responses.move_to_end(key)
+        if entry is None and self.cache_dir is not None:
+            entry = self._read_file(key)
+            if entry is not None:
+                with self._lock:
+                    self._remember(key, *entry)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, response: str) -> None:
+        """
+        Cache the response.
+
+        Args:
+            key: Cache key, see key().
+            response: Generated response text.
+        """
+        expires_at = None if self.ttl is None else time.time() + self.ttl
+        with self._lock:
+            self._remember(key, expires_at, response)
+        if self.cache_dir is not None:
+            self._write_file(key, expires_at, response)
+
+    def clear(self) -> None:
+        """
+        Remove all cached responses, from memory and disk.
+        """
+        with self._lock:
+            self._responses.clear()
+            if self.cache_dir is not None and os.path.isdir(self.cache_dir):
+                for dir_path, _, file_names in os.walk(self.cache_dir):
+                    for file_name in file_names:
+                        if file_name.endswith(".json"):
+                            os.remove(os.path.join(dir_path, file_name))
+
+    def __len__(self) -> int:
+        return len(self._responses)
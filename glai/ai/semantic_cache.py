@@ -0,0 +1,110 @@
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from .embeddings import Embedder
+
+__all__ = ['SemanticCache']
+
+class _ScopeIndex:
+    """
+    Embeddings and responses of one scope, in a fixed size ring overwriting the oldest entries.
+    """
+    def __init__(self, capacity: int, dimensions: int) -> None:
+        self.vectors = np.zeros((capacity, dimensions), dtype=np.float32)
+        self.responses: List[Optional[str]] = [None] * capacity
+        self.size = 0
+        self.next = 0
+
+    def add(self, embedding: np.ndarray, response: str) -> None:
+        self.vectors[self.next] = embedding
+        self.responses[self.next] = response
+        self.next = (self.next + 1) % len(self.responses)
+        self.size = min(self.size + 1, len(self.responses))
+
+    def search(self, embedding: np.ndarray) -> Tuple[float, Optional[str]]:
+        if self.size == 0:
+            return -1.0, None
+        similarities = self.vectors[:self.size] @ embedding
+        best = int(np.argmax(similarities))
+        return float(similarities[best]), self.responses[best]
+
+
+class SemanticCache:
+    """
+    Cache of generated responses answering prompts similar to the ones already seen, not only identical ones.
+
+    Prompts are embedded with an Embedder and compared by cosine similarity to the cached ones, all at once
+    with a NumPy matrix product. The response of the most similar cached prompt is returned if the similarity reaches the threshold.
+    Entries are separated by scope (i.e. the model, system message and stop settings), so only prompts of the same kind match.
+    Each scope keeps up to capacity entries, the oldest are overwritten first.
+
+    Args:
+        embedder: Embedder to embed prompts with.
+        threshold: Min cosine similarity of a cached prompt to return its response. Defaults to 0.95.
+        capacity: Max number of entries per scope. Defaults to 1024.
+
+    Attributes:
+        embedder: Embedder prompts are embedded with.
+        threshold: Min cosine similarity of a cached prompt to return its response.
+        capacity: Max number of entries per scope.
+        hits: Number of searches answered from the cache.
+        misses: Number of searches without a similar enough prompt.
+    """
+    def __init__(self, embedder: Embedder, threshold: float = 0.95, capacity: int = 1024) -> None:
+        self.embedder = embedder
+        self.threshold = threshold
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._scopes: Dict[str, _ScopeIndex] = {}
+
+    def embed(self, prompt: str) -> np.ndarray:
+        """
+        Returns the embedding of the prompt, to search and add it with.
+        """
+        return self.embedder.embed(prompt)[0]
+
+    def search(self, scope: str, embedding: np.ndarray) -> Optional[str]:
+        """
+        Returns the response of the most similar cached prompt of the scope, if similar enough.
+
+        Args:
+            scope: Scope of the prompt, see class description.
+            embedding: Embedding of the prompt, see embed().
+
+        Returns:
+            Cached response, None if no cached prompt reaches the similarity threshold.
+        """
+        with self._lock:
+            index = self._scopes.get(scope)
+            similarity, response = index.search(embedding) if index is not None else (-1.0, None)
+            if response is None or similarity < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return response
+
+    def add(self, scope: str, embedding: np.ndarray, response: str) -> None:
+        """
+        Cache the response of the prompt.
+
+        Args:
+            scope: Scope of the prompt, see class description.
+            embedding: Embedding of the prompt, see embed().
+            response: Generated response text.
+        """
+        with self._lock:
+            if scope not in self._scopes:
+                self._scopes[scope] = _ScopeIndex(self.capacity, len(embedding))
+            self._scopes[scope].add(embedding, response)
+
+    def clear(self) -> None:
+        """
+        Remove all cached responses.
+        """
+        with self._lock:
+            self._scopes.clear()
+
+    def __len__(self) -> int:
+        return sum(index.size for index in self._scopes.values())
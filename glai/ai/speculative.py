@@ -0,0 +1,83 @@
+import threading
+from typing import Optional
+import numpy as np
+from llama_cpp.llama_speculative import LlamaDraftModel
+from gguf_llama import LlamaAI
+
+__all__ = ['LlamaAIDraftModel']
+
+class LlamaAIDraftModel(LlamaDraftModel):
+    """
+    Draft model for speculative decoding, drafting tokens greedily with a small GGUF model.
+
+    Pass it to the main llama model as `llama_kwargs={"draft_model": LlamaAIDraftModel(...)}`, the main model
+    then evaluates the drafted tokens in one batch and keeps the ones it would have sampled itself,
+    generating several tokens per evaluation of the large model when the draft model guesses right.
+    The draft model must use the same vocabulary as the main model, i.e. a smaller model of the same family.
+
+    The draft model is loaded on first use, so creating one that isn't used (i.e. when the main model is reused from the model registry) is cheap.
+    Between calls the draft model keeps its evaluated tokens, only the tokens added since are evaluated.
+
+    Args:
+        model_path: Path to the GGUF file of the draft model.
+        max_tokens: Max tokens for the draft LlamaAI model, at least the max tokens of the main model.
+        num_pred_tokens: Number of tokens to draft per evaluation of the main model. Defaults to 8.
+        llama_kwargs: Optional extra keyword arguments for the draft llama model, i.e. {"n_threads": 4}.
+
+    Attributes:
+        model_path: Path to the GGUF file of the draft model.
+        max_tokens: Max tokens for the draft LlamaAI model.
+        num_pred_tokens: Number of tokens to draft per evaluation of the main model.
+        llama_kwargs: Extra keyword arguments for the draft llama model.
+    """
+    def __init__(self, model_path: str, max_tokens: int = 200, num_pred_tokens: int = 8, llama_kwargs: Optional[dict] = None) -> None:
+        self.model_path = model_path
+        self.max_tokens = max_tokens
+        self.num_pred_tokens = num_pred_tokens
+        self.llama_kwargs = llama_kwargs or {}
+        self._ai: Optional[LlamaAI] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ai(self) -> LlamaAI:
+        """
+        The draft LlamaAI model, loaded on first use.
+        """
+        with self._lock:
+            if self._ai is None:
+                print(f"Loading draft model: {self.model_path}")
+                self._ai = LlamaAI(self.model_path, max_tokens=self.max_tokens, **self.llama_kwargs)
+            return self._ai
+
+    def __call__(self, input_ids: np.ndarray, /, **kwargs) -> np.ndarray:
+        """
+        Draft the tokens following input_ids.
+
+        Args:
+            input_ids: Tokens evaluated by the main model so far.
+
+        Returns:
+            Array of up to num_pred_tokens drafted tokens, fewer if the draft model generates EOS or runs out of context.
+        """
+        llm = self.ai.llm
+        input_ids = [int(token) for token in input_ids]
+        prefix = 0
+        for evaluated, token in zip(llm.input_ids[:llm.n_tokens].tolist(), input_ids[:-1]):
+            if evaluated != token:
+                break
+            prefix += 1
+        llm.n_tokens = prefix
+        llm.eval(input_ids[prefix:])
+        drafted = []
+        while len(drafted) < self.num_pred_tokens and llm.n_tokens < llm.n_ctx():
+            token = int(np.argmax(llm.scores[llm.n_tokens - 1]))
+            if token == llm.token_eos():
+                break
+            drafted.append(token)
+            if len(drafted) < self.num_pred_tokens:
+                llm.eval([token])
+        return np.array(drafted, dtype=np.intc)
+
+    def __repr__(self) -> str:
+        # Stable repr, so models loaded with the same draft model settings share one registry entry
+        return f"LlamaAIDraftModel({self.model_path!r}, max_tokens={self.max_tokens}, num_pred_tokens={self.num_pred_tokens}, llama_kwargs={sorted(self.llama_kwargs.items())!r})"
@@ -0,0 +1,201 @@
+import codecs
+import threading
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Union
+from gguf_llama import LlamaAI
+from llama_cpp import LlamaGrammar
+
+__all__ = ['StopStringMatcher', 'stream_tokens', 'stream_completion']
+
+class StopStringMatcher:
+    """
+    Incrementally searches streamed text for any of the stop strings.
+
+    The stop strings are compiled into an Aho-Corasick automaton, each new character advances it by one step,
+    so the cost per character doesn't grow with the number of stop strings and the emitted output is never rescanned.
+    Text that could still turn out to be the start of a stop string is held back
+    until more text arrives, so the caller never emits characters it would later have to take back.
+    Generation stops at the stop string that ends first.
+
+    Args:
+        stop_at: String or list of strings to stop generation at. None or empty strings disable stopping.
+        include_stop_str: Whether to include the stop string in the emitted text.
+
+    Attributes:
+        stop_strings: Stop strings searched for.
+        stopped: True once a stop string has been found.
+        stop_string: The stop string that was found, None until then.
+    """
+    def __init__(self, stop_at: Optional[Union[str, List[str]]] = None, include_stop_str: bool = True) -> None:
+        if isinstance(stop_at, str):
+            stop_at = [stop_at]
+        self.stop_strings = [stop_string for stop_string in (stop_at or []) if stop_string]
+        self.include_stop_str = include_stop_str
+        self.stopped = False
+        self.stop_string: Optional[str] = None
+        self._buffer = ""
+        self._state = 0
+        self._build()
+
+    def _build(self) -> None:
+        """
+        Builds the automaton: the trie of the stop strings, the failure links and for each state the length of the longest stop string ending there.
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._depth = [0]
+        self._match = [0]
+        for stop_string in self.stop_strings:
+            state = 0
+            for char in stop_string:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._depth.append(self._depth[state] + 1)
+                    self._match.append(0)
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._match[state] = len(stop_string)
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                if not self._match[next_state]:
+                    self._match[next_state] = self._match[self._fail[next_state]]
+                queue.append(next_state)
+
+    def _step(self, char: str) -> int:
+        state = self._state
+        while state and char not in self._goto[state]:
+            state = self._fail[state]
+        self._state = self._goto[state].get(char, 0)
+        return self._state
+
+    def feed(self, text: str) -> str:
+        """
+        Feeds newly generated text to the matcher.
+
+        Args:
+            text: Newly generated text.
+
+        Returns:
+            Text that is safe to emit, may be empty.
+        """
+        if self.stopped:
+            return ""
+        if not self.stop_strings:
+            return text
+        start = len(self._buffer)
+        self._buffer += text
+        for index in range(start, len(self._buffer)):
+            length = self._match[self._step(self._buffer[index])]
+            if length:
+                self.stopped = True
+                self.stop_string = self._buffer[index + 1 - length:index + 1]
+                output = self._buffer[:index + 1 if self.include_stop_str else index + 1 - length]
+                self._buffer = ""
+                return output
+        keep = self._depth[self._state]
+        output = self._buffer[:len(self._buffer) - keep]
+        self._buffer = self._buffer[len(self._buffer) - keep:]
+        return output
+
+    def flush(self) -> str:
+        """
+        Returns any held back text once generation has ended without hitting a stop string.
+        """
+        output = self._buffer
+        self._buffer = ""
+        return output
+
+
+def stream_tokens(
+    llm: Any,
+    prompt_tokens: List[int],
+    stop_at: Optional[Union[str, List[str]]] = None,
+    include_stop_str: bool = True,
+    generated_tokens: Optional[List[int]] = None,
+    grammar: Optional[LlamaGrammar] = None,
+    cancel: Optional[threading.Event] = None
+) -> Iterator[str]:
+    """
+    Stream a completion of already tokenized prompt from the llama model.
+
+    The model reuses the state of the longest token prefix it shares with the previously evaluated tokens,
+    so only the rest of the prompt is evaluated. Generation runs until a stop string, the end of sequence
+    token or the context limit of the model is reached, the model stops generating as soon as a stop string is found.
+    Setting the cancel event stops the generation after the current token, the prompt evaluation can't be interrupted.
+
+    Args:
+        llm: The llama model, `LlamaAI.llm`.
+        prompt_tokens: Prompt tokens to generate from.
+        stop_at: Optional string or list of strings to stop generation at.
+        include_stop_str: Whether to include the stop string in the generated text.
+        generated_tokens: Optional list the sampled tokens are appended to.
+        grammar: Optional LlamaGrammar constraining the sampled tokens, see `build_grammar()`.
+        cancel: Optional event stopping the generation once set.
+
+    Yields:
+        Generated text deltas.
+
+    Raises:
+        Exception: If the prompt doesn't leave any room for generation.
+    """
+    max_new_tokens = llm.n_ctx() - len(prompt_tokens)
+    if max_new_tokens <= 0:
+        raise Exception(f"Prompt is {len(prompt_tokens)} tokens long, which leaves no room for generation within {llm.n_ctx()} max total tokens.")
+    matcher = StopStringMatcher(stop_at, include_stop_str)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    eos_token = llm.token_eos()
+    sampled_tokens = 0
+    if cancel is not None and cancel.is_set():
+        return
+    for token in (llm.generate(prompt_tokens) if grammar is None else llm.generate(prompt_tokens, grammar=grammar)):
+        if token == eos_token:
+            break
+        if generated_tokens is not None:
+            generated_tokens.append(token)
+        delta = matcher.feed(decoder.decode(llm.detokenize([token])))
+        if delta:
+            yield delta
+        sampled_tokens += 1
+        if matcher.stopped or sampled_tokens >= max_new_tokens or (cancel is not None and cancel.is_set()):
+            break
+    tail = matcher.feed(decoder.decode(b"", final=True)) + matcher.flush()
+    if tail:
+        yield tail
+
+
+def stream_completion(
+    ai: LlamaAI,
+    prompt: str,
+    stop_at: Optional[Union[str, List[str]]] = None,
+    include_stop_str: bool = True,
+    grammar: Optional[LlamaGrammar] = None,
+    cancel: Optional[threading.Event] = None
+) -> Iterator[str]:
+    """
+    Stream a completion of the prompt from the LlamaAI model, token by token.
+
+    Generation runs until a stop string, the end of sequence token or the
+    context limit of the model (max_total_tokens) is reached, or the cancel event is set.
+
+    Args:
+        ai: Loaded LlamaAI instance.
+        prompt: Prompt text to generate from.
+        stop_at: Optional string or list of strings to stop generation at.
+        include_stop_str: Whether to include the stop string in the generated text.
+        grammar: Optional LlamaGrammar constraining the sampled tokens, see `build_grammar()`.
+        cancel: Optional event stopping the generation after the current token once set.
+
+    Returns:
+        Iterator over generated text deltas.
+
+    Raises:
+        Exception: If the prompt doesn't leave any room for generation.
+    """
+    prompt_tokens = ai.llm.tokenize(prompt.encode("utf-8"), special=True)
+    return stream_tokens(ai.llm, prompt_tokens, stop_at, include_stop_str, grammar=grammar, cancel=cancel)
@@ -1,6 +1,6 @@
-
-from .messages import AIMessage, AIMessages
+from .messages import AIMessage, AIMessages, TokenCounter
+from .conversation_store import ConversationStore, ConversationView
 
 # Making certain symbols available when the package is imported
-__all__ = ['AIMessage', 'AIMessages']
+__all__ = ['AIMessage', 'AIMessages', 'TokenCounter', 'ConversationStore', 'ConversationView']
 #print(f"Initializing ai package, available classes: {__all__}")
@@ -0,0 +1,290 @@
+import json
+import mmap
+import os
+import threading
+from typing import Optional
+from .messages import AIMessage, AIMessages
+
+__all__ = ['ConversationStore', 'ConversationView']
+
+class ConversationView:
+    """
+    Lightweight handle of a conversation in a ConversationStore, messages are read from the store only when requested.
+
+    Attributes:
+        store (ConversationStore): The store of the conversation.
+        key (str): The key of the conversation.
+    """
+    __slots__ = ("store", "key")
+
+    def __init__(self, store:"ConversationStore", key:str):
+        self.store = store
+        self.key = key
+
+    def load(self, last_k:Optional[int] = None) -> AIMessages:
+        """
+        Returns the conversation as AIMessages, see `ConversationStore.load()`.
+        """
+        return self.store.load(self.key, last_k)
+
+    def last_message(self) -> Optional[AIMessage]:
+        """
+        Returns the last message of the conversation.
+        """
+        return self.store.load(self.key, last_k=1).get_last_message()
+
+    def size_bytes(self) -> int:
+        """
+        Returns the size of the conversation records in the store file.
+        """
+        return self.store.size_bytes(self.key)
+
+    def __repr__(self) -> str:
+        return f"ConversationView({self.key!r})"
+
+
+class ConversationStore:
+    """
+    Stores many conversations in a single append-only file, read through a memory map.
+
+    Each conversation is stored in the JSON lines format of `AIMessages.save_jsonl()`, as one or more segments of the file.
+    An offset index of the segments is kept in memory and in an append-only index file next to the data file,
+    so saving or appending to a conversation never rewrites the file, and loading a conversation only reads its own segments.
+    A conversation appended to max_segments times is copied into a single segment, and the index file is rewritten
+    with only the current segments once most of its entries are outdated, so memory use and the time to open the store
+    grow with the number of conversations, not with the number of appends.
+    Conversations saved again leave their old records behind as garbage, use compact() to reclaim the space.
+
+    Parameters:
+        file_path (str): The path of the data file, the index is stored at file_path + ".index".
+        max_segments (int): Max number of segments of a conversation before they're copied into one. Defaults to 16.
+
+    Attributes:
+        file_path (str): The path of the data file.
+        index_path (str): The path of the index file.
+        max_segments (int): Max number of segments of a conversation.
+    """
+
+    def __init__(self, file_path:str, max_segments:int = 16):
+        self.file_path = file_path
+        self.index_path = file_path + ".index"
+        self.max_segments = max_segments
+        self._lock = threading.RLock()
+        self._segments = {}
+        self._segment_count = 0
+        self._index_entries = 0
+        self._mmap = None
+        if os.path.isfile(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as index_file:
+                for line in index_file:
+                    if line.strip():
+                        self._apply_index_entry(json.loads(line))
+        self._data = open(file_path, "ab")
+        self._index = open(self.index_path, "a", encoding="utf-8")
+        self._snapshot_index_if_outdated()
+
+    def _apply_index_entry(self, entry:dict) -> None:
+        key_segments = self._segments.get(entry["key"], ())
+        if entry.get("deleted"):
+            self._segments.pop(entry["key"], None)
+            self._segment_count -= len(key_segments)
+        elif entry.get("reset"):
+            self._segments[entry["key"]] = [(entry["offset"], entry["length"])]
+            self._segment_count += 1 - len(key_segments)
+        else:
+            self._segments.setdefault(entry["key"], []).append((entry["offset"], entry["length"]))
+            self._segment_count += 1
+        self._index_entries += 1
+
+    def _write_index_entry(self, entry:dict) -> None:
+        self._index.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._index.flush()
+        self._apply_index_entry(entry)
+        self._snapshot_index_if_outdated()
+
+    def _snapshot_index_if_outdated(self) -> None:
+        """
+        Rewrites the index file with only the current segments, once most of its entries are replaced or deleted ones.
+        """
+        if self._index_entries <= max(1024, 2 * self._segment_count):
+            return
+        temp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as index_file:
+            for key, key_segments in self._segments.items():
+                for position, (offset, length) in enumerate(key_segments):
+                    index_file.write(json.dumps({"key": key, "offset": offset, "length": length, "reset": position == 0}, ensure_ascii=False) + "\n")
+        self._index.close()
+        os.replace(temp_path, self.index_path)
+        self._index = open(self.index_path, "a", encoding="utf-8")
+        self._index_entries = self._segment_count
+
+    def _write(self, key:str, data:bytes, reset:bool) -> None:
+        """
+        Appends data to the data file as a segment of the conversation and records it in the index.
+        A conversation with max_segments segments is copied into a single new segment together with the data.
+        """
+        if not reset and len(self._segments[key]) >= self.max_segments:
+            mapped = self._map()
+            data = b"".join(mapped[offset:offset + length] for offset, length in self._segments[key]) + data
+            reset = True
+        offset = self._data.seek(0, os.SEEK_END)
+        self._data.write(data)
+        self._data.flush()
+        self._write_index_entry({"key": key, "offset": offset, "length": len(data), "reset": reset})
+
+    def _map(self) -> mmap.mmap:
+        """
+        Returns the memory map of the data file, mapping it again if it grew.
+        """
+        size = os.path.getsize(self.file_path)
+        if self._mmap is None or len(self._mmap) < size:
+            if self._mmap is not None:
+                self._mmap.close()
+            with open(self.file_path, "rb") as data_file:
+                self._mmap = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def save(self, key:str, messages:AIMessages) -> None:
+        """
+        Saves the whole conversation, replacing its previous records.
+
+        Parameters:
+            key (str): The key of the conversation.
+            messages (AIMessages): The messages of the conversation.
+        """
+        data = "".join(messages._jsonl_lines()).encode("utf-8")
+        with self._lock:
+            self._write(key, data, reset=True)
+
+    def append(self, key:str, messages:AIMessages, message_ids:Optional[list] = None) -> None:
+        """
+        Appends the current state of messages to the stored conversation, see `AIMessages.append_jsonl()`.
+        The conversation is saved whole if it's not stored yet or the system message is among the messages.
+
+        Parameters:
+            key (str): The key of the conversation.
+            messages (AIMessages): The messages of the conversation.
+            message_ids (list[int]): Optional ids of the added, edited or removed messages. Defaults to the last message.
+        """
+        if message_ids is None:
+            message_ids = messages.message_ids()[-1:]
+        with self._lock:
+            if key not in self._segments or 0 in message_ids:
+                self.save(key, messages)
+                return
+            data = "".join(messages._jsonl_appended_lines(message_ids))
+            self._write(key, data.encode("utf-8"), reset=False)
+
+    def load(self, key:str, last_k:Optional[int] = None) -> AIMessages:
+        """
+        Loads the conversation, keeping the message ids.
+
+        Parameters:
+            key (str): The key of the conversation.
+            last_k (int): Optional number of the most recent messages to load, see `AIMessages.from_jsonl()`.
+                Only the segments of the conversation are read, from the last one, until the last_k messages are found.
+                The system message is always loaded.
+
+        Returns:
+            AIMessages: The messages of the conversation.
+
+        Raises:
+            KeyError: If the conversation isn't stored.
+            ValueError: If last_k is less than 1.
+        """
+        with self._lock:
+            segments = list(self._segments[key])
+            data = self._map()
+            header_end = data.find(b"\n", segments[0][0]) + 1
+            header = json.loads(data[segments[0][0]:header_end])
+            segments[0] = (header_end, segments[0][0] + segments[0][1] - header_end)
+            lines = (line for offset, length in reversed(segments) for line in AIMessages._lines_reversed(data, offset, offset + length))
+            records, highest_id = AIMessages._latest_jsonl_records(lines, last_k)
+        return AIMessages._from_jsonl_records(header, records, highest_id, last_k)
+
+    def view(self, key:str) -> ConversationView:
+        """
+        Returns a view of the conversation, reading no messages until requested.
+
+        Raises:
+            KeyError: If the conversation isn't stored.
+        """
+        if key not in self._segments:
+            raise KeyError(key)
+        return ConversationView(self, key)
+
+    def delete(self, key:str) -> None:
+        """
+        Removes the conversation from the index, its records are removed from the file by compact().
+
+        Raises:
+            KeyError: If the conversation isn't stored.
+        """
+        with self._lock:
+            if key not in self._segments:
+                raise KeyError(key)
+            self._write_index_entry({"key": key, "deleted": True})
+
+    def keys(self) -> list:
+        """
+        Returns the keys of the stored conversations.
+        """
+        return list(self._segments)
+
+    def size_bytes(self, key:Optional[str] = None) -> int:
+        """
+        Returns the size of the records of the conversation, or of all conversations if no key is given.
+        """
+        with self._lock:
+            keys = self._segments if key is None else [key]
+            return sum(length for key in keys for _, length in self._segments[key])
+
+    def compact(self) -> None:
+        """
+        Rewrites the data and index files with only the current records of each conversation, reclaiming the space of replaced and deleted ones.
+        """
+        with self._lock:
+            data = self._map() if self._segments else b""
+            temp_path = f"{self.file_path}.{os.getpid()}.tmp"
+            segments = {}
+            with open(temp_path, "wb") as data_file, open(temp_path + ".index", "w", encoding="utf-8") as index_file:
+                for key, key_segments in self._segments.items():
+                    offset = data_file.tell()
+                    for segment_offset, length in key_segments:
+                        data_file.write(data[segment_offset:segment_offset + length])
+                    length = data_file.tell() - offset
+                    index_file.write(json.dumps({"key": key, "offset": offset, "length": length, "reset": True}, ensure_ascii=False) + "\n")
+                    segments[key] = [(offset, length)]
+            self._close_files()
+            os.replace(temp_path, self.file_path)
+            os.replace(temp_path + ".index", self.index_path)
+            self._segments = segments
+            self._segment_count = self._index_entries = len(segments)
+            self._data = open(self.file_path, "ab")
+            self._index = open(self.index_path, "a", encoding="utf-8")
+
+    def _close_files(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._data.close()
+        self._index.close()
+
+    def close(self) -> None:
+        """
+        Closes the store files.
+        """
+        with self._lock:
+            self._close_files()
+
+    def __contains__(self, key:str) -> bool:
+        return key in self._segments
+
+    def __len__(self) -> int:
+        return len(self._segments)
+
+    def __enter__(self) -> "ConversationStore":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -1,7 +1,61 @@
 
-from typing import Optional, Union, Any
+import heapq
+import json
+import mmap
+import os
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from itertools import chain
+from typing import Callable, Hashable, Optional, Union, Any
 from util_helper.file_handler import save_json_file, load_json_file
 
+class TokenCounter:
+    """
+    Counts tokens in text with a model tokenizer, remembering the counts of recently counted texts.
+
+    Attributes:
+        count_tokens (Callable[[str], int]): Function counting tokens in text, i.e. `LlamaAI.count_tokens`.
+        key (Hashable): Identifies the tokenizer, messages cache their token counts under it.
+        cache_size (int): Max number of texts to remember counts for.
+
+    Args:
+        count_tokens (Callable[[str], int]): Function counting tokens in text.
+        key (Hashable): Identifies the tokenizer, i.e. the model gguf path. Defaults to count_tokens.
+        cache_size (int): Max number of texts to remember counts for, 0 disables it.
+    """
+
+    def __init__(self, count_tokens:Callable[[str], int], key:Optional[Hashable]=None, cache_size:int=1024):
+        self.count_tokens = count_tokens
+        self.key = key if key is not None else count_tokens
+        self.cache_size = cache_size
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, text:str) -> int:
+        with self._lock:
+            count = self._counts.get(text)
+            if count is not None:
+                self._counts.move_to_end(text)
+                return count
+        count = self.count_tokens(text)
+        if self.cache_size > 0:
+            with self._lock:
+                self._counts[text] = count
+                if len(self._counts) > self.cache_size:
+                    self._counts.popitem(last=False)
+        return count
+
+    @staticmethod
+    def wrap(counter:Union["TokenCounter", Callable[[str], int]]) -> "TokenCounter":
+        """
+        Returns the counter if it's a TokenCounter, otherwise wraps the function counting tokens without a text cache.
+        """
+        if isinstance(counter, TokenCounter):
+            return counter
+        return TokenCounter(counter, cache_size=0)
+
+
 class AIMessage:
     """
     Represents a message in an AI system.
@@ -11,11 +65,16 @@ class AIMessage:
         tag_open (str): The opening tag for the message.
         tag_close (str): The closing tag for the message.
     """
+    __slots__ = ("content", "tag_open", "tag_close", "_token_counts", "_version")
+    # number of edits of all messages, collections skip looking for edited messages while it's unchanged
+    _edits = 0
 
     def __init__(self, content:str, tag_open:str, tag_close:str):
         self.content = content
         self.tag_open = tag_open
         self.tag_close = tag_close
+        self._token_counts = {}
+        self._version = 0
 
     def __str__(self) -> str:
         return f"{self.tag_open}{self.content}{self.tag_close}"
@@ -35,6 +94,9 @@ class AIMessage:
             self.tag_open = new_tag_open
         if new_tag_close is not None:
             self.tag_close = new_tag_close
+        self._token_counts = {}
+        self._version += 1
+        AIMessage._edits += 1
     
     def text(self):
         """
@@ -45,6 +107,24 @@ class AIMessage:
         """
         return self.__str__()
     
+    def count_tokens(self, counter:Union[TokenCounter, Callable[[str], int]]) -> int:
+        """
+        Returns the number of tokens in the text representation of the message.
+        The count is cached per tokenizer until the message is edited.
+
+        Args:
+            counter (TokenCounter|Callable[[str], int]): The token counter of the model, or a function counting tokens in text.
+
+        Returns:
+            int: The number of tokens in the message.
+        """
+        counter = TokenCounter.wrap(counter)
+        count = self._token_counts.get(counter.key)
+        if count is None:
+            count = counter(self.text())
+            self._token_counts[counter.key] = count
+        return count
+
     def get_tags(self) -> tuple:
         """
         Returns the tags of the message.
@@ -92,9 +172,14 @@ class AIMessages:
         ai_tag_close (str): The closing tag for AI messages.
         system_tag_open (str): The opening tag for system messages.
         system_tag_close (str): The closing tag for system messages.
-        messages (dict): The messages in the collection: {id: AIMessage}.
+        messages (dict): The messages in the collection: {id: AIMessage}, a read only view built on access, use message_list() to iterate.
         _message_id_generator (int): The id generator for the messages.
 
+    Messages are stored in a list with their ids, the system message has its own slot with id 0.
+    Ids are stable, setting the system message or removing messages doesn't change the ids of the other messages.
+    The rendered text and the token totals are cached and updated incrementally, adding a message or editing the last one
+    only renders and counts that message. Messages edited with AIMessage.edit() are detected and rendered and counted again.
+
     Args:
         messages (Union[AIMessages, AIMessage, str, list]): The messages to add to the collection.
         user_tags (tuple): The tags to use for user messages.
@@ -102,6 +187,10 @@ class AIMessages:
         system_tags (tuple): The tags to use for system messages.
     """
 
+    __slots__ = ("user_tag_open", "user_tag_close", "ai_tag_open", "ai_tag_close", "system_tag_open", "system_tag_close",
+                 "_system_message", "_ids", "_messages", "_message_id_generator",
+                 "_text", "_offsets", "_versions", "_token_totals")
+
     def __init__(self,user_tags:Union[tuple[str], list[str], dict]=("[INST]", "[/INST]"), ai_tags:Union[tuple[str], list[str], dict]=("", ""), system_tags:Optional[Union[tuple[str], list[str], dict]]=None):
         if isinstance(user_tags, dict):
             if "open" in user_tags and "close" in user_tags:
@@ -142,9 +231,136 @@ class AIMessages:
         else:
             self.system_tag_open = None
             self.system_tag_close = None
-        self.messages = {}
+        self._system_message = None
+        self._ids = []
+        self._messages = []
         self._message_id_generator = 0
-    
+        self._text = ""
+        self._offsets = []
+        self._versions = []
+        self._token_totals = {}
+
+    @property
+    def messages(self) -> dict:
+        """
+        The messages in the collection: {id: AIMessage}, system message first. Changing the returned dict doesn't change the collection.
+        """
+        messages = {} if self._system_message is None else {0: self._system_message}
+        messages.update(zip(self._ids, self._messages))
+        return messages
+
+    @messages.setter
+    def messages(self, messages:Union[dict, list]) -> None:
+        self.reset_messages()
+        self.load_messages(list(messages.values()) if isinstance(messages, dict) else messages)
+
+    def message_list(self) -> list:
+        """
+        Returns the messages in order, system message first.
+
+        Returns:
+            list[AIMessage]: The messages.
+        """
+        return self._messages.copy() if self._system_message is None else [self._system_message] + self._messages
+
+    def message_ids(self) -> list:
+        """
+        Returns the ids of the messages in order, 0 for the system message.
+
+        Returns:
+            list[int]: The message ids.
+        """
+        return self._ids.copy() if self._system_message is None else [0] + self._ids
+
+    def __len__(self) -> int:
+        return len(self._messages) + (self._system_message is not None)
+
+    def _index(self, message_id:int) -> int:
+        """
+        Returns the list index of the message with the id.
+
+        Raises:
+            KeyError: If there's no message with the id.
+        """
+        index = bisect_left(self._ids, message_id)
+        if index == len(self._ids) or self._ids[index] != message_id:
+            raise KeyError(message_id)
+        return index
+
+    def get_message(self, message_id:int) -> AIMessage:
+        """
+        Returns the message with the id.
+
+        Parameters:
+            message_id (int): The id of the message, 0 for the system message.
+
+        Returns:
+            AIMessage: The message.
+
+        Raises:
+            KeyError: If there's no message with the id.
+        """
+        if message_id == 0 and self._system_message is not None:
+            return self._system_message
+        return self._messages[self._index(message_id)]
+
+    def _position(self, message_id:int) -> int:
+        """
+        Returns the position of the message with the id in message_list().
+        """
+        if message_id == 0 and self._system_message is not None:
+            return 0
+        return self._index(message_id) + (self._system_message is not None)
+
+    def _invalidate(self, position:int = 0) -> None:
+        """
+        Drops the cached rendered text and token counts from the message at the position onwards.
+        """
+        if position < len(self._offsets):
+            self._text = self._text[:self._offsets[position]]
+            del self._offsets[position:]
+            del self._versions[position:]
+        for totals in self._token_totals.values():
+            if position < len(totals["counts"]):
+                totals["total"] -= sum(totals["counts"][position:])
+                del totals["counts"][position:]
+                del totals["versions"][position:]
+
+    def _render(self) -> None:
+        """
+        Updates the cached rendered text, rendering only messages added or edited since the last update.
+        """
+        messages = self.message_list()
+        for position, version in enumerate(self._versions):
+            if messages[position]._version != version:
+                self._invalidate(position)
+                break
+        rendered = [self._text]
+        offset = len(self._text)
+        for message in messages[len(self._offsets):]:
+            text = message.text()
+            self._offsets.append(offset)
+            self._versions.append(message._version)
+            rendered.append(text)
+            offset += len(text)
+        self._text = "".join(rendered)
+
+    def message_offsets(self) -> list:
+        """
+        Returns the character offsets of the messages in the rendered text, in the order of message_list().
+
+        Returns:
+            list[tuple[int, int]]: The start and end offset of each message.
+        """
+        self._render()
+        return list(zip(self._offsets, self._offsets[1:] + [len(self._text)]))
+
+    def _find_message(self, message_id:int) -> Optional[AIMessage]:
+        try:
+            return self.get_message(message_id)
+        except KeyError:
+            return None
+
     def user_tags(self) -> tuple[str]:
         """
         Returns the user tags.
@@ -176,24 +392,37 @@ class AIMessages:
             return None
     
     def load_messages(self, messages:Union[Any, AIMessage, str, list[Union[dict, AIMessage]]]) -> None:
+        """
+        Adds the messages to the collection.
+        A first message tagged with the system tags becomes the system message.
+
+        Parameters:
+            messages (AIMessages|AIMessage|str|list[AIMessage|str|dict]): The messages, strings are added as user messages.
+        """
         if messages is not None:
             if isinstance(messages, AIMessages):
-                self.messages = messages.messages
+                messages = messages.message_list()
             elif isinstance(messages, AIMessage):
-                self.messages = [messages]
+                messages = [messages]
             elif isinstance(messages, str):
-                self.messages = [AIMessage(messages, self.user_tag_open, self.user_tag_close)]
+                messages = [AIMessage(messages, self.user_tag_open, self.user_tag_close)]
             elif isinstance(messages, list):
                 if all([isinstance(message, AIMessage) for message in messages]):
-                    self.messages = messages
+                    pass
                 elif all(isinstance(message, str) for message in messages):
-                    self.messages = [AIMessage(message, tag_open=self.user_tag_open, tag_close=self.user_tag_close) for message in messages]
+                    messages = [AIMessage(message, tag_open=self.user_tag_open, tag_close=self.user_tag_close) for message in messages]
                 elif all(isinstance(message, dict) for message in messages):
-                    self.messages = [AIMessage.from_dict(message_dict) for message_dict in messages]
+                    messages = [AIMessage.from_dict(message_dict) for message_dict in messages]
                 else:
                     raise TypeError("If passing list as messages it must be a list of AIMessage or str")
             else:
                 raise TypeError("messages must be a list of AIMessage or str")
+            for position, message in enumerate(messages):
+                if position == 0 and self._system_message is None and self.is_system_message(message):
+                    self._invalidate(0)
+                    self._system_message = message
+                else:
+                    self.add_message(message, None, None)
     
     def to_dict(self) -> dict:
         """
@@ -209,7 +438,7 @@ class AIMessages:
             "ai_tag_close": self.ai_tag_close,
             "system_tag_open": self.system_tag_open,
             "system_tag_close": self.system_tag_close,
-            "messages": [message.to_dict() for message in self.messages]
+            "messages": [message.to_dict() for message in self.message_list()]
         }
     
     @staticmethod
@@ -247,7 +476,7 @@ class AIMessages:
     
     def add_message(self, message:Union[str, AIMessage], tag_open:str, tag_close:str) -> AIMessage:
         """
-        Adds a new message to the messages dictionary.
+        Adds a new message to the end of the messages.
         Iters the message ID generator.
 
         Parameters:
@@ -260,30 +489,10 @@ class AIMessages:
         """
         if isinstance(message, str):
             message = AIMessage(message, tag_open, tag_close)
-        self.messages[self._generate_message_id()] = message
-        return self.messages[self._message_id_generator]
-
-    def _insert_message(self, message:AIMessage, message_id:int) -> AIMessage:
-        """
-        Inserts a new message to the messages dictionary.
-        Iters the message ID generator.
-
-        Parameters:
-        - message (AIMessage): The message object
-        - message_id (int): The id to insert the message at
-
-        Returns:
-        AIMessage
-        """
-        self._message_id_generator += 1 if len(self.messages) > 0 else 0
-        updated_messages = {}
-        for id, msg in self.messages.items():
-            if id < message_id:
-                updated_messages[id] = msg
-            else:
-                updated_messages[id+1] = msg
-        updated_messages[message_id] = message
-        self.messages = updated_messages
+        message_id = self._generate_message_id()
+        self._ids.append(message_id)
+        self._messages.append(message)
+        return message
 
     def add_user_message(self, message: Union[str, AIMessage]) -> AIMessage:
         """
@@ -315,9 +524,8 @@ class AIMessages:
     
     def set_system_message(self, message:Union[str, AIMessage]) -> AIMessage:
         """
-        Adds a system message to the message list.
-        Uses add_message() with the system tags.
-        Automatically iters the message ID generator.
+        Sets the system message at the start of the message list, replacing the current one.
+        The system message has id 0, the ids of the other messages don't change.
 
         Parameters:
             message (str): The message to be added.
@@ -330,14 +538,20 @@ class AIMessages:
         else:
             if isinstance(message, str):
                 message = AIMessage(message, self.system_tag_open, self.system_tag_close)    
-            return self._insert_message(message, 0)
+            self._invalidate(0)
+            self._system_message = message
+            return message
 
     def reset_messages(self) -> None:
-        self.messages = {}
+        self._system_message = None
+        self._ids = []
+        self._messages = []
         self._message_id_generator = 0
+        self._invalidate(0)
 
     def __str__(self) -> str:
-        return "".join([str(message) for message in self.messages.values()])
+        self._render()
+        return self._text
 
     def __repr__(self) -> str:
         return self.__str__()
@@ -352,7 +566,7 @@ class AIMessages:
         Returns:
             AIMessage: The last message in the collection.
         """
-        return self.messages[self._message_id_generator]
+        return self._messages[-1] if self._messages else self._system_message
     
     def edit_last_message(self, new_content:str, tag_open:str=None, tag_close:str=None) -> None:
         """
@@ -366,7 +580,7 @@ class AIMessages:
         Returns:
             None
         """
-        self.get_last_message().edit(new_content, tag_open, tag_close)
+        self.edit_message(self._ids[-1] if self._ids else 0, new_content, tag_open, tag_close)
     
     def edit_message(self, message_id:int, new_content:str, tag_open:str=None, tag_close:str=None) -> None:
         """
@@ -381,18 +595,158 @@ class AIMessages:
         Returns:
             None
         """
-        self.messages[message_id].edit(new_content, tag_open, tag_close)
+        message = self.get_message(message_id)
+        self._invalidate(self._position(message_id))
+        message.edit(new_content, tag_open, tag_close)
 
     def edit_system_message(self, new_content:str) -> None:
         if self.system_tags() is None:
             raise ValueError("System tags are not set, this model does not support system messages.")
         else:
-            if self.messages[0].tag_open == self.system_tag_open and self.messages[0].tag_close == self.system_tag_close:
+            if self._system_message is not None:
                 self.edit_message(0, new_content)
             else:
                 print("Warning: System message not found, adding system message to the start of the message list.")
                 self.set_system_message(new_content)
 
+    def remove_message(self, message_id:int) -> AIMessage:
+        """
+        Removes a message from the collection, the ids of the other messages stay the same.
+
+        Parameters:
+            message_id (int): The id of the message to remove.
+
+        Returns:
+            AIMessage: The removed message.
+        """
+        message = self.get_message(message_id)
+        self._invalidate(self._position(message_id))
+        if message_id == 0 and message is self._system_message:
+            self._system_message = None
+            return message
+        index = self._index(message_id)
+        del self._ids[index]
+        return self._messages.pop(index)
+
+    def is_system_message(self, message:AIMessage) -> bool:
+        """
+        Returns whether the message is tagged as a system message.
+        """
+        return self.has_system_tags() and message.tag_open == self.system_tag_open and message.tag_close == self.system_tag_close
+
+    def count_message_tokens(self, message_id:int, counter:Union[TokenCounter, Callable[[str], int]]) -> int:
+        """
+        Returns the number of tokens in a message counted on its own, with the start of text token, cached until the message is edited.
+
+        Parameters:
+            message_id (int): The id of the message.
+            counter (TokenCounter|Callable[[str], int]): The token counter of the model, or a function counting tokens in text, i.e. `LlamaAI.count_tokens`.
+
+        Returns:
+            int: The number of tokens in the message.
+        """
+        return self.get_message(message_id).count_tokens(counter)
+
+    def count_tokens(self, counter:Union[TokenCounter, Callable[[str], int]]) -> int:
+        """
+        Returns the number of tokens in all messages.
+
+        The total is kept per tokenizer and only corrected for messages added, removed or edited since the last count,
+        edits with AIMessage.edit() included. Each message caches its own count too, so only new or edited messages
+        are tokenized. The tokenizer adds the start of text token to every counted message,
+        the total includes it once, like the rendered text tokenized at once. Tokens merging across message boundaries
+        may still make the total slightly differ from the count of the rendered text.
+
+        Parameters:
+            counter (TokenCounter|Callable[[str], int]): The token counter of the model, or a function counting tokens in text, i.e. `LlamaAI.count_tokens`.
+
+        Returns:
+            int: The number of tokens in the collection.
+        """
+        counter = TokenCounter.wrap(counter)
+        totals = self._token_totals.get(counter.key)
+        if totals is None:
+            if len(self._token_totals) >= 8:
+                # counters wrapping new functions have new keys, keep the totals of the latest ones
+                del self._token_totals[next(iter(self._token_totals))]
+            totals = self._token_totals[counter.key] = {"total": 0, "counts": [], "versions": [], "edits": None}
+        system = [] if self._system_message is None else [self._system_message]
+        counts, versions = totals["counts"], totals["versions"]
+        if totals["edits"] != AIMessage._edits:
+            totals["edits"] = AIMessage._edits
+            for position, (message, version) in enumerate(zip(chain(system, self._messages), versions)):
+                if message._version != version:
+                    count = message.count_tokens(counter)
+                    totals["total"] += count - counts[position]
+                    counts[position] = count
+                    versions[position] = message._version
+        added = system + self._messages if len(counts) < len(system) else self._messages[len(counts) - len(system):]
+        for message in added:
+            count = message.count_tokens(counter)
+            totals["total"] += count
+            counts.append(count)
+            versions.append(message._version)
+        return totals["total"] - (len(counts) - 1) * counter("")
+
+    def fit_to_token_budget(self,
+                            max_total_tokens:int,
+                            counter:Union[TokenCounter, Callable[[str], int]],
+                            reserve_tokens:int = 0,
+                            summarize:Optional[Callable[[list], str]] = None) -> list:
+        """
+        Drops the oldest messages until the messages and the reserved generation budget fit in max_total_tokens.
+        The system message and the last message are always kept.
+
+        If summarize is provided, the dropped messages are replaced with a single user message containing
+        the text it returns, placed where the oldest dropped message was. If the summary doesn't fit, more messages
+        are dropped and summarized again.
+
+        Parameters:
+            max_total_tokens (int): Max tokens the model can process, input and generation (`max_total_tokens` of `load_ai`).
+            counter (TokenCounter|Callable[[str], int]): The token counter of the model, or a function counting tokens in text, i.e. `LlamaAI.count_tokens`.
+            reserve_tokens (int): Number of tokens to leave for generation.
+            summarize (Callable[[list[AIMessage]], str]): Optional function summarizing the dropped messages.
+
+        Returns:
+            list[AIMessage]: The dropped messages, oldest first, empty if everything fits.
+
+        Raises:
+            ValueError: If the messages don't fit even after dropping all but the system and last message.
+        """
+        counter = TokenCounter.wrap(counter)
+        budget = max_total_tokens - reserve_tokens
+        total = self.count_tokens(counter)
+        # message counts include the start of text token, which stays in the total
+        start_tokens = counter("")
+        if total <= budget:
+            return []
+        droppable = [message_id for message_id, message in zip(self._ids, self._messages) if not self.is_system_message(message)][:-1]
+        drop_ids = []
+        summary = None
+        summary_tokens = 0
+        while total + summary_tokens > budget:
+            if len(drop_ids) == len(droppable):
+                if total <= budget:
+                    # the summary alone doesn't fit, drop without it
+                    summary = None
+                    break
+                raise ValueError(f"Messages don't fit in {max_total_tokens} max total tokens with {reserve_tokens} tokens reserved for generation.")
+            message_id = droppable[len(drop_ids)]
+            drop_ids.append(message_id)
+            total -= self.count_message_tokens(message_id, counter) - start_tokens
+            if summarize is not None and total <= budget:
+                summary = AIMessage(summarize([self.get_message(message_id) for message_id in drop_ids]), self.user_tag_open, self.user_tag_close)
+                summary_tokens = summary.count_tokens(counter) - start_tokens
+        dropped = [self.get_message(message_id) for message_id in drop_ids]
+        if summary is not None:
+            # the summary takes the place of the oldest dropped message
+            self._invalidate(self._position(drop_ids[0]))
+            self._messages[self._index(drop_ids[0])] = summary
+            drop_ids = drop_ids[1:]
+        for message_id in drop_ids:
+            self.remove_message(message_id)
+        return dropped
+
     def has_system_tags(self) -> bool:
         """
         Returns whether the model supports system messages.
@@ -427,6 +781,164 @@ class AIMessages:
         """
         return AIMessages.from_dict(load_json_file(file_path))
     
+    def _jsonl_header(self) -> dict:
+        return {
+            "format": "glai.messages",
+            "version": 1,
+            "user_tag_open": self.user_tag_open,
+            "user_tag_close": self.user_tag_close,
+            "ai_tag_open": self.ai_tag_open,
+            "ai_tag_close": self.ai_tag_close,
+            "system_tag_open": self.system_tag_open,
+            "system_tag_close": self.system_tag_close,
+            "system_message": None if self._system_message is None else self._system_message.to_dict(),
+        }
+
+    @staticmethod
+    def _jsonl_record(message_id:int, message:Optional[AIMessage], max_id:int) -> str:
+        """
+        Returns the JSON line of a message, None for a removed message.
+        max_id is the highest message id of this and all earlier lines of the file, it lets from_jsonl() stop reading early.
+        """
+        record = {"id": message_id, "removed": True} if message is None else {"id": message_id, **message.to_dict()}
+        record["max_id"] = max_id
+        return json.dumps(record, ensure_ascii=False) + "\n"
+
+    def _jsonl_lines(self) -> list:
+        """
+        Returns the JSON lines of a full save, the header followed by the messages in order of their ids.
+        """
+        lines = [json.dumps(self._jsonl_header(), ensure_ascii=False) + "\n"]
+        max_id = 0
+        for message_id, message in zip(self._ids, self._messages):
+            max_id = max(max_id, message_id)
+            lines.append(self._jsonl_record(message_id, message, max_id))
+        return lines
+
+    def _jsonl_appended_lines(self, message_ids:list) -> list:
+        """
+        Returns the JSON lines appending the current state of the messages, see append_jsonl().
+        """
+        max_id = max([self._message_id_generator, *message_ids])
+        return [self._jsonl_record(message_id, self._find_message(message_id), max_id) for message_id in message_ids]
+
+    def save_jsonl(self, file_path:str) -> None:
+        """
+        Saves the messages as a JSON lines file, a header line with the tags and the system message, followed by a line per message.
+        The file can be updated with append_jsonl() without rewriting it.
+
+        Parameters:
+            file_path (str): The path to save the file to.
+
+        Returns:
+            None
+        """
+        temp_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.writelines(self._jsonl_lines())
+        os.replace(temp_path, file_path)
+
+    def append_jsonl(self, file_path:str, message_ids:Optional[list] = None) -> None:
+        """
+        Appends the current state of messages to a JSON lines file saved with save_jsonl(), without rewriting it.
+        Appended messages replace earlier lines of the same message when loading, removed messages are appended as removed.
+        The file is saved again if it doesn't exist or the system message is among the messages, as it's stored in the header.
+
+        Parameters:
+            file_path (str): The path of the file.
+            message_ids (list[int]): Optional ids of the added, edited or removed messages. Defaults to the last message.
+
+        Returns:
+            None
+        """
+        if message_ids is None:
+            message_ids = self.message_ids()[-1:]
+        if not os.path.isfile(file_path) or 0 in message_ids:
+            self.save_jsonl(file_path)
+            return
+        with open(file_path, "a", encoding="utf-8") as file:
+            file.writelines(self._jsonl_appended_lines(message_ids))
+
+    @staticmethod
+    def _lines_reversed(data, start:int, end:int):
+        """
+        Yields the lines of data (bytes or a memory map) between the start and end offsets, last line first.
+        """
+        while end > start:
+            line_start = max(data.rfind(b"\n", start, end - 1) + 1, start)
+            line = data[line_start:end]
+            if line.strip():
+                yield line
+            end = line_start
+
+    @staticmethod
+    def _latest_jsonl_records(lines_reversed, last_k:Optional[int] = None) -> tuple:
+        """
+        Returns the latest record of each message id and the highest message id, from JSON lines given last line first.
+
+        With last_k, reading stops once the last_k highest ids that weren't removed are known: the max_id of a line
+        bounds the ids of all earlier lines, so no unread message can be newer than them.
+        Lines written without max_id don't allow stopping early, so all of them are read.
+        """
+        if last_k is not None and last_k < 1:
+            raise ValueError(f"last_k must be at least 1, got {last_k}.")
+        records = {}
+        newest_live = []
+        highest_id = 0
+        for line in lines_reversed:
+            record = json.loads(line)
+            max_id = record.get("max_id")
+            highest_id = max(highest_id, record["id"], max_id or 0)
+            if record["id"] not in records:
+                records[record["id"]] = record
+                if last_k is not None and not record.get("removed", False):
+                    heapq.heappush(newest_live, record["id"])
+                    if len(newest_live) > last_k:
+                        heapq.heappop(newest_live)
+            if last_k is not None and max_id is not None and len(newest_live) == last_k and newest_live[0] >= max_id:
+                break
+        return records, highest_id
+
+    @staticmethod
+    def _from_jsonl_records(header:dict, records:dict, highest_id:int, last_k:Optional[int] = None) -> "AIMessages":
+        """
+        Creates a new AIMessages from a JSON lines header and the latest record of each message id,
+        keeping only the last_k messages with the highest ids that weren't removed, if given.
+        """
+        ai_msgs = AIMessages.from_dict({**header, "messages": []})
+        if header.get("system_message") is not None:
+            ai_msgs._system_message = AIMessage.from_dict(header["system_message"])
+        message_ids = sorted(message_id for message_id, record in records.items() if not record.get("removed", False))
+        if last_k is not None:
+            message_ids = message_ids[-last_k:]
+        for message_id in message_ids:
+            ai_msgs._ids.append(message_id)
+            ai_msgs._messages.append(AIMessage.from_dict(records[message_id]))
+        ai_msgs._message_id_generator = highest_id
+        return ai_msgs
+
+    @staticmethod
+    def from_jsonl(file_path:str, last_k:Optional[int] = None) -> "AIMessages":
+        """
+        Creates a new AIMessages from a JSON lines file saved with save_jsonl() and append_jsonl(), keeping the message ids.
+
+        Parameters:
+            file_path (str): The path of the file.
+            last_k (int): Optional number of the most recent messages to load. The file is read from the end,
+                only until the newest records of the last_k messages are found. The system message is always loaded.
+
+        Returns:
+            AIMessages: The created AIMessages.
+
+        Raises:
+            ValueError: If last_k is less than 1.
+        """
+        with open(file_path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            header_end = data.find(b"\n") + 1 or len(data)
+            header = json.loads(data[:header_end])
+            records, highest_id = AIMessages._latest_jsonl_records(AIMessages._lines_reversed(data, header_end, len(data)), last_k)
+        return AIMessages._from_jsonl_records(header, records, highest_id, last_k)
+    
     @staticmethod
     def create_single_message(message:str, tag_open:str="", tag_close:str="") ->AIMessage:
         """
@@ -10,7 +10,8 @@ setup(
         'requests>=2.31.0',
         'beautifulsoup4>=4.9.3',
         'gguf_llama>=0.0.18',
-        'gguf_modeldb>=0.0.3'
+        'gguf_modeldb>=0.0.3',
+        'numpy>=1.20.0'
     ],
     include_package_data=True,
     author="Łael Al-Halawani",
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import time
+import pytest
+
+pytest.importorskip("gguf_llama")
+from glai.ai.async_ai import AsyncEasyAI
+
+class FakeAI:
+    """
+    Stand-in for EasyAI generating one token every 20 ms, for up to 5 seconds.
+    """
+    def __init__(self):
+        self.tokens = 0
+        self.stopped = threading.Event()
+
+    def generate_stream(self, user_message):
+        try:
+            for _ in range(250):
+                time.sleep(0.02)
+                self.tokens += 1
+                yield "token "
+        finally:
+            self.stopped.set()
+
+    def generate(self, user_message, cancel=None):
+        for _ in range(250):
+            if cancel is not None and cancel.is_set():
+                break
+            time.sleep(0.02)
+            self.tokens += 1
+        self.stopped.set()
+        return user_message
+
+    def count_tokens(self, user_message):
+        return len(user_message.split())
+
+def test_cancelling_stream_stops_generation():
+    fake = FakeAI()
+    async def consume(ai):
+        async for _ in ai.generate_stream("Hello"):
+            pass
+    async def main():
+        ai = AsyncEasyAI(fake)
+        task = asyncio.create_task(consume(ai))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        ai.close()
+    asyncio.run(main())
+    assert fake.stopped.wait(1)
+    assert fake.tokens < 50
+
+def test_cancelling_generate_stops_generation():
+    fake = FakeAI()
+    async def main():
+        ai = AsyncEasyAI(fake)
+        task = asyncio.create_task(ai.generate("Hello"))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        ai.close()
+    asyncio.run(main())
+    assert fake.stopped.wait(1)
+    assert fake.tokens < 50
+
+def test_count_tokens_while_generating():
+    fake = FakeAI()
+    async def main():
+        ai = AsyncEasyAI(fake)
+        generation = asyncio.create_task(ai.generate("Hello"))
+        await asyncio.sleep(0.1)
+        count = await asyncio.wait_for(ai.count_tokens("How many tokens"), timeout=1)
+        assert not generation.done()
+        generation.cancel()
+        ai.close()
+        return count
+    assert asyncio.run(main()) == 3
@@ -0,0 +1,78 @@
+import pytest
+
+pytest.importorskip("gguf_llama")
+from glai.ai.chat_session import ChatSession
+from glai.messages import AIMessages, TokenCounter
+
+def count_chars(text):
+    # one start of text token and one token per character, like FakeLlama tokenizes
+    return 1 + len(text)
+
+class FakeLlama:
+    """
+    Stand-in for the llama model, one token per byte, answering every prompt with the reply and the end of sequence token.
+    """
+    def __init__(self, n_ctx=200, reply="Sure.</s>"):
+        self._n_ctx = n_ctx
+        self.reply = reply
+        self.prompts = []
+
+    def n_ctx(self):
+        return self._n_ctx
+
+    def token_eos(self):
+        return -1
+
+    def tokenize(self, text, add_bos=True, special=False):
+        return ([0] if add_bos else []) + list(text)
+
+    def detokenize(self, tokens):
+        return bytes(tokens)
+
+    def generate(self, tokens):
+        self.prompts.append(list(tokens))
+        yield from self.reply.encode("utf-8")
+        yield self.token_eos()
+
+class FakeAI:
+    def __init__(self, llm):
+        self.llm = llm
+
+    def count_tokens(self, text):
+        return count_chars(text)
+
+def make_session(n_ctx=200, reserve_tokens=20):
+    messages = AIMessages(("[INST]", "[/INST]"), ("", "</s>"), ("<<SYS>>", "<</SYS>>"))
+    messages.set_system_message("Be brief.")
+    return ChatSession(FakeAI(FakeLlama(n_ctx)), messages, reserve_tokens=reserve_tokens, token_counter=TokenCounter(count_chars))
+
+def test_fit_to_context_drops_oldest_messages_and_keeps_system_message():
+    session = make_session()
+    for index in range(1, 7):
+        session.messages.add_user_message(f"question {index}")
+        session.messages.add_ai_message(f"answer number {index}")
+    assert session.fit_to_context()
+    assert session.messages.count_tokens(session.token_counter) + 2 * session.reserve_tokens <= 200
+    assert session.messages.message_list()[0].content == "Be brief."
+    assert session.messages.get_last_message().content == "answer number 6"
+    assert session.fit_to_context() == []
+
+def test_fit_to_context_summarizes_dropped_messages():
+    session = make_session()
+    session.summarize = lambda dropped: f"{len(dropped)} messages"
+    for index in range(1, 7):
+        session.messages.add_user_message(f"question {index}")
+        session.messages.add_ai_message(f"answer number {index}")
+    dropped = session.fit_to_context()
+    assert session.messages.message_list()[1].content == f"{len(dropped)} messages"
+    assert session.messages.count_tokens(session.token_counter) + session.reserve_tokens <= 200
+
+def test_second_turn_only_submits_new_messages():
+    session = make_session(n_ctx=512)
+    assert session.send("Hello").content == "Sure."
+    first_prompt = session.ai.llm.prompts[0]
+    assert bytes(first_prompt[1:]).decode("utf-8") == session.messages.text()[:-len("Sure.</s>")]
+    session.send("And again?")
+    second_prompt = session.ai.llm.prompts[1]
+    assert second_prompt[:len(first_prompt)] == first_prompt
+    assert bytes(second_prompt[1:]).decode("utf-8") == session.messages.text()[:-len("Sure.</s>")]
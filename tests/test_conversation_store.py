@@ -0,0 +1,73 @@
+import os
+from glai.messages import AIMessages, ConversationStore
+
+def make_conversation(turns):
+    messages = AIMessages(("[INST]", "[/INST]"), ("", "</s>"), ("<<SYS>>", "<</SYS>>"))
+    messages.set_system_message("Be brief.")
+    for index in range(1, turns + 1):
+        messages.add_user_message(f"question {index}")
+        messages.add_ai_message(f"answer {index}")
+    return messages
+
+def count_lines(file_path):
+    with open(file_path, "r", encoding="utf-8") as file:
+        return sum(1 for _ in file)
+
+def test_reopened_store_restores_conversations(tmp_path):
+    file_path = str(tmp_path / "conversations.jsonl")
+    first, second = make_conversation(2), make_conversation(3)
+    with ConversationStore(file_path) as store:
+        store.save("first", first)
+        store.save("second", second)
+        second.add_user_message("question 4")
+        store.append("second", second)
+        store.save("deleted", make_conversation(1))
+        store.delete("deleted")
+    with ConversationStore(file_path) as store:
+        assert sorted(store.keys()) == ["first", "second"]
+        assert "deleted" not in store
+        assert store.load("first").text() == first.text()
+        assert store.load("second").text() == second.text()
+        assert store.view("second").last_message().content == "question 4"
+
+def test_compact_keeps_only_current_records(tmp_path):
+    file_path = str(tmp_path / "conversations.jsonl")
+    kept = make_conversation(3)
+    with ConversationStore(file_path) as store:
+        store.save("kept", make_conversation(1))
+        store.save("kept", kept)
+        kept.add_user_message("question 4")
+        store.append("kept", kept)
+        store.save("deleted", make_conversation(5))
+        store.delete("deleted")
+        store.compact()
+        assert os.path.getsize(file_path) == store.size_bytes()
+        assert count_lines(store.index_path) == 1
+        assert store.load("kept").text() == kept.text()
+    with ConversationStore(file_path) as store:
+        assert store.keys() == ["kept"]
+        assert store.load("kept", last_k=1).get_last_message().content == "question 4"
+
+def test_appends_are_coalesced_into_one_segment(tmp_path):
+    file_path = str(tmp_path / "conversations.jsonl")
+    messages = make_conversation(1)
+    with ConversationStore(file_path, max_segments=4) as store:
+        store.save("chat", messages)
+        for index in range(2, 12):
+            messages.add_user_message(f"question {index}")
+            store.append("chat", messages)
+            assert len(store._segments["chat"]) <= 4
+        assert store.load("chat").text() == messages.text()
+    with ConversationStore(file_path, max_segments=4) as store:
+        loaded = store.load("chat", last_k=2)
+        assert [message.content for message in loaded.message_list()] == ["Be brief.", "question 10", "question 11"]
+
+def test_index_file_is_rewritten_once_outdated(tmp_path):
+    file_path = str(tmp_path / "conversations.jsonl")
+    with ConversationStore(file_path) as store:
+        for index in range(1500):
+            store.save(f"chat {index % 10}", make_conversation(1))
+        assert count_lines(store.index_path) < 1100
+    with ConversationStore(file_path) as store:
+        assert len(store) == 10
+        assert store.load("chat 9").text() == make_conversation(1).text()
@@ -0,0 +1,87 @@
+import hashlib
+import http.server
+import os
+import re
+import threading
+import pytest
+from gguf_modeldb import ModelData
+from glai.ai import download
+from glai.ai.download import download_file, download_model
+
+DATA = os.urandom((5 << 20) + 123)
+SHA256 = hashlib.sha256(DATA).hexdigest()
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """
+    Stand-in for HuggingFace, serving DATA with range requests and its sha256 as X-Linked-Etag.
+    Range requests from `fail_from` on fail while `failures` is positive.
+    """
+    failures = 0
+    fail_from = 3 << 20
+    requested_ranges = []
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_HEAD(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(DATA)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("X-Linked-Etag", f'"{SHA256}"')
+        self.end_headers()
+
+    def do_GET(self) -> None:
+        start, end = map(int, re.match(r"bytes=(\d+)-(\d+)", self.headers["Range"]).groups())
+        if _Handler.failures > 0 and start >= _Handler.fail_from:
+            _Handler.failures -= 1
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        _Handler.requested_ranges.append(start)
+        body = DATA[start:end + 1]
+        self.send_response(206)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+@pytest.fixture
+def url():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _Handler.failures = 0
+    _Handler.requested_ranges = []
+    yield f"http://127.0.0.1:{server.server_port}/model.gguf"
+    server.shutdown()
+    server.server_close()
+
+def test_resumes_interrupted_download(url, tmp_path):
+    file_path = str(tmp_path / "model.gguf")
+    _Handler.failures = 1000
+    with pytest.raises(Exception):
+        download_file(url, file_path, connections=3, chunk_size=1 << 20)
+    assert not os.path.exists(file_path)
+    assert os.path.exists(file_path + ".part.json")
+
+    _Handler.failures = 0
+    _Handler.requested_ranges = []
+    assert download_file(url, file_path, connections=3, chunk_size=1 << 20) == file_path
+    with open(file_path, "rb") as file:
+        assert file.read() == DATA
+    assert min(_Handler.requested_ranges) >= _Handler.fail_from
+    assert not os.path.exists(file_path + ".part")
+    assert not os.path.exists(file_path + ".part.json")
+
+def test_removes_file_not_matching_sha256(url, tmp_path):
+    file_path = str(tmp_path / "model.gguf")
+    with pytest.raises(Exception, match="sha256"):
+        download_file(url, file_path, chunk_size=1 << 20, sha256="0" * 64)
+    assert not os.path.exists(file_path)
+    assert not os.path.exists(file_path + ".part")
+
+def test_download_model_uses_file_download_url(monkeypatch, tmp_path):
+    downloaded = []
+    monkeypatch.setattr(download, "download_file", lambda url, file_path, connections: downloaded.append(url) or file_path)
+    model_data = ModelData("https://huggingface.co/TheBloke/Mistral-7B-Instruct-v0.1-GGUF/blob/main/mistral-7b-instruct-v0.1.Q2_K.gguf", str(tmp_path))
+    download_model(model_data)
+    assert downloaded == ["https://huggingface.co/TheBloke/Mistral-7B-Instruct-v0.1-GGUF/resolve/main/mistral-7b-instruct-v0.1.Q2_K.gguf?download=true"]
@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+import pytest
+from glai.ai.grammar import regex_to_gbnf
+
+def test_character_classes():
+    assert regex_to_gbnf("[a-c_]+") == "root ::= [a-c_]+\n"
+    assert regex_to_gbnf(r"[^\]x]") == "root ::= [^\\x5Dx]\n"
+    assert regex_to_gbnf(r"\d\S") == "root ::= [0-9] [^ \\t\\n\\r]\n"
+
+def test_alternation_and_groups():
+    assert regex_to_gbnf("cat|dog") == 'root ::= ("c" "a" "t" | "d" "o" "g")\n'
+    assert regex_to_gbnf("^(?:ab)?c$") == 'root ::= ("a" "b")? "c"\n'
+
+def test_counted_repetition():
+    assert regex_to_gbnf(r"\d{2,3}") == "root ::= ([0-9] [0-9] [0-9]?)\n"
+    assert regex_to_gbnf("a{2}") == 'root ::= ("a" "a")\n'
+    assert regex_to_gbnf("a{1,}") == 'root ::= ("a" "a"*)\n'
+    assert regex_to_gbnf("a{,2}") == 'root ::= (("a" "a"?)?)\n'
+
+def test_braces_not_forming_a_quantifier_are_literal():
+    assert regex_to_gbnf("a{x}") == 'root ::= "a" "{" "x" "}"\n'
+    assert regex_to_gbnf("a{2") == 'root ::= "a" "{" "2"\n'
+
+def test_escapes():
+    assert regex_to_gbnf(r'a\.b"') == 'root ::= "a" "." "b" "\\""\n'
+    assert regex_to_gbnf(r"\\\n") == 'root ::= "\\\\" "\\n"\n'
+
+def test_invalid_regexes():
+    with pytest.raises(ValueError, match="greater than max"):
+        regex_to_gbnf("a{3,1}")
+    with pytest.raises(ValueError, match="Nothing to repeat"):
+        regex_to_gbnf("{3}")
+    with pytest.raises(ValueError, match="Unsupported group"):
+        regex_to_gbnf("a(?=b)")
+    with pytest.raises(ValueError, match="Unsupported escape"):
+        regex_to_gbnf(r"\b")
+
+def test_regex_to_gbnf_doesnt_load_llama_cpp():
+    code = "import sys; from glai.ai.grammar import regex_to_gbnf; regex_to_gbnf('a+'); print('llama_cpp' in sys.modules)"
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
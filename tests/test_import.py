@@ -0,0 +1,11 @@
+import os
+import subprocess
+import sys
+
+BACKEND_MODULES = ["gguf_llama", "gguf_modeldb", "llama_cpp", "numpy"]
+
+def test_import_doesnt_load_inference_backend():
+    code = "import sys, glai; from glai.messages import AIMessages; print(' '.join(sorted(set(sys.argv[1:]) & set(sys.modules))))"
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    result = subprocess.run([sys.executable, "-c", code, *BACKEND_MODULES], env=env, capture_output=True, text=True, check=True)
+    assert result.stdout.split() == []
@@ -0,0 +1,105 @@
+import pytest
+from glai.messages import AIMessage, AIMessages, TokenCounter
+
+def count_chars(text):
+    # one start of text token, like llama tokenizers add, and one token per character
+    return 1 + len(text)
+
+def make_messages():
+    messages = AIMessages(("[INST]", "[/INST]"), ("", "</s>"), ("<<SYS>>", "<</SYS>>"))
+    messages.set_system_message("Be brief.")
+    messages.add_user_message("Hello")
+    messages.add_ai_message("Hi, how can I help?")
+    messages.add_user_message("Tell me a joke")
+    return messages
+
+def test_count_tokens_matches_rendered_text():
+    messages = make_messages()
+    assert messages.count_tokens(count_chars) == count_chars(messages.text())
+    assert AIMessages().count_tokens(count_chars) == count_chars("")
+
+def test_count_tokens_after_direct_edit():
+    messages = make_messages()
+    counter = TokenCounter(count_chars, key="chars")
+    messages.count_tokens(counter)
+    messages.get_message(messages.message_ids()[1]).edit("Hello there, I have a longer question now")
+    assert messages.count_tokens(counter) == count_chars(messages.text())
+    messages.edit_message(messages.message_ids()[2], "Sure")
+    messages.remove_message(messages.message_ids()[1])
+    assert messages.count_tokens(counter) == count_chars(messages.text())
+
+def test_count_tokens_only_counts_changed_messages(monkeypatch):
+    messages = make_messages()
+    counter = TokenCounter(count_chars, key="chars")
+    messages.count_tokens(counter)
+    counted = []
+    original = AIMessage.count_tokens
+    monkeypatch.setattr(AIMessage, "count_tokens", lambda message, counter: counted.append(message.content) or original(message, counter))
+    messages.add_ai_message("Why did the chicken cross the road?")
+    assert messages.count_tokens(counter) == count_chars(messages.text())
+    assert counted == ["Why did the chicken cross the road?"]
+    counted.clear()
+    messages.get_message(messages.message_ids()[2]).edit("Hello!")
+    assert messages.count_tokens(counter) == count_chars(messages.text())
+    assert counted == ["Hello!"]
+    counted.clear()
+    messages.set_system_message("Be funny.")
+    assert messages.count_tokens(counter) == count_chars(messages.text())
+    assert messages.count_tokens(counter) == count_chars(messages.text())
+    assert counted[0] == "Be funny." and len(counted) == len(messages)
+
+def test_fit_to_token_budget_counts_start_token_once():
+    messages = make_messages()
+    budget = messages.count_tokens(count_chars) - len(messages.get_message(messages.message_ids()[1]).text())
+    dropped = messages.fit_to_token_budget(budget, count_chars)
+    assert [message.content for message in dropped] == ["Hello"]
+    assert messages.count_tokens(count_chars) == budget
+
+def make_conversation():
+    messages = AIMessages(("[INST]", "[/INST]"), ("", "</s>"), ("<<SYS>>", "<</SYS>>"))
+    messages.set_system_message("Be brief.")
+    for index in range(1, 7):
+        messages.add_user_message(f"message {index}")
+    return messages
+
+def edit_old_messages(messages):
+    ids = messages.message_ids()
+    messages.edit_message(ids[2], "edited message 2")
+    messages.remove_message(ids[5])
+    return [ids[2], ids[5]]
+
+def test_from_jsonl_last_k_after_editing_old_message(tmp_path):
+    file_path = str(tmp_path / "chat.jsonl")
+    messages = make_conversation()
+    messages.save_jsonl(file_path)
+    messages.append_jsonl(file_path, edit_old_messages(messages))
+    loaded = AIMessages.from_jsonl(file_path, last_k=3)
+    assert loaded.message_ids() == [0] + messages.message_ids()[-3:]
+    assert [message.content for message in loaded.message_list()] == ["Be brief.", "message 3", "message 4", "message 6"]
+    assert AIMessages.from_jsonl(file_path).text() == messages.text()
+
+def test_from_jsonl_last_k_stops_reading_early(tmp_path):
+    file_path = str(tmp_path / "chat.jsonl")
+    messages = make_conversation()
+    messages.save_jsonl(file_path)
+    messages.append_jsonl(file_path, edit_old_messages(messages))
+    with open(file_path, "r", encoding="utf-8") as file:
+        lines = file.readlines()
+    with open(file_path, "w", encoding="utf-8") as file:
+        # records before the newest messages must not be parsed
+        file.writelines([lines[0], "not json\n"] + lines[1:])
+    loaded = AIMessages.from_jsonl(file_path, last_k=2)
+    assert [message.content for message in loaded.message_list()] == ["Be brief.", "message 4", "message 6"]
+    assert loaded.add_user_message("message 7") is loaded.get_message(7)
+    with pytest.raises(ValueError):
+        AIMessages.from_jsonl(file_path)
+
+def test_conversation_store_last_k_after_editing_old_message(tmp_path):
+    from glai.messages import ConversationStore
+    messages = make_conversation()
+    with ConversationStore(str(tmp_path / "conversations.jsonl")) as store:
+        store.save("chat", messages)
+        store.append("chat", messages, edit_old_messages(messages))
+        assert store.load("chat", last_k=3).message_ids() == [0] + messages.message_ids()[-3:]
+        assert store.load("chat").text() == messages.text()
+        assert store.view("chat").last_message().content == "message 6"
@@ -0,0 +1,46 @@
+import os
+import pytest
+from gguf_modeldb import ModelData
+from glai.ai import model_index
+from glai.ai.model_index import LazyModelDB, ModelIndex, get_model_db
+
+URL = "https://huggingface.co/TheBloke/Mistral-7B-Instruct-v0.1-GGUF/blob/main/mistral-7b-instruct-v0.1.Q2_K.gguf"
+
+@pytest.fixture
+def db_dir(tmp_path):
+    db_dir = tmp_path / "models"
+    ModelData(URL, str(db_dir), ("[INST]", "[/INST]"), ("", "</s>"), system_tags=("<<SYS>>", "<</SYS>>"),
+              description="Mistral instruct", keywords=["mistral", "instruct"]).save_json()
+    return str(db_dir)
+
+def test_round_trip_keeps_model_data(db_dir):
+    model_data = ModelData.from_json(ModelData(URL, db_dir).json_path())
+    restored = ModelIndex._from_dict(ModelIndex._to_dict(model_data), db_dir)
+    assert restored.to_dict() == model_data.to_dict()
+    assert restored.system_tags == {"open": "<<SYS>>", "close": "<</SYS>>"}
+    assert restored.description == "Mistral instruct"
+    assert restored.keywords == ["mistral", "instruct"]
+
+def test_indexed_result_found_without_creating_model_db(db_dir, tmp_path, monkeypatch):
+    index_path = str(tmp_path / "index.json")
+    found = ModelIndex(index_path).find_model(LazyModelDB(db_dir, copy_verified_models=False), "mistral", "Q2_K")
+    assert found.gguf_url == URL
+
+    def fail(*args, **kwargs):
+        raise AssertionError("ModelDB created for an indexed search")
+    monkeypatch.setattr(model_index, "ModelDB", fail)
+    model_db = LazyModelDB(db_dir, copy_verified_models=False)
+    indexed = ModelIndex(index_path).find_model(model_db, "mistral", "Q2_K")
+    assert indexed.to_dict() == found.to_dict()
+    assert model_db._model_db is None
+
+def test_rewritten_model_json_invalidates_index(db_dir, tmp_path):
+    index = ModelIndex(str(tmp_path / "index.json"))
+    found = index.find_model(get_model_db(db_dir, copy_verified_models=False), "mistral", "Q2_K")
+    assert found.ai_tags == {"open": "", "close": "</s>"}
+    mtime_ns = model_index._db_mtime(db_dir)
+    json_path = ModelData(URL, db_dir, ("[INST]", "[/INST]"), ("<ai>", "</ai>")).save_json()
+    # in place, so only the file time changes, made later than before for file systems with coarse timestamps
+    os.utime(json_path, ns=(mtime_ns + 1_000_000, mtime_ns + 1_000_000))
+    found = index.find_model(get_model_db(db_dir, copy_verified_models=False), "mistral", "Q2_K")
+    assert found.ai_tags == {"open": "<ai>", "close": "</ai>"}
@@ -0,0 +1,58 @@
+import os
+import time
+import pytest
+from glai.ai import model_pool
+from glai.ai.model_pool import ModelPool
+
+def fake_worker_main(worker_id, config, tasks, results):
+    # Stand-in for the EasyAI worker, "sleep:<seconds>" ignores the deadline like a long prompt evaluation, "crash" exits
+    results.send((worker_id, None, None, None))
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        request_id, kwds, deadline = task
+        command, _, seconds = kwds["user_message"].partition(":")
+        if command == "crash":
+            os._exit(3)
+        if command == "sleep":
+            time.sleep(float(seconds))
+        results.send((worker_id, request_id, {"content": kwds["user_message"], "tag_open": "", "tag_close": ""}, None))
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(model_pool, "_worker_main", fake_worker_main)
+    pool = ModelPool({}, workers=1, threads_per_worker=1)
+    yield pool
+    pool.close()
+
+def test_queued_request_times_out(pool):
+    busy = pool.submit("sleep:1")
+    start = time.monotonic()
+    with pytest.raises(TimeoutError, match="queue"):
+        pool.submit("queued", timeout=0.2).result(timeout=5)
+    assert time.monotonic() - start < 0.9
+    assert busy.result(timeout=10).content == "sleep:1"
+
+def test_generation_timeout_is_enforced_by_the_pool(pool):
+    pool.generate("warm up", timeout=30)
+    start = time.monotonic()
+    with pytest.raises(TimeoutError, match="generation"):
+        pool.submit("sleep:2", timeout=0.3).result(timeout=5)
+    assert time.monotonic() - start < 1.5
+    assert pool.generate("after timeout", timeout=10).content == "after timeout"
+
+def test_cancelled_requests_are_skipped(pool):
+    busy = pool.submit("sleep:0.5")
+    cancelled = pool.submit("cancelled")
+    expired = pool.submit("cancelled with timeout", timeout=0.1)
+    assert cancelled.cancel() and expired.cancel()
+    time.sleep(0.3)
+    assert busy.result(timeout=10).content == "sleep:0.5"
+    assert pool.generate("next", timeout=10).content == "next"
+    assert pool._collector.is_alive()
+
+def test_crashed_worker_fails_its_request_and_is_restarted(pool):
+    with pytest.raises(Exception, match="exited with code 3"):
+        pool.submit("crash").result(timeout=10)
+    assert pool.generate("after crash", timeout=30).content == "after crash"
@@ -0,0 +1,43 @@
+import os
+import threading
+import time
+import pytest
+
+pytest.importorskip("gguf_llama")
+from glai.ai import model_registry
+from glai.ai.model_registry import ModelRegistry
+
+class _FakeLlamaAI:
+    def __init__(self, model_path, max_tokens, **llama_kwargs):
+        if os.path.basename(model_path) == "slow.gguf":
+            time.sleep(0.5)
+        if os.path.basename(model_path) == "broken.gguf":
+            raise RuntimeError("load failed")
+        self.model_path = model_path
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(model_registry, "LlamaAI", _FakeLlamaAI)
+    return ModelRegistry(max_bytes=1 << 30)
+
+def test_slow_load_doesnt_block_other_models(registry, tmp_path):
+    slow_path, fast_path = str(tmp_path / "slow.gguf"), str(tmp_path / "fast.gguf")
+    handles = []
+    threads = [threading.Thread(target=lambda: handles.append(registry.acquire(slow_path))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    start = time.monotonic()
+    registry.acquire(fast_path).release()
+    assert time.monotonic() - start < 0.25
+    for thread in threads:
+        thread.join()
+    assert handles[0] is handles[1] is handles[2]
+    assert handles[0].refs == 3
+
+def test_failed_load_is_retried(registry, tmp_path):
+    with pytest.raises(RuntimeError):
+        registry.acquire(str(tmp_path / "broken.gguf"))
+    assert registry.loaded_models() == []
+    with pytest.raises(RuntimeError):
+        registry.acquire(str(tmp_path / "broken.gguf"))
@@ -0,0 +1,75 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("gguf_llama")
+from glai.ai.prompt_cache import PromptCache
+
+class FakeState:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.llama_state_size = 100 * len(tokens)
+
+class FakeLlama:
+    """
+    Stand-in for the llama model, one token per character, keeping count of the evaluated tokens.
+    """
+    def __init__(self):
+        self.input_ids = np.zeros(512, dtype=np.intc)
+        self.n_tokens = 0
+        self.evaluated = 0
+
+    def tokenize(self, text, special=False):
+        return list(text)
+
+    def reset(self):
+        self.n_tokens = 0
+
+    def eval(self, tokens):
+        self.input_ids[self.n_tokens:self.n_tokens + len(tokens)] = tokens
+        self.n_tokens += len(tokens)
+        self.evaluated += len(tokens)
+
+    def save_state(self):
+        return FakeState(self.input_ids[:self.n_tokens].tolist())
+
+    def load_state(self, state):
+        self.input_ids[:len(state.tokens)] = state.tokens
+        self.n_tokens = len(state.tokens)
+
+class FakeAI:
+    def __init__(self):
+        self.llm = FakeLlama()
+
+def test_prepare_restores_longest_cached_prefix():
+    ai = FakeAI()
+    cache = PromptCache(ai)
+    cache.add("<<SYS>>Be brief.")
+    cache.add("<<SYS>>Be brief.<</SYS>>")
+    cache.add("<<SYS>>Be funny.<</SYS>>")
+    assert cache.prepare("<<SYS>>Be brief.<</SYS>>Hello") == len("<<SYS>>Be brief.<</SYS>>")
+    assert ai.llm.input_ids[:ai.llm.n_tokens].tolist() == list(b"<<SYS>>Be brief.<</SYS>>")
+    assert cache.prepare("Hello") == 0
+
+def test_least_recently_used_state_is_evicted():
+    cache = PromptCache(FakeAI(), capacity_bytes=100 * 10)
+    cache.add("aaaa")
+    cache.add("bbbb")
+    cache.add("aaaa")
+    cache.add("cccc")
+    assert cache.size_bytes() == 800
+    assert cache.prepare("bbbb!") == 0
+    assert cache.prepare("aaaa!") == 4
+
+def test_pinned_state_is_kept_until_unpinned():
+    ai = FakeAI()
+    cache = PromptCache(ai, capacity_bytes=100 * 10)
+    cache.pin("system")
+    cache.add("other")
+    assert cache.size_bytes() == 600
+    assert cache.prepare("system prompt") == len("system")
+    cache.unpin("system")
+    cache.add("first!")
+    assert cache.size_bytes() == 600
+    ai.llm.reset()
+    assert cache.prepare("system prompt") == 0
+    assert cache.prepare("first!") == len("first!")
@@ -0,0 +1,80 @@
+import http.server
+import os
+import threading
+import pytest
+from glai.ai.repo_import import RepoImporter
+
+FILES = ["model.Q4_K_M.gguf", "model.Q5_K_M.gguf", "model.Q8_0.gguf"]
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """
+    Stand-in for HuggingFace, serving a repo page, its file tree page and the file pages of FILES.
+    Pages have `etag` as ETag and are answered with 304 when it matches If-None-Match.
+    """
+    etag = '"v1"'
+    requests = []
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        if self.path == "/org/Model-GGUF":
+            body = '<a href="/org/Model-GGUF/blob/main/model.Q4_K_M.gguf">model.Q4_K_M.gguf</a><a href="/org/Other-GGUF/blob/main/other.Q4_K_M.gguf">other</a>'
+        elif self.path == "/org/Model-GGUF/tree/main":
+            body = "".join(f'<a href="/org/Model-GGUF/resolve/main/{name}?download=true">{name}</a>' for name in FILES)
+        elif self.path.startswith("/org/Model-GGUF/blob/main/"):
+            body = "file page"
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == _Handler.etag:
+            _Handler.requests.append((self.path, 304))
+            self.send_response(304)
+            self.end_headers()
+            return
+        _Handler.requests.append((self.path, 200))
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", _Handler.etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+@pytest.fixture
+def repo_url():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _Handler.etag = '"v1"'
+    _Handler.requests = []
+    yield f"http://127.0.0.1:{server.server_port}/org/Model-GGUF"
+    server.shutdown()
+    server.server_close()
+
+def test_finds_gguf_files_of_the_repo_only(repo_url, tmp_path):
+    urls = RepoImporter(cache_dir=str(tmp_path / "pages")).find_gguf_urls(repo_url)
+    assert urls == [f"{repo_url}/blob/main/{name}" for name in FILES]
+    assert sorted(_Handler.requests) == [("/org/Model-GGUF", 200), ("/org/Model-GGUF/tree/main", 200)]
+
+def test_cached_pages_are_revalidated(repo_url, tmp_path):
+    cache_dir = str(tmp_path / "pages")
+    urls = RepoImporter(cache_dir=cache_dir).find_gguf_urls(repo_url)
+    _Handler.requests = []
+    assert RepoImporter(cache_dir=cache_dir).find_gguf_urls(repo_url) == urls
+    assert sorted(_Handler.requests) == [("/org/Model-GGUF", 304), ("/org/Model-GGUF/tree/main", 304)]
+
+    _Handler.etag = '"v2"'
+    _Handler.requests = []
+    assert RepoImporter(cache_dir=cache_dir).find_gguf_urls(repo_url) == urls
+    assert sorted(_Handler.requests) == [("/org/Model-GGUF", 200), ("/org/Model-GGUF/tree/main", 200)]
+
+def test_import_repo_skips_imported_urls(repo_url, tmp_path):
+    db_dir = str(tmp_path / "models")
+    os.makedirs(db_dir)
+    imported_url = f"{repo_url}/blob/main/{FILES[0]}"
+    models = RepoImporter(cache_dir=None).import_repo(repo_url, db_dir, is_imported=lambda url: url == imported_url)
+    assert [model.gguf_url for model in models] == [f"{repo_url}/blob/main/{name}" for name in FILES[1:]]
+    assert len([name for name in os.listdir(db_dir) if name.endswith(".json")]) == 2
+    assert not any(path.startswith("/org/Model-GGUF/blob/") for path, _ in _Handler.requests)
@@ -0,0 +1,50 @@
+import threading
+import time
+import pytest
+from glai.ai.request_queue import QueueFullError, RequestQueue
+
+def wait_for_pending(queue, pending):
+    deadline = time.monotonic() + 5
+    while queue.pending() != pending:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+def test_requests_are_served_in_order_of_arrival():
+    queue = RequestQueue()
+    served = []
+    def request(index):
+        with queue.hold():
+            served.append(index)
+    queue.acquire()
+    threads = []
+    for index in range(5):
+        threads.append(threading.Thread(target=request, args=(index,)))
+        threads[-1].start()
+        wait_for_pending(queue, index + 1)
+    queue.release()
+    for thread in threads:
+        thread.join(5)
+    assert served == [0, 1, 2, 3, 4]
+    assert not queue.is_busy() and queue.pending() == 0
+
+def test_full_queue_rejects_requests():
+    queue = RequestQueue(max_pending=1)
+    queue.acquire()
+    waiting = threading.Thread(target=queue.acquire)
+    waiting.start()
+    wait_for_pending(queue, 1)
+    with pytest.raises(QueueFullError):
+        queue.acquire()
+    queue.release()
+    waiting.join(5)
+    assert queue.is_busy() and queue.pending() == 0
+
+def test_timed_out_request_leaves_the_queue():
+    queue = RequestQueue()
+    queue.acquire()
+    with pytest.raises(TimeoutError):
+        queue.acquire(timeout=0.05)
+    assert queue.pending() == 0
+    queue.release()
+    with queue.hold(timeout=1):
+        assert queue.is_busy()
@@ -0,0 +1,43 @@
+import time
+from glai.ai.response_cache import ResponseCache
+
+MODEL_KEY = ("model.gguf", 2048)
+
+def test_responses_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = ResponseCache(ttl=10)
+    key = cache.key(MODEL_KEY, "Hello")
+    cache.put(key, "Hi")
+    now[0] += 9
+    assert cache.get(key) == "Hi"
+    now[0] += 2
+    assert cache.get(key) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_least_recently_used_response_is_evicted():
+    cache = ResponseCache(capacity=2)
+    first, second, third = (cache.key(MODEL_KEY, prompt) for prompt in ("first", "second", "third"))
+    cache.put(first, "1")
+    cache.put(second, "2")
+    assert cache.get(first) == "1"
+    cache.put(third, "3")
+    assert cache.get(second) is None
+    assert cache.get(first) == "1" and cache.get(third) == "3"
+    assert len(cache) == 2
+
+def test_responses_survive_restart_on_disk(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path))
+    key = cache.key(MODEL_KEY, "Hello", stop_at=["</s>"], sampling={"temperature": 0})
+    cache.put(key, "Hi, ünïcode")
+    restarted = ResponseCache(cache_dir=str(tmp_path))
+    assert restarted.get(key) == "Hi, ünïcode"
+    assert restarted.get(restarted.key(MODEL_KEY, "Hello", stop_at=["</s>"], sampling={"temperature": 0.5})) is None
+    restarted.clear()
+    assert ResponseCache(cache_dir=str(tmp_path)).get(key) is None
+
+def test_normalized_prompts_share_responses():
+    cache = ResponseCache(normalize=True)
+    cache.put(cache.key(MODEL_KEY, "Hello  there\n"), "Hi")
+    assert cache.get(cache.key(MODEL_KEY, " Hello there")) == "Hi"
+    assert ResponseCache().key(MODEL_KEY, "Hello  there") != ResponseCache().key(MODEL_KEY, "Hello there")
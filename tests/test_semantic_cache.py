@@ -0,0 +1,48 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("gguf_llama")
+from glai.ai.semantic_cache import SemanticCache
+
+class FakeEmbedder:
+    """
+    Stand-in for Embedder, embedding the prompts with the given unit vectors.
+    """
+    def __init__(self, vectors):
+        self.vectors = {prompt: np.asarray(vector, dtype=np.float32) / np.linalg.norm(vector) for prompt, vector in vectors.items()}
+
+    def embed(self, texts):
+        return np.stack([self.vectors[text] for text in ([texts] if isinstance(texts, str) else texts)])
+
+EMBEDDER = FakeEmbedder({
+    "What is the capital of France?": [1, 0, 0],
+    "what's the capital of France": [0.99, 0.1, 0],
+    "How tall is Mount Everest?": [0.5, 0.85, 0],
+    "Tell me a joke": [0, 0, 1],
+})
+
+def test_similar_prompt_above_threshold_hits():
+    cache = SemanticCache(EMBEDDER, threshold=0.95)
+    cache.add("model", cache.embed("What is the capital of France?"), "Paris")
+    assert cache.search("model", cache.embed("what's the capital of France")) == "Paris"
+    assert cache.search("model", cache.embed("How tall is Mount Everest?")) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_scopes_are_separate():
+    cache = SemanticCache(EMBEDDER)
+    embedding = cache.embed("What is the capital of France?")
+    cache.add("model a", embedding, "Paris")
+    assert cache.search("model b", embedding) is None
+    cache.add("model b", embedding, "Paris, France")
+    assert cache.search("model a", embedding) == "Paris"
+    assert cache.search("model b", embedding) == "Paris, France"
+
+def test_oldest_entry_is_overwritten_at_capacity():
+    cache = SemanticCache(EMBEDDER, capacity=2)
+    cache.add("model", cache.embed("What is the capital of France?"), "Paris")
+    cache.add("model", cache.embed("How tall is Mount Everest?"), "8849 m")
+    cache.add("model", cache.embed("Tell me a joke"), "No.")
+    assert len(cache) == 2
+    assert cache.search("model", cache.embed("What is the capital of France?")) is None
+    assert cache.search("model", cache.embed("How tall is Mount Everest?")) == "8849 m"
+    assert cache.search("model", cache.embed("Tell me a joke")) == "No."
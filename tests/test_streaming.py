@@ -0,0 +1,88 @@
+import pytest
+
+pytest.importorskip("gguf_llama")
+from glai.ai.streaming import StopStringMatcher, stream_tokens
+
+class FakeLlama:
+    """
+    Stand-in for the llama model generating the pieces one token each, then the end of sequence token.
+    """
+    def __init__(self, pieces, n_ctx=512):
+        self.pieces = [piece.encode("utf-8") if isinstance(piece, str) else piece for piece in pieces]
+        self._n_ctx = n_ctx
+        self.sampled = 0
+
+    def n_ctx(self):
+        return self._n_ctx
+
+    def token_eos(self):
+        return -1
+
+    def generate(self, tokens):
+        for token in range(len(self.pieces)):
+            self.sampled += 1
+            yield token
+        yield self.token_eos()
+
+    def detokenize(self, tokens):
+        return b"".join(self.pieces[token] for token in tokens)
+
+def test_stop_string_split_across_tokens():
+    llm = FakeLlama(["Hello", " wor", "ld", "</", "s", ">", " never"])
+    deltas = list(stream_tokens(llm, [0], stop_at="</s>", include_stop_str=False))
+    assert "".join(deltas) == "Hello world"
+    assert llm.sampled == 6
+    assert all("<" not in delta for delta in deltas)
+
+def test_stop_string_included_in_output():
+    llm = FakeLlama(["Hello", " </", "s>", " never"])
+    assert "".join(stream_tokens(llm, [0], stop_at="</s>", include_stop_str=True)) == "Hello </s>"
+
+def test_held_back_text_is_flushed_at_end_of_stream():
+    llm = FakeLlama(["Hello", " <", "/"])
+    deltas = list(stream_tokens(llm, [0], stop_at="</s>"))
+    assert deltas == ["Hello", " ", "</"]
+
+def test_multibyte_characters_split_across_tokens():
+    data = "¿Qué?".encode("utf-8")
+    llm = FakeLlama([data[:1], data[1:4], data[4:]])
+    assert "".join(stream_tokens(llm, [0])) == "¿Qué?"
+
+def test_generation_stops_at_context_limit():
+    llm = FakeLlama(["a"] * 10, n_ctx=5)
+    assert "".join(stream_tokens(llm, [0, 1])) == "aaa"
+    with pytest.raises(Exception, match="no room"):
+        list(stream_tokens(llm, [0] * 5))
+
+def feed_all(matcher, deltas):
+    return [matcher.feed(delta) for delta in deltas]
+
+def test_matcher_holds_back_possible_stop_string_start():
+    matcher = StopStringMatcher(["</s>", "\nUser:"], include_stop_str=False)
+    assert feed_all(matcher, ["Hi", "\nUs", "e", "r", ": next"]) == ["Hi", "", "", "", ""]
+    assert matcher.stopped and matcher.stop_string == "\nUser:"
+    assert matcher.feed("more") == ""
+
+def test_matcher_flushes_partial_match():
+    matcher = StopStringMatcher("</s>")
+    assert feed_all(matcher, ["a <", "/"]) == ["a ", ""]
+    assert matcher.flush() == "</"
+    assert not matcher.stopped
+
+def test_matcher_overlapping_stop_strings():
+    matcher = StopStringMatcher(["ab", "b"], include_stop_str=False)
+    assert matcher.feed("xab") == "x"
+    assert matcher.stop_string == "ab"
+    matcher = StopStringMatcher(["abc", "b"], include_stop_str=True)
+    assert feed_all(matcher, ["a", "bc"]) == ["", "ab"]
+    assert matcher.stop_string == "b"
+
+def test_matcher_follows_failure_links():
+    matcher = StopStringMatcher(["xyz", "yq"], include_stop_str=False)
+    assert feed_all(matcher, ["x", "y", "q"]) == ["", "", "x"]
+    assert matcher.stop_string == "yq"
+
+def test_matcher_without_stop_strings_passes_text_through():
+    for stop_at in (None, "", [""]):
+        matcher = StopStringMatcher(stop_at)
+        assert matcher.feed("</s>") == "</s>" and not matcher.stopped